@@ -1,4 +1,6 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+import asyncio
 from pydantic import BaseModel
 from pydantic_ai import RunContext
 from sqlite3 import Connection
@@ -7,12 +9,30 @@ from tenacity import retry, stop_after_attempt, wait_exponential
 import sqlite3
 from ..core.logger import logger, log_tool_call, log_security_block, log_error
 from ..core.exceptions import DatabaseError, ValidationError, ToolExecutionError
+from ..db.versioning import bump_data_version
+from ..db.async_db import run_db
 
 @dataclass
 class PilotDeps:
     db: sqlite3.Connection
     system_rules: str  # Content of database_compact.md
     is_new_session: bool = False
+    # Speculative guardrail: resolves to True once the query is cleared (None = already cleared)
+    clearance: Optional[asyncio.Future] = None
+    # /chat/stream: queue that receives progress events from nested agent runs
+    events: Optional[asyncio.Queue] = None
+    # A turn's tool calls run concurrently but share `db` and its open
+    # transaction, so work on it is serialized (see run_db below)
+    db_lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+    async def run_db(self, fn: Callable, *args, **kwargs) -> Any:
+        """run_db for work on this turn's connection, one call at a time."""
+        async with self.db_lock:
+            return await run_db(fn, *args, **kwargs)
+
+    async def cleared(self) -> bool:
+        """Wait for the guardrail verdict before any side effect."""
+        return True if self.clearance is None else await asyncio.shield(self.clearance)
 
 # ==========================================================
 # RE-ACT TOOLS: These are the "hands" of the agent
@@ -49,15 +69,17 @@ async def run_sql_query(ctx: RunContext[PilotDeps], query: str):
     if "LIMIT" not in normalized_query:
         query = query.rstrip(';') + " LIMIT 50"
     
-    try:
+    def read():
         # 3. Validation: Explain before Execute
         db.execute(f"EXPLAIN QUERY PLAN {query}")
         
         # 4. Execution
         cursor = db.cursor()
         cursor.execute(query)
-        rows = cursor.fetchall()
-        
+        return cursor.fetchall()
+
+    try:
+        rows = await ctx.deps.run_db(read)
         return [dict(row) for row in rows] if rows else [{"message": "No data found."}]
         
     except Exception as e:
@@ -73,16 +95,19 @@ async def get_table_schema(ctx: RunContext[PilotDeps], table_name: str):
         return {"error": "Invalid table name format."}
         
     log_tool_call("get_table_schema", table_name=table_name)
-    try:
+
+    def read():
         cursor = ctx.deps.db.cursor()
         cursor.execute(f"PRAGMA table_info({table_name});")
         columns = [dict(row) for row in cursor.fetchall()]
+        cursor.execute(f"PRAGMA foreign_key_list({table_name});")
+        return columns, [dict(row) for row in cursor.fetchall()]
+
+    try:
+        columns, fks = await ctx.deps.run_db(read)
         
         if not columns:
             return {"error": f"Table '{table_name}' not found."}
-            
-        cursor.execute(f"PRAGMA foreign_key_list({table_name});")
-        fks = [dict(row) for row in cursor.fetchall()]
         
         return {
             "table": table_name,
@@ -93,17 +118,21 @@ async def get_table_schema(ctx: RunContext[PilotDeps], table_name: str):
         return {"error": f"Error fetching schema: {str(e)}"}
 
 from app.utils.wallet_benefits import get_cashback_rate
+from app.utils.detail_effects import apply_detail_effects
 
 async def add_transaction(ctx: RunContext[PilotDeps], wallet_id: int, total_amount: float, category_id: int, merchant: str, description: str = "", date: str = None):
     """Record a purchase. IDs must be looked up via SQL first if unknown."""
     log_tool_call("add_transaction", wallet_id=wallet_id, amount=total_amount)
+    if not await ctx.deps.cleared():
+        return {"error": "Request was rejected by the guardrail."}
     
     if date is None:
         from datetime import date as dt
         date = dt.today().isoformat()
         
-    try:
-        db = ctx.deps.db
+    db = ctx.deps.db
+
+    def insert():
         cursor = db.cursor()
         
         # 1. Insert Header
@@ -124,28 +153,49 @@ async def add_transaction(ctx: RunContext[PilotDeps], wallet_id: int, total_amou
             INSERT INTO transaction_details (header_id, category_id, line_amount, billing_date, cashback_earned)
             VALUES (?, ?, ?, ?, ?)
         """, (header_id, category_id, total_amount, date, cashback_earned))
-        
-        db.commit()
+        apply_detail_effects(db, [cursor.lastrowid])
+        return header_id, cashback_earned
+
+    def write():
+        # Commit or roll back in the same locked call, so no other tool's
+        # statements can land in between
+        try:
+            result = insert()
+            db.commit()
+            return result
+        except Exception:
+            db.rollback()
+            raise
+
+    try:
+        header_id, cashback_earned = await ctx.deps.run_db(write)
+        bump_data_version()
         return {"status": "success", "transaction_id": header_id, "message": f"Transaction recorded. Earned {cashback_earned} cashback."}
         
     except Exception as e:
-        db.rollback()
         return {"error": f"Failed to add transaction: {str(e)}"}
 
 async def add_recommendation(ctx: RunContext[PilotDeps], title: str, message: str, urgency: str = "medium"):
     """Save financial advice/warnings to dashboard. Urgency: low|med|high|critical."""
     log_tool_call("add_recommendation", title=title)
+    if not await ctx.deps.cleared():
+        return {"error": "Request was rejected by the guardrail."}
+    db = ctx.deps.db
+
+    def write():
+        try:
+            db.execute("""
+                INSERT INTO strategic_recommendations (title, message, urgency_level, status)
+                VALUES (?, ?, ?, 'pending')
+            """, (title, message, urgency))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
     try:
-        db = ctx.deps.db
-        cursor = db.cursor()
-        
-        cursor.execute("""
-            INSERT INTO strategic_recommendations (title, message, urgency_level, status)
-            VALUES (?, ?, ?, 'pending')
-        """, (title, message, urgency))
-        
-        db.commit()
+        await ctx.deps.run_db(write)
+        bump_data_version()
         return {"status": "success", "message": "Recommendation saved to dashboard."}
     except Exception as e:
-        db.rollback()
         return {"error": f"Failed to save recommendation: {str(e)}"}
\ No newline at end of file
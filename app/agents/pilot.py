@@ -5,6 +5,11 @@ from .dependencies import (
     PilotDeps, run_sql_query, get_table_schema, add_transaction, add_recommendation
 )
 from .prompt_versions import get_prompt
+from ..core.context_registry import context_registry
+from ..utils.chat_stream import forward_events
+from ..utils.sql_answer_cache import memoized_answer
+from ..utils.sql_templates import answer_from_template
+from ..utils.financial_snapshot import FINANCIAL_SNAPSHOT_ENABLED, get_financial_snapshot_text
 
 from dotenv import load_dotenv
 
@@ -54,15 +59,7 @@ sql_agent = Agent(
 
 @sql_agent.system_prompt
 def add_schema_context(ctx: RunContext[PilotDeps]) -> str:
-    # Use path relative to project root or use absolute path logic if needed
-    # Assuming running from root
-    try:
-        with open("app/data/database_compact.md", "r") as f:
-            return f"DATABASE_CONTEXT:\n{f.read()}"
-    except FileNotFoundError:
-        # Fallback for when running inside app module
-        with open("data/database_compact.md", "r") as f:
-            return f"DATABASE_CONTEXT:\n{f.read()}"
+    return context_registry.fragment("compact", "schema")
 
 # Register Tools for SQL Agent
 sql_agent.tool(run_sql_query)
@@ -76,24 +73,43 @@ strategic_pilot = Agent(
     system_prompt=prompt_config.system_prompt
 )
 
+async def query_database(ctx: RunContext[PilotDeps], question: str) -> str:
+    """
+    Answer a data question for ask_database: common shapes straight from a
+    SQL template, anything else with the SQL agent, memoized per question and
+    data version.
+    """
+    answer = await ctx.deps.run_db(answer_from_template, ctx.deps.db, question)
+    if answer is not None:
+        return answer
+
+    async def run():
+        # Run the SQL agent
+        # We pass the same dependencies to the sub-agent
+        # When streaming, the sub-agent's tool calls are forwarded to the client
+        handler = forward_events(ctx.deps.events, parent="ask_database") if ctx.deps.events is not None else None
+        result = await sql_agent.run(question, deps=ctx.deps, event_stream_handler=handler)
+
+        # Handle different PydanticAI versions or return types
+        if hasattr(result, 'data'):
+            answer = result.data
+        elif hasattr(result, 'output'):
+            answer = result.output
+        else:
+            answer = str(result)
+        return answer, result.usage().total_tokens or 0
+
+    return await memoized_answer(question, run)
+
 @strategic_pilot.tool
 async def ask_database(ctx: RunContext[PilotDeps], question: str) -> str:
     """Use this tool to fetch financial data from the database. Pass a natural language question describing the data you need."""
-    # Run the SQL agent
-    # We pass the same dependencies to the sub-agent
-    result = await sql_agent.run(question, deps=ctx.deps)
-    
-    # Handle different PydanticAI versions or return types
-    if hasattr(result, 'data'):
-        return result.data
-    elif hasattr(result, 'output'):
-        return result.output
-    else:
-        return str(result)
+    return await query_database(ctx, question)
 
 # Register Tools for Main Pilot (NO direct SQL tools)
-strategic_pilot.tool(add_transaction)
-strategic_pilot.tool(add_recommendation)
+# Writes never run alongside the turn's other tool calls
+strategic_pilot.tool(add_transaction, sequential=True)
+strategic_pilot.tool(add_recommendation, sequential=True)
 # strategic_pilot.tool(run_sql_query) # REMOVED: Delegated to sql_agent
 # strategic_pilot.tool(get_table_schema) # REMOVED: Delegated to sql_agent
 
@@ -118,4 +134,13 @@ async def add_strategy_context(ctx: RunContext[PilotDeps]) -> str:
     if ctx.deps.is_new_session:
         rules += "\n\nCONTEXT: This is the user's first message in this session. Start your response with a short, witty, and friendly greeting welcoming them back to Wais Wallet."
         
-    return rules
\ No newline at end of file
+    return rules
+
+# Instructions Hook: Current balances, budgets and cashback (cached per data version).
+# Instructions are re-sent on every run; system prompts are skipped once the
+# session has history, which would leave later turns with a stale snapshot.
+@strategic_pilot.instructions
+async def add_financial_snapshot(ctx: RunContext[PilotDeps]) -> str:
+    if not FINANCIAL_SNAPSHOT_ENABLED:
+        return ""
+    return await ctx.deps.run_db(get_financial_snapshot_text, ctx.deps.db)
@@ -0,0 +1,167 @@
+"""
+Prompt Context Registry
+
+The compact rules/schema document (app/data/database_compact.md) is part of
+every agent prompt. It used to be read from disk by each chat and simulation
+request and again by every add_schema_context hook, with a cwd-dependent
+fallback path. The registry loads each document once (at startup), keeps the
+prompt fragments built from it, and reloads a document when its mtime changes:
+
+    rules = context_registry.text("compact")
+    prompt = context_registry.fragment("compact", "schema")
+
+mtimes are checked at most every CONTEXT_RELOAD_INTERVAL seconds (0 disables
+hot reload), so the chat path does no disk I/O between checks. Paths are
+resolved from the package, not the working directory. Token counts are
+estimates (~4 characters per token) for budgeting, not billing.
+"""
+
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from .logger import logger, log_error
+
+CONTEXT_RELOAD_INTERVAL = float(os.getenv("CONTEXT_RELOAD_INTERVAL", "2"))
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough prompt token count for a piece of text."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+@dataclass
+class ContextDocument:
+    name: str
+    path: str
+    text: str
+    mtime: float
+    fragments: Dict[str, str] = field(default_factory=dict)
+    loaded_at: float = field(default_factory=time.time)
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.text)
+
+
+class ContextRegistry:
+    """
+    Named prompt documents loaded once and hot-reloaded by mtime.
+
+    Args:
+        reload_interval: Minimum seconds between mtime checks (0 = never reload)
+    """
+
+    def __init__(self, reload_interval: float = CONTEXT_RELOAD_INTERVAL):
+        self.reload_interval = reload_interval
+        # name -> (path, fragment name -> prefix)
+        self._sources: Dict[str, tuple] = {}
+        self._documents: Dict[str, ContextDocument] = {}
+        self._checked_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+        # Metrics
+        self.loads = 0
+        self.reloads = 0
+        self.reload_failures = 0
+
+    def register(self, name: str, path: str, fragments: Optional[Dict[str, str]] = None) -> None:
+        """
+        Register a document.
+
+        Args:
+            name: Registry key
+            path: File path (relative paths are resolved against app/data)
+            fragments: Fragment name -> prefix; each fragment is prefix + document text
+        """
+        if not os.path.isabs(path):
+            path = os.path.join(DATA_DIR, path)
+        with self._lock:
+            self._sources[name] = (path, dict(fragments or {}))
+            self._documents.pop(name, None)
+
+    def load(self) -> None:
+        """Load every registered document (startup); raises if one is missing."""
+        for name in list(self._sources):
+            self._get(name, force=True)
+
+    def _read(self, name: str) -> ContextDocument:
+        path, fragments = self._sources[name]
+        mtime = os.stat(path).st_mtime
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        return ContextDocument(
+            name=name,
+            path=path,
+            text=text,
+            mtime=mtime,
+            fragments={fragment: prefix + text for fragment, prefix in fragments.items()},
+        )
+
+    def _get(self, name: str, force: bool = False) -> ContextDocument:
+        document = self._documents.get(name)
+        now = time.monotonic()
+        if document is not None and not force:
+            if self.reload_interval <= 0 or now - self._checked_at.get(name, 0.0) < self.reload_interval:
+                return document
+
+        with self._lock:
+            document = self._documents.get(name)
+            if document is None or force:
+                document = self._read(name)
+                self._documents[name] = document
+                self.loads += 1
+            elif now - self._checked_at.get(name, 0.0) >= self.reload_interval:
+                try:
+                    if os.stat(document.path).st_mtime != document.mtime:
+                        document = self._read(name)
+                        self._documents[name] = document
+                        self.reloads += 1
+                        logger.info(f"Context document reloaded (name='{name}', tokens={document.tokens})")
+                except OSError as e:
+                    # Keep serving the last good copy (e.g. file mid-replace)
+                    self.reload_failures += 1
+                    log_error("context reload", e, name=name)
+            self._checked_at[name] = now
+            return document
+
+    def get(self, name: str) -> ContextDocument:
+        return self._get(name)
+
+    def text(self, name: str) -> str:
+        return self._get(name).text
+
+    def fragment(self, name: str, fragment: str) -> str:
+        return self._get(name).fragments[fragment]
+
+    def stats(self) -> Dict:
+        documents = {}
+        for name, document in list(self._documents.items()):
+            documents[name] = {
+                "path": os.path.relpath(document.path),
+                "bytes": len(document.text.encode("utf-8")),
+                "tokens": document.tokens,
+                "fragment_tokens": {key: estimate_tokens(value) for key, value in document.fragments.items()},
+                "mtime": document.mtime,
+                "loaded_at": document.loaded_at,
+            }
+        return {
+            "documents": documents,
+            "loads": self.loads,
+            "reloads": self.reloads,
+            "reload_failures": self.reload_failures,
+            "reload_interval_s": self.reload_interval,
+        }
+
+
+context_registry = ContextRegistry()
+
+# database_compact.md: the strategy rules (PilotDeps.system_rules) and the schema prompt
+context_registry.register("compact", "database_compact.md", fragments={"schema": "DATABASE_CONTEXT:\n"})
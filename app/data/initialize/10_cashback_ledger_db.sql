@@ -0,0 +1,21 @@
+-- ==========================================================
+-- CASHBACK LEDGER
+-- One row per cashback-earning detail line, assigned to the wallet's
+-- statement cycle (month_year = month the cycle closes, from cycle_day)
+-- by app/utils/cashback_ledger.py. 'credited' is what is left of
+-- 'earned' after monthly_cashback_limit is applied in billing order;
+-- wallet_cashback_history holds the per-cycle SUM(credited).
+-- No foreign key on detail_id: deleted lines are removed by
+-- record_cashback so their cycle can be re-settled.
+-- ==========================================================
+CREATE TABLE IF NOT EXISTS cashback_ledger (
+    detail_id INTEGER PRIMARY KEY,
+    wallet_id INTEGER NOT NULL,
+    month_year TEXT NOT NULL,
+    -- 'YYYY-MM' statement cycle
+    billing_date DATE NOT NULL,
+    earned REAL NOT NULL,
+    credited REAL NOT NULL DEFAULT 0.0
+);
+
+CREATE INDEX IF NOT EXISTS idx_cashback_ledger_cycle ON cashback_ledger(wallet_id, month_year, billing_date, detail_id);
@@ -19,7 +19,6 @@ CREATE TABLE IF NOT EXISTS wallets (
     -- FK to providers.id
     color TEXT DEFAULT '#3b82f6',
     -- e.g. '#3b82f6'
-    FOREIGN KEY (provider_id) REFERENCES providers(id),
     type TEXT CHECK(
         type IN (
             'credit',
@@ -43,7 +42,8 @@ CREATE TABLE IF NOT EXISTS wallets (
     version INTEGER DEFAULT 1,
     -- For optimistic locking
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (provider_id) REFERENCES providers(id)
 );
 -- Table 2b: wallet_benefits
 -- Normalized benefits table supporting both credit card cashback and debit card interest rates
@@ -300,4 +300,4 @@ CREATE TABLE IF NOT EXISTS recurring_expenses (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (category_id) REFERENCES categories(id),
     FOREIGN KEY (default_wallet_id) REFERENCES wallets(id)
-);
\ No newline at end of file
+);
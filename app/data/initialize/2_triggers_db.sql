@@ -115,6 +115,7 @@ SET balance = CASE
 WHERE id = NEW.wallet_id;
 END;
 -- NEW TRIGGER: Match transaction to recurring expense
+-- (Superseded by app/utils/detail_effects.py, dropped in 9_detail_effects_db.sql)
 -- Links transaction_details to recurring_expenses if category and amount (approx) match
 CREATE TRIGGER IF NOT EXISTS match_transaction_to_recurring
 AFTER
@@ -140,6 +141,7 @@ END;
 -- ==========================================================
 -- 3. CASHBACK OPTIMIZATION (THE ₱1,500 CAP LOGIC)
 -- ==========================================================
+-- (Superseded by app/utils/detail_effects.py, dropped in 9_detail_effects_db.sql)
 CREATE TRIGGER IF NOT EXISTS manage_cashback_and_history
 AFTER
 INSERT ON transaction_details FOR EACH ROW
@@ -0,0 +1,80 @@
+-- ==========================================================
+-- DELTA SYNC SUPPORT (GET /api/state/changes)
+-- Every synced table needs a maintained updated_at, an index on it,
+-- and a tombstone on delete so clients can drop removed rows.
+-- ==========================================================
+-- 1. Missing updated_at maintenance
+-- (trg_wallets_updated_at is in 2_triggers_db.sql but absent from older databases)
+CREATE TRIGGER IF NOT EXISTS trg_wallets_updated_at
+AFTER
+UPDATE ON wallets BEGIN
+UPDATE wallets
+SET updated_at = CURRENT_TIMESTAMP
+WHERE id = OLD.id;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_savings_goals_updated_at
+AFTER
+UPDATE ON savings_goals BEGIN
+UPDATE savings_goals
+SET updated_at = CURRENT_TIMESTAMP
+WHERE id = OLD.id;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_strategic_recommendations_updated_at
+AFTER
+UPDATE ON strategic_recommendations BEGIN
+UPDATE strategic_recommendations
+SET updated_at = CURRENT_TIMESTAMP
+WHERE id = OLD.id;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_monthly_budgets_updated_at
+AFTER
+UPDATE ON monthly_budgets BEGIN
+UPDATE monthly_budgets
+SET updated_at = CURRENT_TIMESTAMP
+WHERE id = OLD.id;
+END;
+-- 2. Change-feed indexes
+CREATE INDEX IF NOT EXISTS idx_transaction_headers_updated_at ON transaction_headers(updated_at);
+CREATE INDEX IF NOT EXISTS idx_transaction_details_updated_at ON transaction_details(updated_at);
+CREATE INDEX IF NOT EXISTS idx_wallets_updated_at ON wallets(updated_at);
+CREATE INDEX IF NOT EXISTS idx_savings_goals_updated_at ON savings_goals(updated_at);
+CREATE INDEX IF NOT EXISTS idx_strategic_recommendations_updated_at ON strategic_recommendations(updated_at);
+CREATE INDEX IF NOT EXISTS idx_monthly_budgets_updated_at ON monthly_budgets(updated_at);
+-- 3. Tombstones for deleted rows
+CREATE TABLE IF NOT EXISTS sync_tombstones (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    table_name TEXT NOT NULL,
+    row_id INTEGER NOT NULL,
+    deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_sync_tombstones_deleted_at ON sync_tombstones(deleted_at);
+CREATE TRIGGER IF NOT EXISTS trg_transaction_headers_tombstone
+AFTER DELETE ON transaction_headers BEGIN
+INSERT INTO sync_tombstones (table_name, row_id)
+VALUES ('transaction_headers', OLD.id);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_transaction_details_tombstone
+AFTER DELETE ON transaction_details BEGIN
+INSERT INTO sync_tombstones (table_name, row_id)
+VALUES ('transaction_details', OLD.id);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_wallets_tombstone
+AFTER DELETE ON wallets BEGIN
+INSERT INTO sync_tombstones (table_name, row_id)
+VALUES ('wallets', OLD.id);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_savings_goals_tombstone
+AFTER DELETE ON savings_goals BEGIN
+INSERT INTO sync_tombstones (table_name, row_id)
+VALUES ('savings_goals', OLD.id);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_strategic_recommendations_tombstone
+AFTER DELETE ON strategic_recommendations BEGIN
+INSERT INTO sync_tombstones (table_name, row_id)
+VALUES ('strategic_recommendations', OLD.id);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_monthly_budgets_tombstone
+AFTER DELETE ON monthly_budgets BEGIN
+INSERT INTO sync_tombstones (table_name, row_id)
+VALUES ('monthly_budgets', OLD.id);
+END;
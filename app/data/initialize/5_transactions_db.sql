@@ -0,0 +1,9 @@
+-- ==========================================================
+-- TRANSACTION LISTING INDEXES (GET /api/transactions)
+-- Keyset pagination walks (transaction_date, id) newest first;
+-- the wallet index serves the per-wallet filter with the same order.
+-- ==========================================================
+CREATE INDEX IF NOT EXISTS idx_transaction_headers_date_id ON transaction_headers(transaction_date, id);
+CREATE INDEX IF NOT EXISTS idx_transaction_headers_wallet_date_id ON transaction_headers(wallet_id, transaction_date, id);
+CREATE INDEX IF NOT EXISTS idx_transaction_details_header ON transaction_details(header_id);
+CREATE INDEX IF NOT EXISTS idx_transaction_details_category_header ON transaction_details(category_id, header_id);
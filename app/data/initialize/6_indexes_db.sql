@@ -0,0 +1,23 @@
+-- ==========================================================
+-- HOT-PATH INDEX SET
+-- Derived from `python -m app.db.query_audit`: every index below removes a
+-- full table scan or temp B-tree from a query the app or its triggers issue.
+-- (transaction_headers.wallet_id / transaction_date and
+-- transaction_details.header_id are covered by 5_transactions_db.sql.)
+-- ==========================================================
+-- Billing-period spend per category (budgets, dashboard_diagnostic.sql)
+CREATE INDEX IF NOT EXISTS idx_transaction_details_category_billing ON transaction_details(category_id, billing_date);
+-- Income per wallet (balances); covering so SUM(amount) never touches the table
+CREATE INDEX IF NOT EXISTS idx_income_transactions_wallet ON income_transactions(wallet_id, amount);
+CREATE INDEX IF NOT EXISTS idx_income_transactions_updated_at ON income_transactions(updated_at);
+-- Chat history per session in time order
+CREATE INDEX IF NOT EXISTS idx_chat_logs_session_timestamp ON chat_logs(session_id, timestamp);
+-- Active benefits per wallet (cashback lookups, /api/state)
+CREATE INDEX IF NOT EXISTS idx_wallet_benefits_wallet_active ON wallet_benefits(wallet_id, is_active);
+-- Recurring-expense matching trigger
+CREATE INDEX IF NOT EXISTS idx_recurring_expenses_category ON recurring_expenses(category_id);
+-- Month-scoped dashboard sections (the UNIQUE indexes lead with category/wallet)
+CREATE INDEX IF NOT EXISTS idx_monthly_budgets_month ON monthly_budgets(month_year);
+CREATE INDEX IF NOT EXISTS idx_wallet_cashback_history_month ON wallet_cashback_history(month_year);
+-- Recommendations feed ordering
+CREATE INDEX IF NOT EXISTS idx_strategic_recommendations_created_at ON strategic_recommendations(created_at);
@@ -0,0 +1,205 @@
+-- ==========================================================
+-- MATERIALIZED WALLET BALANCES
+-- One row per wallet holding the running totals every balance is derived
+-- from, kept current by the triggers below so readers never aggregate
+-- over the transaction history.
+--   spent_total   = SUM(transaction_details.line_amount) on the wallet's headers
+--   charged_total = SUM(transaction_headers.total_amount)
+--   income_total  = SUM(income_transactions.amount)
+-- Verify against a full recompute with:
+--   python -m app.utils.wallet_balances --verify
+-- ==========================================================
+CREATE TABLE IF NOT EXISTS wallet_balances (
+    wallet_id INTEGER PRIMARY KEY,
+    spent_total REAL NOT NULL DEFAULT 0.0,
+    charged_total REAL NOT NULL DEFAULT 0.0,
+    income_total REAL NOT NULL DEFAULT 0.0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (wallet_id) REFERENCES wallets(id) ON DELETE CASCADE
+);
+-- 1. Backfill from the existing history
+INSERT OR REPLACE INTO wallet_balances (wallet_id, spent_total, charged_total, income_total)
+SELECT w.id,
+    COALESCE(s.spent_total, 0.0),
+    COALESCE(c.charged_total, 0.0),
+    COALESCE(i.income_total, 0.0)
+FROM wallets w
+    LEFT JOIN (
+        SELECT th.wallet_id, SUM(td.line_amount) AS spent_total
+        FROM transaction_headers th
+            JOIN transaction_details td ON th.id = td.header_id
+        GROUP BY th.wallet_id
+    ) s ON s.wallet_id = w.id
+    LEFT JOIN (
+        SELECT wallet_id, SUM(total_amount) AS charged_total
+        FROM transaction_headers
+        GROUP BY wallet_id
+    ) c ON c.wallet_id = w.id
+    LEFT JOIN (
+        SELECT wallet_id, SUM(amount) AS income_total
+        FROM income_transactions
+        GROUP BY wallet_id
+    ) i ON i.wallet_id = w.id;
+-- 2. Wallet lifecycle
+CREATE TRIGGER IF NOT EXISTS trg_wallet_balances_wallet_insert
+AFTER
+INSERT ON wallets BEGIN
+INSERT OR IGNORE INTO wallet_balances (wallet_id)
+VALUES (NEW.id);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_wallet_balances_wallet_delete
+AFTER DELETE ON wallets BEGIN
+DELETE FROM wallet_balances
+WHERE wallet_id = OLD.id;
+END;
+-- 3. Transaction headers
+CREATE TRIGGER IF NOT EXISTS trg_wallet_balances_header_insert
+AFTER
+INSERT ON transaction_headers BEGIN
+UPDATE wallet_balances
+SET charged_total = charged_total + NEW.total_amount,
+    updated_at = CURRENT_TIMESTAMP
+WHERE wallet_id = NEW.wallet_id;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_wallet_balances_header_update
+AFTER
+UPDATE OF wallet_id, total_amount ON transaction_headers BEGIN
+UPDATE wallet_balances
+SET charged_total = charged_total - OLD.total_amount,
+    spent_total = spent_total - CASE
+        WHEN OLD.wallet_id IS NOT NEW.wallet_id THEN (
+            SELECT COALESCE(SUM(line_amount), 0.0)
+            FROM transaction_details
+            WHERE header_id = OLD.id
+        )
+        ELSE 0.0
+    END,
+    updated_at = CURRENT_TIMESTAMP
+WHERE wallet_id = OLD.wallet_id;
+UPDATE wallet_balances
+SET charged_total = charged_total + NEW.total_amount,
+    spent_total = spent_total + CASE
+        WHEN OLD.wallet_id IS NOT NEW.wallet_id THEN (
+            SELECT COALESCE(SUM(line_amount), 0.0)
+            FROM transaction_details
+            WHERE header_id = NEW.id
+        )
+        ELSE 0.0
+    END,
+    updated_at = CURRENT_TIMESTAMP
+WHERE wallet_id = NEW.wallet_id;
+END;
+-- BEFORE so the detail lines are still attached; the detail delete trigger
+-- is a no-op for lines whose header is already gone (ON DELETE CASCADE).
+CREATE TRIGGER IF NOT EXISTS trg_wallet_balances_header_delete
+BEFORE DELETE ON transaction_headers BEGIN
+UPDATE wallet_balances
+SET charged_total = charged_total - OLD.total_amount,
+    spent_total = spent_total - (
+        SELECT COALESCE(SUM(line_amount), 0.0)
+        FROM transaction_details
+        WHERE header_id = OLD.id
+    ),
+    updated_at = CURRENT_TIMESTAMP
+WHERE wallet_id = OLD.wallet_id;
+END;
+-- 4. Transaction details
+CREATE TRIGGER IF NOT EXISTS trg_wallet_balances_detail_insert
+AFTER
+INSERT ON transaction_details BEGIN
+UPDATE wallet_balances
+SET spent_total = spent_total + NEW.line_amount,
+    updated_at = CURRENT_TIMESTAMP
+WHERE wallet_id = (
+        SELECT wallet_id
+        FROM transaction_headers
+        WHERE id = NEW.header_id
+    );
+END;
+CREATE TRIGGER IF NOT EXISTS trg_wallet_balances_detail_update
+AFTER
+UPDATE OF header_id, line_amount ON transaction_details BEGIN
+UPDATE wallet_balances
+SET spent_total = spent_total - OLD.line_amount,
+    updated_at = CURRENT_TIMESTAMP
+WHERE wallet_id = (
+        SELECT wallet_id
+        FROM transaction_headers
+        WHERE id = OLD.header_id
+    );
+UPDATE wallet_balances
+SET spent_total = spent_total + NEW.line_amount,
+    updated_at = CURRENT_TIMESTAMP
+WHERE wallet_id = (
+        SELECT wallet_id
+        FROM transaction_headers
+        WHERE id = NEW.header_id
+    );
+END;
+CREATE TRIGGER IF NOT EXISTS trg_wallet_balances_detail_delete
+AFTER DELETE ON transaction_details BEGIN
+UPDATE wallet_balances
+SET spent_total = spent_total - OLD.line_amount,
+    updated_at = CURRENT_TIMESTAMP
+WHERE wallet_id = (
+        SELECT wallet_id
+        FROM transaction_headers
+        WHERE id = OLD.header_id
+    );
+END;
+-- 5. Income
+CREATE TRIGGER IF NOT EXISTS trg_wallet_balances_income_insert
+AFTER
+INSERT ON income_transactions BEGIN
+UPDATE wallet_balances
+SET income_total = income_total + NEW.amount,
+    updated_at = CURRENT_TIMESTAMP
+WHERE wallet_id = NEW.wallet_id;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_wallet_balances_income_update
+AFTER
+UPDATE OF wallet_id, amount ON income_transactions BEGIN
+UPDATE wallet_balances
+SET income_total = income_total - OLD.amount,
+    updated_at = CURRENT_TIMESTAMP
+WHERE wallet_id = OLD.wallet_id;
+UPDATE wallet_balances
+SET income_total = income_total + NEW.amount,
+    updated_at = CURRENT_TIMESTAMP
+WHERE wallet_id = NEW.wallet_id;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_wallet_balances_income_delete
+AFTER DELETE ON income_transactions BEGIN
+UPDATE wallet_balances
+SET income_total = income_total - OLD.amount,
+    updated_at = CURRENT_TIMESTAMP
+WHERE wallet_id = OLD.wallet_id;
+END;
+-- 6. Derived balances for every reader (dashboard, agents, reconciliation)
+--   balance          : dashboard figure (credit = total spent, others = total income)
+--   ledger_balance   : credit = debt (charged - income), others = cash (income - charged)
+--   available_credit : credit_limit - ledger_balance for credit cards, 0 otherwise
+CREATE VIEW IF NOT EXISTS wallet_balance_view AS
+SELECT w.id AS wallet_id,
+    w.name,
+    w.type,
+    w.credit_limit,
+    COALESCE(wb.spent_total, 0.0) AS spent_total,
+    COALESCE(wb.charged_total, 0.0) AS charged_total,
+    COALESCE(wb.income_total, 0.0) AS income_total,
+    CASE
+        WHEN w.type = 'credit' THEN COALESCE(wb.spent_total, 0.0)
+        ELSE COALESCE(wb.income_total, 0.0)
+    END AS balance,
+    CASE
+        WHEN w.type = 'credit' THEN COALESCE(wb.charged_total, 0.0) - COALESCE(wb.income_total, 0.0)
+        ELSE COALESCE(wb.income_total, 0.0) - COALESCE(wb.charged_total, 0.0)
+    END AS ledger_balance,
+    CASE
+        WHEN w.type = 'credit' THEN COALESCE(w.credit_limit, 0.0) - (
+            COALESCE(wb.charged_total, 0.0) - COALESCE(wb.income_total, 0.0)
+        )
+        ELSE 0.0
+    END AS available_credit
+FROM wallets w
+    LEFT JOIN wallet_balances wb ON wb.wallet_id = w.id;
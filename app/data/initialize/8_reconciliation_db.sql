@@ -0,0 +1,14 @@
+-- ==========================================================
+-- WALLET RECONCILIATION RUNS (app/utils/reconciliation.py)
+-- Each applied run is recorded; the latest started_at is the watermark
+-- incremental runs use to pick the wallets touched since.
+-- ==========================================================
+CREATE TABLE IF NOT EXISTS reconciliation_runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at TIMESTAMP NOT NULL,
+    finished_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    mode TEXT CHECK(mode IN ('full', 'incremental')),
+    checked INTEGER NOT NULL DEFAULT 0,
+    drifted INTEGER NOT NULL DEFAULT 0,
+    written INTEGER NOT NULL DEFAULT 0
+);
@@ -0,0 +1,8 @@
+-- ==========================================================
+-- SET-BASED DETAIL PROCESSING
+-- Recurring matching and cashback accounting for new transaction_details
+-- now run once per batch in app/utils/detail_effects.py instead of once
+-- per row in these triggers.
+-- ==========================================================
+DROP TRIGGER IF EXISTS match_transaction_to_recurring;
+DROP TRIGGER IF EXISTS manage_cashback_and_history;
@@ -1,5 +1,6 @@
 import sqlite3
 import os
+import re
 
 # Get the directory where this script is located
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -22,6 +23,15 @@ def run_sql_file(cursor, file_path):
     else:
         print(f"⚠️ Warning: {full_path} not found.")
 
+def list_migration_files():
+    """Migration scripts (numbered 4 and above) in apply order."""
+    files = []
+    for name in os.listdir(BASE_DIR):
+        match = re.match(r"^(\d+)_.*\.sql$", name)
+        if match and int(match.group(1)) >= 4:
+            files.append((int(match.group(1)), name))
+    return [name for _, name in sorted(files)]
+
 def init_db():
     print(f"🗄️ Initializing database at: {DB_PATH}")
     conn = sqlite3.connect(DB_PATH)
@@ -35,6 +45,17 @@ def init_db():
 
     # Step 3: Insert records in the tables
     run_sql_file(cursor, '3_insert_records.sql')
+
+    # Step 4: Apply migrations, recorded so the app does not re-run them
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            name TEXT PRIMARY KEY,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    for file_name in list_migration_files():
+        run_sql_file(cursor, file_name)
+        cursor.execute("INSERT OR IGNORE INTO schema_migrations (name) VALUES (?)", (file_name,))
     
     conn.commit()
     conn.close()
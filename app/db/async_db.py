@@ -0,0 +1,143 @@
+"""
+Async SQLite Facade
+
+sqlite3 calls block, so running them inside `async def` handlers stalls every
+other request on the event loop (including in-flight chat streams) for the
+length of the query. This module runs blocking database work on a dedicated,
+bounded thread pool and awaits the result:
+
+    rows = await run_db(list_transactions, db, limit=20)
+
+The pool is separate from Starlette's shared threadpool so database work cannot
+starve (or be starved by) other blocking calls. Connections from
+get_db_session are created with check_same_thread=False, so nothing here stops
+two threads from using one connection at once: callers must await their calls
+on a connection one at a time. Route handlers do; agent tools of one turn run
+concurrently and go through PilotDeps.run_db, which serializes them. A
+cancelled caller still waits for a call that already started, so the
+connection is idle by the time the cancellation unwinds its owner.
+Queue depth and wait/run times are reported under /metrics/db.
+"""
+
+import asyncio
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+# Worker threads for database calls (overridable via environment)
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", "4"))
+
+
+class DatabaseExecutor:
+    """
+    Bounded thread pool for blocking sqlite3 work, with queue-depth metrics.
+
+    Args:
+        name: Executor label used for thread names and metrics
+        max_workers: Number of worker threads
+    """
+
+    def __init__(self, name: str = "sqlite", max_workers: int = DB_EXECUTOR_WORKERS):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+        # Metrics
+        self._queued = 0
+        self._running = 0
+        self._max_queued = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._total_run = 0.0
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) on a worker thread and await its result."""
+        submitted_at = time.perf_counter()
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+            executor = self._executor
+            self._submitted += 1
+            self._queued += 1
+            self._max_queued = max(self._max_queued, self._queued)
+
+        call = functools.partial(self._call, submitted_at, fn, *args, **kwargs)
+        submitted = executor.submit(call)
+        future = asyncio.wrap_future(submitted)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if submitted.cancel():
+                with self._lock:
+                    self._queued -= 1
+            else:
+                # The call is already running on the caller's connection: let it
+                # finish before the cancellation reaches code that rolls the
+                # connection back or hands it to another request
+                while not future.done():
+                    try:
+                        await asyncio.wait([future])
+                    except asyncio.CancelledError:
+                        pass
+            raise
+
+    def _call(self, submitted_at: float, fn: Callable, *args, **kwargs) -> Any:
+        started_at = time.perf_counter()
+        wait = started_at - submitted_at
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+
+        failed = False
+        try:
+            return fn(*args, **kwargs)
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+                self._failed += 1 if failed else 0
+                self._total_run += time.perf_counter() - started_at
+
+    def shutdown(self) -> None:
+        """Finish queued work and stop the worker threads (restarted on next use)."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def stats(self) -> Dict:
+        """Snapshot of queue depth and wait/run time metrics."""
+        with self._lock:
+            return {
+                "name": self.name,
+                "max_workers": self.max_workers,
+                "queued": self._queued,
+                "running": self._running,
+                "max_queued": self._max_queued,
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "failed": self._failed,
+                "avg_wait_ms": round(self._total_wait / self._completed * 1000, 3) if self._completed else 0.0,
+                "max_wait_ms": round(self._max_wait * 1000, 3),
+                "avg_run_ms": round(self._total_run / self._completed * 1000, 3) if self._completed else 0.0,
+            }
+
+
+db_executor = DatabaseExecutor()
+
+
+async def run_db(fn: Callable, *args, **kwargs) -> Any:
+    """Await blocking database work on the shared database executor."""
+    return await db_executor.run(fn, *args, **kwargs)
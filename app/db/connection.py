@@ -1,26 +1,45 @@
 import sqlite3
 import os
+import threading
 from contextlib import contextmanager
 from dotenv import load_dotenv
+from .pool import ConnectionPool
+from .pragmas import apply_pragma_profile, check_pragma_profile
+from .checkpoint import CheckpointScheduler
 
 # Load environment variables
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
 load_dotenv(os.path.join(project_root, ".env"))
 load_dotenv(os.path.join(project_root, ".env.local"))
 
+# Pool sizing (overridable via environment)
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+READONLY_POOL_SIZE = int(os.getenv("DB_READONLY_POOL_SIZE", "10"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+
+_pools = {}
+_pools_lock = threading.Lock()
+_profile_report = None
+
+def get_db_path():
+    """
+    Resolve the SQLite file path (Cloud Run mount or DATABASE_PATH).
+    """
+    if os.getenv("K_SERVICE"):
+        return "/mnt/data/waiswallet.db"
+
+    env_db_path = os.getenv("DATABASE_PATH", "app/data/waiswallet.db")
+    if os.path.isabs(env_db_path):
+        return env_db_path
+    return os.path.abspath(os.path.join(project_root, env_db_path))
+
 def _get_db_logic(readonly=False):
     """
     Core logic for determining DB path and connecting.
+    Opens a new, fully configured connection (pooled callers reuse these).
     """
     # 1. Determine DB Path
-    if os.getenv("K_SERVICE"):
-        db_path = "/mnt/data/waiswallet.db"
-    else:
-        env_db_path = os.getenv("DATABASE_PATH", "app/data/waiswallet.db")
-        if os.path.isabs(env_db_path):
-            db_path = env_db_path
-        else:
-            db_path = os.path.abspath(os.path.join(project_root, env_db_path))
+    db_path = get_db_path()
 
     # 2. Connect
     if readonly:
@@ -29,31 +48,76 @@ def _get_db_logic(readonly=False):
         conn = sqlite3.connect(db_uri, uri=True, check_same_thread=False)
     else:
         conn = sqlite3.connect(db_path, check_same_thread=False)
-        
+
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA foreign_keys = ON;")
+    apply_pragma_profile(conn, readonly=readonly)
     return conn, db_path
 
+def get_pool(readonly=False) -> ConnectionPool:
+    """
+    Lazily create the read-write or read-only pool for the current DB path.
+    """
+    key = (get_db_path(), readonly)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = ConnectionPool(
+                    name="read_only" if readonly else "read_write",
+                    factory=lambda: _get_db_logic(readonly=readonly)[0],
+                    max_size=READONLY_POOL_SIZE if readonly else POOL_SIZE,
+                    timeout=POOL_TIMEOUT,
+                )
+                _pools[key] = pool
+    return pool
+
+def get_pool_stats():
+    """
+    Size and wait-time metrics for every open pool.
+    """
+    return [pool.stats() for pool in list(_pools.values())]
+
+def close_pools():
+    """
+    Close all pooled connections (called on application shutdown).
+    """
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+def check_db_profile():
+    """
+    Startup check: report which PRAGMA profile is active on the database.
+    """
+    global _profile_report
+    with get_db_connection() as conn:
+        _profile_report = check_pragma_profile(conn)
+    return _profile_report
+
+def get_db_profile_report():
+    """
+    Result of the last startup profile check (None if it has not run).
+    """
+    return _profile_report
+
 def get_db_session():
     """
     FastAPI-friendly generator for dependency injection (Read-Write).
     """
-    conn, _ = _get_db_logic(readonly=False)
-    try:
+    with get_pool(readonly=False).connection() as conn:
         yield conn
-    finally:
-        conn.close()
 
 def get_readonly_db_session():
     """
     FastAPI-friendly generator for dependency injection (Read-Only).
     Use this for AI agent tools to prevent accidental/malicious data modification.
     """
-    conn, _ = _get_db_logic(readonly=True)
-    try:
+    with get_pool(readonly=True).connection() as conn:
         yield conn
-    finally:
-        conn.close()
 
 @contextmanager
 def get_db_connection(readonly=False):
@@ -61,8 +125,8 @@ def get_db_connection(readonly=False):
     Thread-safe connection context manager for standalone scripts.
     Usage: with get_db_connection() as conn:
     """
-    conn, _ = _get_db_logic(readonly=readonly)
-    try:
+    with get_pool(readonly=readonly).connection() as conn:
         yield conn
-    finally:
-        conn.close()
\ No newline at end of file
+
+# Periodic WAL checkpoints (started by the application lifespan)
+checkpoint_scheduler = CheckpointScheduler(lambda: get_db_connection())
@@ -0,0 +1,56 @@
+"""
+Schema Migrations
+
+Scripts in app/data/initialize numbered 4 and above are migrations layered on
+top of the base schema (1_create_db.sql, 2_triggers_db.sql). They are applied
+in order on startup and recorded in schema_migrations so each runs once per
+database. Every script must also be safe to re-run (IF NOT EXISTS etc.).
+"""
+
+import os
+import re
+import sqlite3
+from typing import List
+
+from ..core.logger import logger
+
+MIGRATIONS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data", "initialize"))
+FIRST_MIGRATION = 4
+
+
+def list_migrations() -> List[str]:
+    """Migration file names in apply order."""
+    migrations = []
+    for name in os.listdir(MIGRATIONS_DIR):
+        match = re.match(r"^(\d+)_.*\.sql$", name)
+        if match and int(match.group(1)) >= FIRST_MIGRATION:
+            migrations.append((int(match.group(1)), name))
+    return [name for _, name in sorted(migrations)]
+
+
+def apply_migrations(conn: sqlite3.Connection) -> List[str]:
+    """
+    Apply pending migrations to a read-write connection.
+
+    Returns:
+        Names of the migrations applied by this call
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            name TEXT PRIMARY KEY,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    applied = {row[0] for row in conn.execute("SELECT name FROM schema_migrations").fetchall()}
+
+    newly_applied = []
+    for name in list_migrations():
+        if name in applied:
+            continue
+        with open(os.path.join(MIGRATIONS_DIR, name), "r", encoding="utf-8") as f:
+            conn.executescript(f.read())
+        conn.execute("INSERT INTO schema_migrations (name) VALUES (?)", (name,))
+        conn.commit()
+        newly_applied.append(name)
+        logger.info(f"Applied schema migration '{name}'")
+    return newly_applied
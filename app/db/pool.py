@@ -0,0 +1,171 @@
+"""
+Bounded SQLite Connection Pool
+
+Connections are opened and configured once (row_factory, PRAGMAs) and then
+reused across requests instead of paying the connect/teardown cost every time.
+Each pool tracks its own size and wait-time metrics for the /metrics endpoints.
+"""
+
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List
+
+from ..core.exceptions import DatabaseError
+from ..core.logger import logger
+
+
+class ConnectionPool:
+    """
+    Thread-safe, bounded pool of pre-configured sqlite3 connections.
+
+    Args:
+        name: Pool label used in logs and metrics (e.g. 'read_write')
+        factory: Callable returning a fully configured connection
+        max_size: Maximum number of open connections
+        timeout: Seconds to wait for a free connection before failing
+    """
+
+    def __init__(self, name: str, factory: Callable[[], sqlite3.Connection], max_size: int = 5, timeout: float = 10.0):
+        self.name = name
+        self._factory = factory
+        self.max_size = max(1, max_size)
+        self.timeout = timeout
+
+        self._idle: List[sqlite3.Connection] = []
+        self._open = 0
+        self._closed = False
+        self._cond = threading.Condition(threading.Lock())
+
+        # Metrics
+        self._acquisitions = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._discarded = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def acquire(self) -> sqlite3.Connection:
+        """Borrow a healthy connection, opening a new one if the pool has room."""
+        start = time.perf_counter()
+        waited = False
+
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise DatabaseError(f"Connection pool '{self.name}' is closed")
+
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+
+                if self._open < self.max_size:
+                    # Reserve the slot, connect outside the lock
+                    self._open += 1
+                    conn = None
+                    break
+
+                waited = True
+                remaining = self.timeout - (time.perf_counter() - start)
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    if not self._idle and self._open >= self.max_size:
+                        self._timeouts += 1
+                        raise DatabaseError(
+                            f"Connection pool '{self.name}' exhausted after {self.timeout}s "
+                            f"(max_size={self.max_size})"
+                        )
+
+        if conn is None:
+            try:
+                conn = self._factory()
+            except Exception:
+                self._release_slot()
+                raise
+        elif not self._is_healthy(conn):
+            logger.warning(f"Discarding unhealthy connection from pool '{self.name}'")
+            self._discard(conn)
+            return self.acquire()
+
+        wait = time.perf_counter() - start
+        with self._cond:
+            self._acquisitions += 1
+            if waited:
+                self._waits += 1
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+        return conn
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        """Return a connection, rolling back any transaction left open by the caller."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+
+        with self._cond:
+            if self._closed:
+                self._open -= 1
+                conn.close()
+                return
+            self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Context manager that borrows a connection and always returns it."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self) -> None:
+        """Close idle connections and refuse new checkouts."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            conn.close()
+
+    def stats(self) -> Dict:
+        """Snapshot of pool size and wait-time metrics."""
+        with self._cond:
+            return {
+                "name": self.name,
+                "max_size": self.max_size,
+                "open": self._open,
+                "idle": len(self._idle),
+                "in_use": self._open - len(self._idle),
+                "acquisitions": self._acquisitions,
+                "waits": self._waits,
+                "timeouts": self._timeouts,
+                "discarded": self._discarded,
+                "avg_wait_ms": round(self._total_wait / self._acquisitions * 1000, 3) if self._acquisitions else 0.0,
+                "max_wait_ms": round(self._max_wait * 1000, 3),
+            }
+
+    def _is_healthy(self, conn: sqlite3.Connection) -> bool:
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _discard(self, conn: sqlite3.Connection) -> None:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._cond:
+            self._discarded += 1
+        self._release_slot()
+
+    def _release_slot(self) -> None:
+        with self._cond:
+            self._open -= 1
+            self._cond.notify()
@@ -0,0 +1,120 @@
+"""
+SQLite PRAGMA Profiles
+
+A profile is the set of per-connection PRAGMAs applied when a connection is
+opened. The active profile is chosen with DB_PRAGMA_PROFILE and individual
+values can be overridden with DB_PRAGMA_<NAME> (e.g. DB_PRAGMA_CACHE_SIZE).
+
+- 'wal' (default): WAL journal so readers never block on writers.
+- 'durable': WAL with synchronous=FULL for maximum crash safety.
+- 'compat': rollback journal, for network filesystems without shared memory.
+"""
+
+import os
+import sqlite3
+from typing import Dict
+
+from ..core.logger import logger
+
+PRAGMA_PROFILES: Dict[str, Dict[str, object]] = {
+    "wal": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -20000,       # ~20 MB page cache (negative = KiB)
+        "mmap_size": 268435456,     # 256 MB memory-mapped I/O
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,       # ms to wait on a locked database
+        "wal_autocheckpoint": 1000,  # pages
+    },
+    "durable": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "cache_size": -20000,
+        "mmap_size": 268435456,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+        "wal_autocheckpoint": 1000,
+    },
+    "compat": {
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+        "cache_size": -2000,
+        "mmap_size": 0,
+        "temp_store": "DEFAULT",
+        "busy_timeout": 5000,
+    },
+}
+
+DEFAULT_PROFILE = "wal"
+
+# PRAGMAs that persist in the database file and need write access to change
+_PERSISTENT_PRAGMAS = {"journal_mode"}
+
+# Numeric PRAGMA values reported back by SQLite as enum codes
+_ENUM_NAMES = {
+    "synchronous": {0: "OFF", 1: "NORMAL", 2: "FULL", 3: "EXTRA"},
+    "temp_store": {0: "DEFAULT", 1: "FILE", 2: "MEMORY"},
+}
+
+
+def get_profile_name() -> str:
+    """Name of the configured profile, falling back to the default."""
+    name = os.getenv("DB_PRAGMA_PROFILE", DEFAULT_PROFILE).lower()
+    if name not in PRAGMA_PROFILES:
+        logger.warning(f"Unknown DB_PRAGMA_PROFILE '{name}', using '{DEFAULT_PROFILE}'")
+        return DEFAULT_PROFILE
+    return name
+
+
+def get_pragma_profile() -> Dict[str, object]:
+    """Resolved PRAGMA values for the active profile, including env overrides."""
+    profile = dict(PRAGMA_PROFILES[get_profile_name()])
+    for pragma in profile:
+        override = os.getenv(f"DB_PRAGMA_{pragma.upper()}")
+        if override is not None:
+            profile[pragma] = override
+    return profile
+
+
+def apply_pragma_profile(conn: sqlite3.Connection, readonly: bool = False) -> None:
+    """Apply the active profile to a freshly opened connection."""
+    for pragma, value in get_pragma_profile().items():
+        if readonly and pragma in _PERSISTENT_PRAGMAS:
+            continue
+        try:
+            conn.execute(f"PRAGMA {pragma} = {value};")
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to apply PRAGMA {pragma}='{value}': {e}")
+
+
+def inspect_pragmas(conn: sqlite3.Connection) -> Dict[str, object]:
+    """Read back the effective value of every PRAGMA in the active profile."""
+    effective = {}
+    for pragma in get_pragma_profile():
+        row = conn.execute(f"PRAGMA {pragma};").fetchone()
+        value = row[0] if row else None
+        effective[pragma] = _ENUM_NAMES.get(pragma, {}).get(value, value)
+    return effective
+
+
+def check_pragma_profile(conn: sqlite3.Connection) -> Dict:
+    """
+    Startup check: report the active profile and flag any PRAGMA that did
+    not take effect (e.g. WAL refused by the filesystem).
+    """
+    expected = get_pragma_profile()
+    effective = inspect_pragmas(conn)
+
+    mismatches = {}
+    for pragma, value in expected.items():
+        actual = effective.get(pragma)
+        if str(actual).lower() != str(value).lower():
+            mismatches[pragma] = {"expected": value, "actual": actual}
+
+    name = get_profile_name()
+    settings = ", ".join(f"{k}='{v}'" for k, v in effective.items())
+    logger.info(f"Active SQLite PRAGMA profile '{name}': {settings}")
+    for pragma, diff in mismatches.items():
+        logger.warning(f"PRAGMA {pragma} expected '{diff['expected']}' but is '{diff['actual']}'")
+
+    return {"profile": name, "effective": effective, "mismatches": mismatches}
@@ -0,0 +1,370 @@
+"""
+Query Plan Audit
+
+Exercises the app's read paths (dashboard state, transaction listing, delta
+sync, cashback lookups, chat history, trigger lookups and the queries in
+dashboard_diagnostic.sql) with a trace callback, then runs EXPLAIN QUERY PLAN
+over every distinct statement captured and reports full table scans and
+temporary B-trees.
+
+Usage (from the project root):
+    python -m app.db.query_audit                       # audit the configured database
+    python -m app.db.query_audit --synthetic 200000    # before/after index timings on generated data
+"""
+
+import argparse
+import os
+import random
+import re
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from app.utils.app_state import build_app_state
+from app.utils.state_sync import get_state_changes
+from app.utils.sql_templates import TEMPLATES, answer_from_template
+from app.utils.transactions import list_transactions
+from app.utils.wallet_benefits import get_cashback_rate, get_wallet_benefits
+
+INITIALIZE_DIR = os.path.join(project_root, "app", "data", "initialize")
+DIAGNOSTIC_SQL = os.path.join(project_root, "dashboard_diagnostic.sql")
+
+# Tables at or below this many rows are reported but not flagged
+SMALL_TABLE_ROWS = 1000
+
+# Lookups performed inside triggers (2_triggers_db.sql, 7_wallet_balances_db.sql)
+# and by the detail post-processing stage, which cannot be traced from the
+# read paths; parameters are filled in from the audited database.
+TRIGGER_QUERIES = [
+    # sync_balance_on_transaction / trg_wallet_balances_detail_*
+    "SELECT wallet_id FROM transaction_headers WHERE id = :header_id",
+    # apply_detail_effects
+    """SELECT td.id, td.category_id, td.line_amount, td.cashback_earned, th.wallet_id
+       FROM transaction_details td JOIN transaction_headers th ON th.id = td.header_id
+       WHERE td.id IN (SELECT value FROM json_each('[1,2,3]'))""",
+    # record_cashback
+    """SELECT COALESCE(SUM(credited), 0), COALESCE(SUM(earned), 0) FROM cashback_ledger
+       WHERE wallet_id = :wallet_id AND month_year = '2026-02' AND (billing_date, detail_id) < ('2026-02-07', 1)""",
+    "SELECT * FROM wallet_cashback_history WHERE wallet_id = :wallet_id AND month_year = '2026-02'",
+]
+
+CHAT_HISTORY_QUERY = """
+    SELECT sender, message FROM chat_logs
+    WHERE session_id = ?
+    ORDER BY timestamp ASC LIMIT ?
+"""
+
+
+def _sample_ids(conn: sqlite3.Connection) -> Dict:
+    """Representative parameter values taken from the audited database."""
+    def first(sql, default=1):
+        row = conn.execute(sql).fetchone()
+        return row[0] if row and row[0] is not None else default
+
+    return {
+        "wallet_id": first("SELECT wallet_id FROM transaction_headers ORDER BY id DESC LIMIT 1"),
+        "category_id": first("SELECT category_id FROM transaction_details ORDER BY id DESC LIMIT 1"),
+        "header_id": first("SELECT MAX(id) FROM transaction_headers"),
+        "amount": first("SELECT line_amount FROM transaction_details ORDER BY id DESC LIMIT 1", 100.0),
+        "session_id": first("SELECT session_id FROM chat_logs ORDER BY id DESC LIMIT 1", "default_session"),
+        "since": first("SELECT MAX(updated_at) FROM transaction_headers", "2026-01-01 00:00:00"),
+        "latest_date": first("SELECT MAX(transaction_date) FROM transaction_headers", "2026-02-01"),
+    }
+
+
+def _diagnostic_queries() -> List[str]:
+    if not os.path.exists(DIAGNOSTIC_SQL):
+        return []
+    with open(DIAGNOSTIC_SQL, "r", encoding="utf-8") as f:
+        content = "\n".join(line for line in f.read().splitlines() if not line.strip().startswith("--"))
+    return [stmt.strip() for stmt in content.split(";") if stmt.strip()]
+
+
+def capture_app_queries(conn: sqlite3.Connection) -> List[str]:
+    """
+    Run the app's read paths and return every distinct SELECT they issued,
+    with parameters inlined.
+    """
+    ids = _sample_ids(conn)
+    captured: List[str] = []
+    conn.set_trace_callback(captured.append)
+
+    workload = [
+        lambda: build_app_state(conn),
+        lambda: list_transactions(conn),
+        lambda: list_transactions(conn, wallet_id=ids["wallet_id"]),
+        lambda: list_transactions(conn, category_id=ids["category_id"], date_from="2025-01-01", date_to=ids["latest_date"]),
+        lambda: list_transactions(conn, merchant="S", status="posted"),
+        lambda: list_transactions(conn, cursor=list_transactions(conn, limit=20)["next_cursor"]),
+        lambda: get_state_changes(conn, ids["since"]),
+        lambda: get_wallet_benefits(conn, ids["wallet_id"]),
+        lambda: get_cashback_rate(conn, ids["wallet_id"], ids["category_id"]),
+        lambda: conn.execute(CHAT_HISTORY_QUERY, (ids["session_id"], 3)).fetchall(),
+    ]
+    workload += [lambda q=q: answer_from_template(conn, q) for t in TEMPLATES for q in t.examples]
+    workload += [lambda q=q: conn.execute(q, ids).fetchall() for q in TRIGGER_QUERIES]
+    workload += [lambda q=q: conn.execute(q).fetchall() for q in _diagnostic_queries()]
+
+    try:
+        for step in workload:
+            try:
+                step()
+            except sqlite3.Error as e:
+                print(f"⚠️ Skipped a workload step: {e}")
+    finally:
+        conn.set_trace_callback(None)
+
+    seen = set()
+    queries = []
+    for sql in captured:
+        normalized = " ".join(sql.split())
+        if not re.match(r"^(SELECT|WITH)\b", normalized, re.IGNORECASE) or normalized in seen:
+            continue
+        seen.add(normalized)
+        queries.append(normalized)
+    return queries
+
+
+def explain(conn: sqlite3.Connection, sql: str) -> List[str]:
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()]
+
+
+def time_query(conn: sqlite3.Connection, sql: str, repeat: int = 5, budget_s: float = 10.0) -> float:
+    """
+    Median execution time in milliseconds. A run exceeding budget_s is
+    interrupted and reported as infinity (unindexed plans can be quadratic).
+    """
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.set_progress_handler(lambda: int(time.perf_counter() - start > budget_s), 10000)
+        try:
+            conn.execute(sql).fetchall()
+        except sqlite3.OperationalError as e:
+            if "interrupted" not in str(e):
+                raise
+            return float("inf")
+        finally:
+            conn.set_progress_handler(None, 0)
+        elapsed = time.perf_counter() - start
+        samples.append(elapsed * 1000)
+        if elapsed > 1:
+            # Slow enough that one sample is representative
+            break
+    return statistics.median(samples)
+
+
+def audit(conn: sqlite3.Connection, queries: Optional[List[str]] = None, timed: bool = False) -> List[Dict]:
+    """
+    EXPLAIN every query and classify its plan.
+
+    Returns:
+        One entry per query with its plan, flagged full scans (tables over
+        SMALL_TABLE_ROWS), temp B-trees and optionally a median timing
+    """
+    queries = queries if queries is not None else capture_app_queries(conn)
+    table_rows = {
+        name: conn.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0]
+        for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall()
+    }
+
+    results = []
+    for sql in queries:
+        plan = explain(conn, sql)
+        full_scans = []
+        for line in plan:
+            match = re.match(r"^SCAN (\w+)(?: AS \w+)?$", line.strip())
+            if match:
+                alias = match.group(1)
+                table = alias if alias in table_rows else _resolve_alias(sql, alias)
+                if table_rows.get(table, 0) > SMALL_TABLE_ROWS:
+                    full_scans.append(table)
+        entry = {
+            "sql": sql,
+            "plan": plan,
+            "full_scans": full_scans,
+            "temp_btrees": [line for line in plan if "TEMP B-TREE" in line],
+        }
+        if timed:
+            entry["ms"] = time_query(conn, sql)
+        results.append(entry)
+    return results
+
+
+def _resolve_alias(sql: str, alias: str) -> str:
+    match = re.search(rf"\b(\w+)\s+(?:AS\s+)?{re.escape(alias)}\b", sql, re.IGNORECASE)
+    return match.group(1) if match else alias
+
+
+def print_report(results: List[Dict]) -> int:
+    """Print the audit and return the number of flagged queries."""
+    flagged = 0
+    for i, entry in enumerate(results, 1):
+        status = "❌" if entry["full_scans"] else ("⚠️ " if entry["temp_btrees"] else "✅")
+        if entry["full_scans"]:
+            flagged += 1
+        timing = f" ({entry['ms']:.2f} ms)" if "ms" in entry else ""
+        print(f"{status} [{i}] {entry['sql'][:110]}{timing}")
+        for line in entry["plan"]:
+            print(f"      {line}")
+        if entry["full_scans"]:
+            print(f"      → full scan of: {', '.join(entry['full_scans'])}")
+    print("-" * 40)
+    print(f"{len(results)} queries audited, {flagged} with full scans of large tables.")
+    return flagged
+
+
+# ==========================================================
+# SYNTHETIC DATASET (before/after index timings)
+# ==========================================================
+
+def index_statements() -> List[str]:
+    """Every CREATE INDEX in the schema script and migrations."""
+    statements = []
+    for name in sorted(os.listdir(INITIALIZE_DIR)):
+        if name.endswith(".sql") and not name.startswith(("2_", "3_")):
+            with open(os.path.join(INITIALIZE_DIR, name), "r", encoding="utf-8") as f:
+                statements += re.findall(r"CREATE INDEX IF NOT EXISTS [^;]+;", f.read())
+    return list(dict.fromkeys(statements))
+
+
+def build_synthetic_db(path: str, rows: int, seed: int = 7) -> sqlite3.Connection:
+    """Create an unindexed copy of the schema filled with `rows` transactions."""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    with open(os.path.join(INITIALIZE_DIR, "1_create_db.sql"), "r", encoding="utf-8") as f:
+        conn.executescript(f.read())
+    with open(os.path.join(INITIALIZE_DIR, "4_sync_db.sql"), "r", encoding="utf-8") as f:
+        conn.executescript(f.read())
+    for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL").fetchall():
+        conn.execute(f"DROP INDEX {name}")
+
+    categories = list(range(1, 7))
+    conn.executemany("INSERT INTO categories (id, code, label) VALUES (?, ?, ?)",
+                     [(c, f"cat-{c}", f"Category {c}") for c in categories])
+    wallet_types = ["credit", "credit", "credit", "debit", "ewallet", "cash"] * 3
+    conn.executemany("""
+        INSERT INTO wallets (id, name, provider_id, type, balance, credit_limit, cycle_day, due_day)
+        VALUES (?, ?, 1, ?, 0, 100000, 15, 5)
+    """, [(i + 1, f"Wallet {i + 1}", t) for i, t in enumerate(wallet_types)])
+    wallets = list(range(1, len(wallet_types) + 1))
+    conn.executemany("""
+        INSERT INTO wallet_benefits (wallet_id, category_id, benefit_type, rate, is_active)
+        VALUES (?, ?, 'cashback', ?, 1)
+    """, [(w, c, rng.choice([1.0, 2.0, 4.0, 5.0])) for w in wallets for c in categories])
+    conn.executemany("""
+        INSERT INTO recurring_expenses (name, category_id, amount_estimate, frequency, day_of_month)
+        VALUES (?, ?, ?, 'monthly', ?)
+    """, [(f"Bill {i}", rng.choice(categories), rng.uniform(200, 3000), rng.randint(1, 28)) for i in range(30)])
+
+    start = date(2026, 2, 1) - timedelta(days=3 * 365)
+    merchants = ["SM Supermarket", "Shopee", "Lazada", "Grab", "Meralco", "Jollibee", "Starbucks", "Puregold"]
+    headers, details = [], []
+    for i in range(1, rows + 1):
+        day = (start + timedelta(days=rng.randint(0, 3 * 365))).isoformat()
+        amount = round(rng.uniform(50, 5000), 2)
+        stamp = f"{day} 12:00:00"
+        headers.append((i, rng.choice(wallets), rng.choice(merchants), day, amount, stamp))
+        details.append((i, rng.choice(categories), amount, day, round(amount * 0.02, 2), stamp))
+    conn.executemany("""
+        INSERT INTO transaction_headers (id, wallet_id, merchant, transaction_date, total_amount, payment_type, updated_at)
+        VALUES (?, ?, ?, ?, ?, 'straight', ?)
+    """, headers)
+    conn.executemany("""
+        INSERT INTO transaction_details (header_id, category_id, line_amount, billing_date, cashback_earned, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, details)
+
+    conn.execute("INSERT INTO income_sources (id, name, frequency) VALUES (1, 'Salary', 'monthly')")
+    conn.executemany("""
+        INSERT INTO income_transactions (source_id, wallet_id, amount, date) VALUES (1, ?, ?, ?)
+    """, [(rng.choice(wallets), rng.uniform(1000, 50000), (start + timedelta(days=rng.randint(0, 1095))).isoformat())
+          for _ in range(max(1, rows // 20))])
+    conn.executemany("""
+        INSERT INTO chat_logs (session_id, sender, message, timestamp) VALUES (?, ?, ?, ?)
+    """, [(f"session_{rng.randint(1, 200)}", rng.choice(["user", "buddy"]), "message",
+           f"2026-01-{rng.randint(1, 28):02d} {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00")
+          for _ in range(max(1, rows // 10))])
+
+    months = sorted({d[3][:7] for d in details})
+    conn.executemany("INSERT OR IGNORE INTO monthly_budgets (category_id, month_year, amount) VALUES (?, ?, 10000)",
+                     [(c, m) for c in categories for m in months])
+    conn.executemany("""
+        INSERT OR IGNORE INTO wallet_cashback_history (wallet_id, month_year, amount_earned, monthly_limit)
+        VALUES (?, ?, 100, 1500)
+    """, [(w, m) for w in wallets for m in months])
+    conn.executemany("""
+        INSERT INTO strategic_recommendations (title, message, urgency_level) VALUES (?, 'Tip', 'low')
+    """, [(f"Recommendation {i}",) for i in range(500)])
+    # Materialized balances are backfilled from the generated history
+    with open(os.path.join(INITIALIZE_DIR, "7_wallet_balances_db.sql"), "r", encoding="utf-8") as f:
+        conn.executescript(f.read())
+    with open(os.path.join(INITIALIZE_DIR, "10_cashback_ledger_db.sql"), "r", encoding="utf-8") as f:
+        conn.executescript(f.read())
+    conn.commit()
+    return conn
+
+
+def run_synthetic_benchmark(rows: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "audit.db")
+        print(f"🧪 Building synthetic database with {rows:,} transactions...")
+        conn = build_synthetic_db(path, rows)
+
+        # Capture with the indexes in place: some unindexed plans are quadratic
+        statements = index_statements()
+        for statement in statements:
+            conn.execute(statement)
+        conn.commit()
+        queries = capture_app_queries(conn)
+
+        print("\n🔍 AFTER (index set applied)")
+        after = audit(conn, queries, timed=True)
+        print_report(after)
+
+        for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL").fetchall():
+            conn.execute(f"DROP INDEX {name}")
+        conn.commit()
+
+        print("\n🔍 BEFORE (no secondary indexes)")
+        before = audit(conn, queries, timed=True)
+        print_report(before)
+
+        print("\n⏱️  Before → after (median ms, 'inf' = aborted after 10s)")
+        total_before = total_after = 0.0
+        for b, a in zip(before, after):
+            total_before += b["ms"]
+            total_after += a["ms"]
+            if b["full_scans"] or b["ms"] > 1:
+                print(f"  {b['ms']:9.2f} → {a['ms']:9.2f}  {b['sql'][:90]}")
+        print(f"  {total_before:9.2f} → {total_after:9.2f}  TOTAL ({len(queries)} queries)")
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EXPLAIN QUERY PLAN audit of the app's queries")
+    parser.add_argument("--synthetic", type=int, metavar="ROWS",
+                        help="Benchmark before/after the index set on a generated dataset")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        run_synthetic_benchmark(args.synthetic)
+        return
+
+    from app.db.connection import get_db_connection
+    with get_db_connection(readonly=True) as conn:
+        flagged = print_report(audit(conn))
+    sys.exit(1 if flagged else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,12 @@ import sqlite3
 import re
 import os
 import sys
-from connection import get_db_connection
+
+# Ensure we can import from app
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.append(project_root)
+
+from app.db.connection import get_db_connection
 
 def parse_database_md():
     """Parses database.md to extract table and column names."""
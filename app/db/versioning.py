@@ -0,0 +1,28 @@
+"""
+Process-wide Data Version
+
+A monotonically increasing counter bumped after every committed write that
+changes user-visible data. Caches key their entries on it so any write
+invalidates them without tracking individual tables.
+
+Writes made outside this process (e.g. standalone scripts) do not bump the
+counter, so caches built on it should also bound entry age.
+"""
+
+import threading
+
+_version = 0
+_lock = threading.Lock()
+
+
+def get_data_version() -> int:
+    """Current data version."""
+    return _version
+
+
+def bump_data_version() -> int:
+    """Record a committed write and return the new data version."""
+    global _version
+    with _lock:
+        _version += 1
+        return _version
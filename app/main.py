@@ -1,10 +1,35 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from .routers import api, chat, simulation
+from .routers import api, chat, simulation, metrics
+from .db.connection import close_pools, check_db_profile, checkpoint_scheduler, get_db_connection
+from .db.migrations import apply_migrations
+from .db.async_db import db_executor
+from .utils.cashback_ledger import ensure_cashback_ledger
+from .core.context_registry import context_registry
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Bring existing databases up to the current schema
+    with get_db_connection() as conn:
+        apply_migrations(conn)
+        # First start after the ledger migration: settle existing cashback history
+        ensure_cashback_ledger(conn)
+
+    # Prompt rules/schema documents, kept in memory and hot-reloaded by mtime
+    context_registry.load()
+
+    # Report the active SQLite PRAGMA profile and keep the WAL in check
+    profile = check_db_profile()
+    if str(profile["effective"].get("journal_mode")).lower() == "wal":
+        checkpoint_scheduler.start()
+    yield
+    checkpoint_scheduler.stop()
+    db_executor.shutdown()
+    # Release pooled SQLite connections on shutdown
+    close_pools()
 
-app = FastAPI(title="WaisWallet API")
+app = FastAPI(title="WaisWallet API", lifespan=lifespan)
 
 # Setup CORS
 app.add_middleware(
@@ -18,6 +43,7 @@ app.add_middleware(
 app.include_router(api.router)
 app.include_router(chat.router)
 app.include_router(simulation.router)
+app.include_router(metrics.router)
 
 @app.get("/")
 def health_check():
@@ -1,9 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlite3 import Connection
 from typing import List, Optional, Dict
-from pydantic import BaseModel
+import io
+import tempfile
+from pydantic import BaseModel, ValidationError
 from ..db.connection import get_db_session
-from ..utils.wallet_benefits import get_cashback_rate, save_wallet_benefits, get_wallet_benefits
+from ..db.async_db import run_db
+from ..db.versioning import bump_data_version
+from ..utils.wallet_benefits import get_cashback_rate, save_wallet_benefits, invalidate_rate_matrix
+from ..utils.app_state import get_state_snapshot, etag_matches, record_not_modified, format_server_timing
+from ..utils.state_sync import get_state_changes, is_valid_cursor
+from ..utils.transactions import list_transactions, insert_transactions_bulk, DEFAULT_PAGE_SIZE, MAX_BULK_ROWS
+from ..utils.statement_import import import_statement
+from ..utils.detail_effects import apply_detail_effects
+from ..utils.cashback_ledger import record_cashback, rebuild_cashback
+from ..core.exceptions import bad_request
 
 router = APIRouter(prefix="/api", tags=["WaisWallet API"])
 
@@ -29,6 +40,10 @@ class TransactionBase(BaseModel):
     payment_type: str = "straight"
     description: Optional[str] = None
 
+class BulkTransactionRequest(BaseModel):
+    # Rows are validated one by one so a bad row is reported instead of failing the request
+    transactions: List[Dict]
+
 class GoalBase(BaseModel):
     name: str
     target_amount: float
@@ -43,146 +58,73 @@ class RecommendationUpdate(BaseModel):
 # --- Endpoints ---
 
 @router.get("/state")
-async def get_app_state(db: Connection = Depends(get_db_session)):
+async def get_app_state(request: Request, db: Connection = Depends(get_db_session)):
     try:
-        # 1. Fetch Categories
-        categories = [dict(row) for row in db.execute("SELECT * FROM categories").fetchall()]
-        
-        # 2. Fetch Wallets with Provider info
-        wallets_rows = db.execute("""
-            SELECT w.*, p.name as provider_name, p.logo_url 
-            FROM wallets w
-            LEFT JOIN providers p ON w.provider_id = p.id
-        """).fetchall()
-        
-        wallets = []
-        for row in wallets_rows:
-            w = dict(row)
-            # Fetch benefits from new table
-            w['benefits'] = get_wallet_benefits(db, w['id'])
-            # Add 'provider' field for frontend compatibility
-            if not w.get('provider'):
-                 w['provider'] = w.get('provider_name', 'Unknown')
-            wallets.append(w)
-        
-        # 2b. Calculate dynamic balances based on wallet type
-        # For credit cards: sum of transaction_details.line_amount
-        # For debit/cash: sum of income_transactions.amount
-        
-        # Get credit card balances (sum of expenses)
-        credit_balances = {}
-        credit_rows = db.execute("""
-            SELECT w.id, COALESCE(SUM(td.line_amount), 0) as total_spent
-            FROM wallets w
-            LEFT JOIN transaction_headers th ON w.id = th.wallet_id
-            LEFT JOIN transaction_details td ON th.id = td.header_id
-            WHERE w.type = 'credit'
-            GROUP BY w.id
-        """).fetchall()
-        for row in credit_rows:
-            credit_balances[row[0]] = row[1]
-        
-        # Get debit/cash/digital/ewallet balances (sum of income)
-        debit_balances = {}
-        debit_rows = db.execute("""
-            SELECT w.id, COALESCE(SUM(it.amount), 0) as total_income
-            FROM wallets w
-            LEFT JOIN income_transactions it ON w.id = it.wallet_id
-            WHERE w.type IN ('debit', 'digital_bank', 'ewallet', 'cash')
-            GROUP BY w.id
-        """).fetchall()
-        for row in debit_rows:
-            debit_balances[row[0]] = row[1]
-        
-        # Update wallet balances with calculated values
-        for wallet in wallets:
-            if wallet['type'] == 'credit':
-                wallet['balance'] = credit_balances.get(wallet['id'], 0.0)
-            else:  # debit, digital_bank, ewallet, or cash
-                wallet['balance'] = debit_balances.get(wallet['id'], 0.0)
-        
-        # 2c. Fetch wallet benefits from wallet_benefits table
-        wallet_benefits_rows = db.execute("""
-            SELECT wallet_id, category_id, rate, benefit_type
-            FROM wallet_benefits
-            WHERE is_active = 1
-            AND (effective_from IS NULL OR effective_from <= date('now'))
-            AND (effective_until IS NULL OR effective_until >= date('now'))
-        """).fetchall()
-        
-        # Group benefits by wallet_id
-        wallet_benefits_map = {}
-        for row in wallet_benefits_rows:
-            wallet_id = row[0]
-            category_id = row[1]
-            rate = row[2]
-            if wallet_id not in wallet_benefits_map:
-                wallet_benefits_map[wallet_id] = {}
-            wallet_benefits_map[wallet_id][category_id] = rate
-        
-        # Add benefits to wallets
-        for wallet in wallets:
-            wallet['benefits'] = wallet_benefits_map.get(wallet['id'], {})
-        
-        # 3. Fetch Transactions (Recent)
-        transactions = [dict(row) for row in db.execute("""
-            SELECT th.*, td.category_id, td.line_amount, td.cashback_earned, td.billing_date
-            FROM transaction_headers th
-            JOIN transaction_details td ON th.id = td.header_id
-            ORDER BY th.transaction_date DESC LIMIT 50
-        """).fetchall()]
-        
-        # 4. Fetch Goals
-        goals = [dict(row) for row in db.execute("SELECT * FROM savings_goals").fetchall()]
-        
-        # 5. Fetch Recommendations (All statuses)
-        recommendations = [dict(row) for row in db.execute("SELECT * FROM strategic_recommendations ORDER BY created_at DESC").fetchall()]
-
-        # 6. Fetch Budgets (Latest per category)
-        budgets = [dict(row) for row in db.execute("""
-            SELECT c.code as category, mb.amount
-            FROM monthly_budgets mb
-            JOIN categories c ON mb.category_id = c.id
-            WHERE mb.month_year = '2026-02'
-        """).fetchall()]
-
-        # 7. Fetch MTD Cashback Summary
-        cashback_mtd = [dict(row) for row in db.execute("""
-            SELECT wallet_id, amount_earned, monthly_limit 
-            FROM wallet_cashback_history 
-            WHERE month_year = '2026-02'
-        """).fetchall()]
-
-        # 8. Fetch Total Income (from dedicated table)
-        total_income = db.execute("SELECT SUM(amount) FROM income_transactions").fetchone()[0] or 0.0
-
-        return {
-            "categories": categories,
-            "wallets": wallets,
-            "transactions": transactions,
-            "goals": goals,
-            "recommendations": recommendations,
-            "budgets": {b['category']: b['amount'] for b in budgets},
-            "totalIncome": total_income,
-            "cashbackMTD": cashback_mtd,
-            "serverTime": "2026-02-07"
-        }
+        # Fixed read plan: one query per section, cached until the next write
+        snapshot, cached = await run_db(get_state_snapshot, db)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    headers = {"ETag": snapshot.etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), snapshot.etag):
+        record_not_modified()
+        return Response(status_code=304, headers=headers)
+
+    headers["X-State-Cache"] = "hit" if cached else "miss"
+    if not cached:
+        headers["Server-Timing"] = format_server_timing(snapshot.timings)
+    return Response(content=snapshot.body, media_type="application/json", headers=headers)
+
+@router.get("/state/changes")
+async def get_app_state_changes(since: Optional[str] = None, db: Connection = Depends(get_db_session)):
+    """Rows changed since a cursor returned by a previous call (omit for a full sync)."""
+    if since is not None and not is_valid_cursor(since):
+        raise bad_request("Invalid cursor. Expected 'YYYY-MM-DD HH:MM:SS' from a previous response.")
+    try:
+        return await run_db(get_state_changes, db, since)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @router.put("/recommendations/{rec_id}")
 async def update_recommendation(rec_id: int, rec: RecommendationUpdate, db: Connection = Depends(get_db_session)):
-    try:
+    def write():
         db.execute("UPDATE strategic_recommendations SET status = ? WHERE id = ?", (rec.status, rec_id))
         db.commit()
+
+    try:
+        await run_db(write)
+        bump_data_version()
         return {"status": "success"}
     except Exception as e:
-        db.rollback()
+        await run_db(db.rollback)
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/transactions")
+async def get_transactions(
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    wallet_id: Optional[int] = None,
+    category_id: Optional[int] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    merchant: Optional[str] = None,
+    status: Optional[str] = None,
+    db: Connection = Depends(get_db_session)
+):
+    """Transaction history, newest first, paged with next_cursor."""
+    try:
+        return await run_db(
+            list_transactions, db, cursor=cursor, limit=limit, wallet_id=wallet_id, category_id=category_id,
+            date_from=date_from, date_to=date_to, merchant=merchant, status=status
+        )
+    except ValueError as e:
+        raise bad_request(str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
 @router.post("/transactions")
 async def create_transaction(tx: TransactionBase, db: Connection = Depends(get_db_session)):
-    try:
+    def write():
         # Insert Header
         cursor = db.execute("""
             INSERT INTO transaction_headers (wallet_id, merchant, total_amount, transaction_date, payment_type, description)
@@ -195,21 +137,114 @@ async def create_transaction(tx: TransactionBase, db: Connection = Depends(get_d
         cashback_earned = tx.total_amount * (cashback_rate / 100.0)
 
         # Insert Detail (Simplified for now, mapping 1:1 with header)
-        db.execute("""
+        cursor = db.execute("""
             INSERT INTO transaction_details (header_id, category_id, line_amount, billing_date, cashback_earned)
             VALUES (?, ?, ?, ?, ?)
         """, (header_id, tx.category_id, tx.total_amount, tx.transaction_date, cashback_earned))
+        apply_detail_effects(db, [cursor.lastrowid])
         
         db.commit()
+        return header_id
+
+    try:
+        header_id = await run_db(write)
+        bump_data_version()
         return {"status": "success", "id": header_id}
     except Exception as e:
-        db.rollback()
+        await run_db(db.rollback)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/transactions/bulk")
+async def create_transactions_bulk(req: BulkTransactionRequest, db: Connection = Depends(get_db_session)):
+    """Insert up to MAX_BULK_ROWS transactions in one transaction; invalid rows are reported, not inserted."""
+    if len(req.transactions) > MAX_BULK_ROWS:
+        raise bad_request(f"At most {MAX_BULK_ROWS} transactions per request")
+
+    rows = []
+    errors = []
+    for index, raw in enumerate(req.transactions):
+        try:
+            rows.append((index, TransactionBase.model_validate(raw).model_dump()))
+        except ValidationError as e:
+            errors.append({
+                "index": index,
+                "error": "; ".join(f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors()),
+            })
+
+    def write():
+        result = insert_transactions_bulk(db, [row for _, row in rows])
+        db.commit()
+        return result
+
+    try:
+        result = await run_db(write)
+        if result["ids"]:
+            bump_data_version()
+    except Exception as e:
+        await run_db(db.rollback)
         raise HTTPException(status_code=500, detail=str(e))
 
+    # Map indexes back to the request body
+    errors += [{"index": rows[err["index"]][0], "error": err["error"]} for err in result["errors"]]
+    errors.sort(key=lambda err: err["index"])
+    return {
+        "status": "success" if not errors else ("partial" if result["ids"] else "failed"),
+        "inserted": len(result["ids"]),
+        "failed": len(errors),
+        "ids": result["ids"],
+        "errors": errors,
+    }
+
+@router.post("/import/statement")
+async def import_statement_upload(
+    request: Request,
+    wallet_id: Optional[int] = None,
+    format: Optional[str] = None,
+    debit_sign: str = "negative",
+    date_format: Optional[str] = None,
+    default_category_id: Optional[int] = None,
+    dry_run: bool = False,
+    db: Connection = Depends(get_db_session)
+):
+    """
+    Import a CSV or OFX/QFX statement sent as the raw request body.
+    The upload is spooled (spilling to disk past 8 MB) and parsed as a stream.
+    """
+    if format not in (None, "csv", "ofx"):
+        raise bad_request("format must be 'csv' or 'ofx'")
+    if debit_sign not in ("negative", "positive"):
+        raise bad_request("debit_sign must be 'negative' or 'positive'")
+
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as spool:
+        async for chunk in request.stream():
+            spool.write(chunk)
+        spool.seek(0)
+        text = io.TextIOWrapper(spool, encoding="utf-8-sig", errors="replace", newline="")
+        committed: List[int] = []
+        try:
+            report = await run_db(
+                import_statement, db, text, wallet_id=wallet_id, fmt=format, debit_sign=debit_sign,
+                date_format=date_format, default_category_id=default_category_id, dry_run=dry_run,
+                on_commit=committed.append,
+            )
+        except ValueError as e:
+            await run_db(db.rollback)
+            raise bad_request(str(e))
+        except Exception as e:
+            await run_db(db.rollback)
+            raise HTTPException(status_code=500, detail=str(e))
+        finally:
+            text.detach()
+            # Batches committed before a failure stay: invalidate caches for them too
+            if committed:
+                bump_data_version()
+
+    return report
+
 @router.post("/wallets")
 async def create_wallet(wallet: WalletBase, db: Connection = Depends(get_db_session)):
     print(f"DEBUG: Creating wallet with data: {wallet}")
-    try:
+    def write():
         cursor = db.execute("""
             INSERT INTO wallets (name, provider_id, type, balance, credit_limit, cycle_day, due_day, monthly_cashback_limit, color)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
@@ -222,22 +257,33 @@ async def create_wallet(wallet: WalletBase, db: Connection = Depends(get_db_sess
             save_wallet_benefits(db, wallet_id, wallet.type, wallet.benefits)
         
         db.commit()
+        return wallet_id
+
+    try:
+        wallet_id = await run_db(write)
+        bump_data_version()
+        invalidate_rate_matrix()
         print(f"DEBUG: Wallet created successfully with ID: {wallet_id}")
         return {"status": "success", "id": wallet_id}
     except Exception as e:
-        db.rollback()
+        await run_db(db.rollback)
         print(f"ERROR: Failed to create wallet: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/wallets/{wallet_id}")
 async def update_wallet(wallet_id: int, wallet: WalletBase, db: Connection = Depends(get_db_session)):
     print(f"DEBUG: Updating wallet {wallet_id} with data: {wallet}")
-    try:
+    def write():
+        old = db.execute("SELECT cycle_day FROM wallets WHERE id = ?", (wallet_id,)).fetchone()
         db.execute("""
             UPDATE wallets 
             SET name = ?, provider_id = ?, type = ?, balance = ?, credit_limit = ?, cycle_day = ?, due_day = ?, monthly_cashback_limit = ?, color = ?
             WHERE id = ?
         """, (wallet.name, wallet.provider_id, wallet.type, wallet.balance, wallet.credit_limit, wallet.cycle_day, wallet.due_day, wallet.monthly_cashback_limit, wallet.color, wallet_id))
+
+        # A new cycle day moves the wallet's cashback lines to other statement cycles
+        if old is not None and old[0] != wallet.cycle_day:
+            rebuild_cashback(db, wallet_id=wallet_id)
         
         # Update benefits in wallet_benefits table
         if wallet.benefits is not None:
@@ -245,43 +291,57 @@ async def update_wallet(wallet_id: int, wallet: WalletBase, db: Connection = Dep
             save_wallet_benefits(db, wallet_id, wallet.type, wallet.benefits)
         
         db.commit()
+
+    try:
+        await run_db(write)
+        bump_data_version()
+        invalidate_rate_matrix()
         print(f"DEBUG: Wallet {wallet_id} updated successfully")
         return {"status": "success"}
     except Exception as e:
-        db.rollback()
+        await run_db(db.rollback)
         print(f"ERROR: Failed to update wallet {wallet_id}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/goals")
 async def create_goal(goal: GoalBase, db: Connection = Depends(get_db_session)):
-    try:
+    def write():
         cursor = db.execute("""
             INSERT INTO savings_goals (name, target_amount, current_amount, color, icon, source_id, status)
             VALUES (?, ?, ?, ?, ?, ?, 'active')
         """, (goal.name, goal.target_amount, goal.current_amount, goal.color, goal.icon, goal.source_id))
         db.commit()
-        return {"status": "success", "id": cursor.lastrowid}
+        return cursor.lastrowid
+
+    try:
+        goal_id = await run_db(write)
+        bump_data_version()
+        return {"status": "success", "id": goal_id}
     except Exception as e:
-        db.rollback()
+        await run_db(db.rollback)
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/goals/{goal_id}")
 async def update_goal(goal_id: int, goal: GoalBase, db: Connection = Depends(get_db_session)):
-    try:
+    def write():
         db.execute("""
             UPDATE savings_goals 
             SET name = ?, target_amount = ?, current_amount = ?, color = ?, icon = ?, source_id = ?
             WHERE id = ?
         """, (goal.name, goal.target_amount, goal.current_amount, goal.color, goal.icon, goal.source_id, goal_id))
         db.commit()
+
+    try:
+        await run_db(write)
+        bump_data_version()
         return {"status": "success"}
     except Exception as e:
-        db.rollback()
+        await run_db(db.rollback)
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/transactions/{tx_id}")
 async def update_transaction(tx_id: int, tx: TransactionBase, db: Connection = Depends(get_db_session)):
-    try:
+    def write():
         # Calculate cashback using new wallet_benefits table
         cashback_rate = get_cashback_rate(db, tx.wallet_id, tx.category_id)
         cashback_earned = tx.total_amount * (cashback_rate / 100.0)
@@ -297,27 +357,42 @@ async def update_transaction(tx_id: int, tx: TransactionBase, db: Connection = D
             SET category_id = ?, line_amount = ?, cashback_earned = ?
             WHERE header_id = ?
         """, (tx.category_id, tx.total_amount, cashback_earned, tx_id))
+
+        # Wallet or cashback may have changed: re-settle the affected statement cycles
+        detail_ids = [row[0] for row in db.execute("SELECT id FROM transaction_details WHERE header_id = ?", (tx_id,)).fetchall()]
+        record_cashback(db, detail_ids)
         
         db.commit()
+
+    try:
+        await run_db(write)
+        bump_data_version()
         return {"status": "success"}
     except Exception as e:
-        db.rollback()
+        await run_db(db.rollback)
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/transactions/{tx_id}")
 async def delete_transaction(tx_id: int, db: Connection = Depends(get_db_session)):
-    try:
+    def write():
+        detail_ids = [row[0] for row in db.execute("SELECT id FROM transaction_details WHERE header_id = ?", (tx_id,)).fetchall()]
         db.execute("DELETE FROM transaction_details WHERE header_id = ?", (tx_id,))
         db.execute("DELETE FROM transaction_headers WHERE id = ?", (tx_id,))
+        # Give back the deleted lines' cashback and re-settle their cycles
+        record_cashback(db, detail_ids)
         db.commit()
+
+    try:
+        await run_db(write)
+        bump_data_version()
         return {"status": "success"}
     except Exception as e:
-        db.rollback()
+        await run_db(db.rollback)
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/categories")
 async def create_category(name: str, limit: float, db: Connection = Depends(get_db_session)):
-    try:
+    def write():
         code = name.lower().replace(" ", "-")
         cursor = db.execute("""
             INSERT INTO categories (code, label)
@@ -332,9 +407,14 @@ async def create_category(name: str, limit: float, db: Connection = Depends(get_
         """, (cat_id, limit))
         
         db.commit()
+        return cat_id
+
+    try:
+        cat_id = await run_db(write)
+        bump_data_version()
         return {"status": "success", "id": cat_id}
     except Exception as e:
-        db.rollback()
+        await run_db(db.rollback)
         raise HTTPException(status_code=500, detail=str(e))
 @router.get("/providers")
 async def get_providers(wallet_type: Optional[str] = None, db: Connection = Depends(get_db_session)):
@@ -347,5 +427,5 @@ async def get_providers(wallet_type: Optional[str] = None, db: Connection = Depe
     
     query += " ORDER BY name ASC"
     
-    providers = [dict(row) for row in db.execute(query, params).fetchall()]
+    providers = await run_db(lambda: [dict(row) for row in db.execute(query, params).fetchall()])
     return {"providers": providers}
@@ -1,11 +1,24 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+import asyncio
+import re
+import time
 from sqlite3 import Connection
 from typing import Optional, List
 from pydantic import BaseModel
 from pydantic_ai.messages import ModelRequest, ModelResponse, UserPromptPart, TextPart
 from tenacity import retry, wait_exponential, stop_after_attempt, retry_if_exception
-from ..db.connection import get_db_session
-from ..agents.pilot import strategic_pilot, guardrail_agent, PilotDeps
+from ..db.connection import get_db_session, get_pool
+from ..db.async_db import run_db
+from ..core.context_registry import context_registry
+from ..db.versioning import get_data_version
+from ..agents.pilot import strategic_pilot, PilotDeps
+from pydantic_ai.run import AgentRunResultEvent
+from ..utils.chat_stream import sse, describe_event
+from ..utils.guardrail import (
+    GUARDRAIL_MODE, OFF_TOPIC_RESPONSE, classify_query, count_event, record_latency
+)
+from ..utils.response_cache import RESPONSE_CACHE_ENABLED, response_cache
 
 router = APIRouter(prefix="/chat", tags=["Chatbot"])
 
@@ -29,6 +42,38 @@ async def run_agent_with_retry(query: str, deps: PilotDeps, message_history: Lis
     # relying on default or Agent configuration.
     return await strategic_pilot.run(query, deps=deps, message_history=message_history)
 
+async def run_pilot(query: str, deps: PilotDeps, message_history: List = None):
+    """Run the pilot (with rate-limit retries) and record its latency."""
+    start = time.perf_counter()
+    try:
+        return await run_agent_with_retry(query, deps, message_history=message_history)
+    finally:
+        record_latency("pilot", time.perf_counter() - start)
+
+def get_response_text(result) -> str:
+    """Final answer text of a pilot run."""
+    response_text = result.output if hasattr(result, 'output') else str(result)
+    
+    # Strip potential wrapper
+    if isinstance(response_text, str) and response_text.startswith("AgentRunResult("):
+        match = re.search(r'output=["\'](.*?)["\']', response_text, re.DOTALL)
+        if match:
+            response_text = match.group(1).replace("\\n", "\n")
+    return response_text
+
+def get_tool_calls(result) -> List[dict]:
+    """Tool calls made during a pilot run."""
+    tool_calls = []
+    for msg in result.all_messages():
+        if hasattr(msg, 'parts'):
+            for part in msg.parts:
+                if 'ToolCall' in type(part).__name__:
+                    tool_calls.append({
+                        "tool": getattr(part, 'tool_name', 'unknown'), 
+                        "args": getattr(part, 'args', {})
+                    })
+    return tool_calls
+
 def get_history(db: Connection, session_id: str, limit: int = 3):
     """Fetches last N messages for a session and converts to Pydantic AI format."""
     cursor = db.cursor()
@@ -63,13 +108,15 @@ def save_log(db: Connection, session_id: str, sender: str, message: str):
 @router.delete("/reset")
 async def reset_chat_history(session_id: Optional[str] = "default_session", db: Connection = Depends(get_db_session)):
     """Clears the chat history for a session."""
-    try:
-        cursor = db.cursor()
-        cursor.execute("DELETE FROM chat_logs WHERE session_id = ?", (session_id,))
+    def write():
+        db.execute("DELETE FROM chat_logs WHERE session_id = ?", (session_id,))
         db.commit()
+
+    try:
+        await run_db(write)
         return {"status": "success", "message": f"History for session '{session_id}' cleared."}
     except Exception as e:
-        db.rollback()
+        await run_db(db.rollback)
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/")
@@ -78,55 +125,74 @@ async def chat_with_pilot(request: ChatRequest, db: Connection = Depends(get_db_
     session_id = request.session_id
 
     # 1. Load History & Rules
-    message_history = get_history(db, session_id)
-    with open("app/data/database_compact.md", "r") as f:
-        rules = f.read()
+    message_history = await run_db(get_history, db, session_id)
+    rules = context_registry.text("compact")
+
+    # 0. Intent Check (Guardrail) - Context Aware, serial or speculative
+    started = time.perf_counter()
+    count_event("turns")
+    is_new_session = len(message_history) == 0
+
+    # Repeated question with no writes since: answer from the response cache
+    cached = response_cache.get(query, is_new_session) if RESPONSE_CACHE_ENABLED else None
+    if cached is not None:
+        count_event("cache_hit")
+        await run_db(save_log, db, session_id, "user", query)
+        await run_db(save_log, db, session_id, "buddy", cached.response)
+        record_latency("total", time.perf_counter() - started)
+        return {
+            "response": cached.response,
+            "tool_calls": cached.tool_calls,
+            "usage": None,
+            "session_id": session_id,
+            "cached": True
+        }
 
-    # 0. Fast Intent Check (Guardrail) - Context Aware
+    data_version = get_data_version()
+    pilot_task = None
     try:
-        classifier_result = await guardrail_agent.run(query, message_history=message_history)
-        classifier_output = str(getattr(classifier_result, 'output', classifier_result))
-        
-        if "OFF-TOPIC" in classifier_output.upper():
+        if GUARDRAIL_MODE == "speculative":
+            # 2. Package Dependencies; write tools wait on the verdict
+            clearance = asyncio.get_running_loop().create_future()
+            deps = PilotDeps(db=db, system_rules=rules, is_new_session=is_new_session, clearance=clearance)
+            pilot_task = asyncio.create_task(run_pilot(query, deps, message_history))
+            off_topic, usage = await classify_query(query, message_history)
+            clearance.set_result(not off_topic)
+        else:
+            off_topic, usage = await classify_query(query, message_history)
+
+        if off_topic:
+            count_event("off_topic")
+            record_latency("total", time.perf_counter() - started)
             return {
-                "response": "I'm sorry, but I can only assist with personal finance, budgeting, and savings-related questions. How can I help you with your wealth today?",
+                "response": OFF_TOPIC_RESPONSE,
                 "tool_calls": [],
-                "usage": classifier_result.usage()
+                "usage": usage
             }
-    except Exception as e:
-        print(f"Guardrail check failed: {e}")
-        pass
-    
-    # 2. Package Dependencies
-    is_new_session = len(message_history) == 0
-    deps = PilotDeps(db=db, system_rules=rules, is_new_session=is_new_session)
-    
-    # 3. Run the Agent
+
+        # 3. Run the Agent
+        try:
+            if pilot_task is None:
+                deps = PilotDeps(db=db, system_rules=rules, is_new_session=is_new_session)
+                result = await run_pilot(query, deps, message_history)
+            else:
+                result = await pilot_task
+        except Exception as e:
+            print(f"Error after retries in chat_with_pilot: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if pilot_task is not None and not pilot_task.done():
+            pilot_task.cancel()
+            count_event("pilot_cancelled")
+            await asyncio.gather(pilot_task, return_exceptions=True)
+
     try:
-        result = await run_agent_with_retry(query, deps, message_history=message_history)
-        response_text = result.output if hasattr(result, 'output') else str(result)
-        
-        # Strip potential wrapper
-        if isinstance(response_text, str) and response_text.startswith("AgentRunResult("):
-            import re
-            match = re.search(r'output=["\'](.*?)["\']', response_text, re.DOTALL)
-            if match:
-                response_text = match.group(1).replace("\\n", "\n")
-
-        # Extract tool calls
-        tool_calls = []
-        for msg in result.all_messages():
-            if hasattr(msg, 'parts'):
-                for part in msg.parts:
-                    if 'ToolCall' in type(part).__name__:
-                        tool_calls.append({
-                            "tool": getattr(part, 'tool_name', 'unknown'), 
-                            "args": getattr(part, 'args', {})
-                        })
+        response_text = get_response_text(result)
+        tool_calls = get_tool_calls(result)
         
         # 4. Save to Chat Logs
-        save_log(db, session_id, "user", query)
-        save_log(db, session_id, "buddy", response_text)
+        await run_db(save_log, db, session_id, "user", query)
+        await run_db(save_log, db, session_id, "buddy", response_text)
 
         # Terminal Logging
         usage = result.usage()
@@ -135,6 +201,10 @@ async def chat_with_pilot(request: ChatRequest, db: Connection = Depends(get_db_
         print(f"🛠️  Tools Used: {[tc['tool'] for tc in tool_calls] if tool_calls else 'None'}")
         print(f"📊 Tokens: In={usage.request_tokens}, Out={usage.response_tokens}, Total={usage.total_tokens}")
         print(f"-------------------------------\n")
+        if RESPONSE_CACHE_ENABLED:
+            response_cache.put(query, response_text, tool_calls, usage.total_tokens or 0,
+                               is_new_session=is_new_session, data_version=data_version)
+        record_latency("total", time.perf_counter() - started)
         
         return {
             "response": response_text,
@@ -144,4 +214,109 @@ async def chat_with_pilot(request: ChatRequest, db: Connection = Depends(get_db_
         }
     except Exception as e:
         print(f"Error after retries in chat_with_pilot: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def pump_pilot_events(query: str, deps: PilotDeps, message_history: List, queue: asyncio.Queue):
+    """Stream a pilot run into the queue as SSE items; returns the run result."""
+    result = None
+    try:
+        async for event in strategic_pilot.run_stream_events(query, deps=deps, message_history=message_history):
+            if isinstance(event, AgentRunResultEvent):
+                result = event.result
+            for item in describe_event(event):
+                queue.put_nowait(item)
+        return result
+    finally:
+        queue.put_nowait(None)
+
+async def stream_pilot(query: str, session_id: str):
+    """SSE generator for /chat/stream (owns its connection for the life of the stream)."""
+    started = time.perf_counter()
+    count_event("turns")
+    yield sse("status", {"stage": "started", "session_id": session_id})
+
+    pool = get_pool(readonly=False)
+    db = await run_db(pool.acquire)
+    queue: asyncio.Queue = asyncio.Queue()
+    pilot_task = None
+    try:
+        message_history = await run_db(get_history, db, session_id)
+        rules = context_registry.text("compact")
+        is_new_session = len(message_history) == 0
+        cached = response_cache.get(query, is_new_session) if RESPONSE_CACHE_ENABLED else None
+        if cached is not None:
+            count_event("cache_hit")
+            await run_db(save_log, db, session_id, "user", query)
+            await run_db(save_log, db, session_id, "buddy", cached.response)
+            record_latency("total", time.perf_counter() - started)
+            yield sse("token", {"text": cached.response})
+            yield sse("done", {"response": cached.response, "tool_calls": cached.tool_calls, "usage": None,
+                               "session_id": session_id, "cached": True})
+            return
+
+        data_version = get_data_version()
+        deps = PilotDeps(db=db, system_rules=rules, is_new_session=is_new_session, events=queue)
+
+        # Guardrail: events are buffered in the queue until the verdict is in
+        if GUARDRAIL_MODE == "speculative":
+            deps.clearance = asyncio.get_running_loop().create_future()
+            pilot_task = asyncio.create_task(pump_pilot_events(query, deps, message_history, queue))
+            off_topic, usage = await classify_query(query, message_history)
+            deps.clearance.set_result(not off_topic)
+        else:
+            off_topic, usage = await classify_query(query, message_history)
+            if not off_topic:
+                pilot_task = asyncio.create_task(pump_pilot_events(query, deps, message_history, queue))
+
+        if off_topic:
+            count_event("off_topic")
+            record_latency("total", time.perf_counter() - started)
+            yield sse("token", {"text": OFF_TOPIC_RESPONSE})
+            yield sse("done", {"response": OFF_TOPIC_RESPONSE, "tool_calls": [], "usage": usage, "session_id": session_id})
+            return
+
+        first_token = True
+        while (item := await queue.get()) is not None:
+            if first_token and item[0] == "token":
+                first_token = False
+                record_latency("first_token", time.perf_counter() - started)
+            yield sse(*item)
+
+        result = await pilot_task
+        response_text = get_response_text(result)
+        tool_calls = get_tool_calls(result)
+        usage = result.usage()
+        await run_db(save_log, db, session_id, "user", query)
+        await run_db(save_log, db, session_id, "buddy", response_text)
+        if RESPONSE_CACHE_ENABLED:
+            response_cache.put(query, response_text, tool_calls, usage.total_tokens or 0,
+                               is_new_session=is_new_session, data_version=data_version)
+        record_latency("total", time.perf_counter() - started)
+        yield sse("done", {
+            "response": response_text,
+            "tool_calls": tool_calls,
+            "usage": usage,
+            "session_id": session_id
+        })
+    except Exception as e:
+        print(f"Error in chat stream: {e}")
+        yield sse("error", {"detail": str(e)})
+    finally:
+        if pilot_task is not None and not pilot_task.done():
+            pilot_task.cancel()
+            count_event("pilot_cancelled")
+            await asyncio.gather(pilot_task, return_exceptions=True)
+        await run_db(pool.release, db)
+
+@router.post("/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Same as POST /chat/ but streamed as server-sent events: tokens and
+    tool-call progress as they happen, then a final `done` event
+    (see app/utils/chat_stream.py for the event types).
+    """
+    return StreamingResponse(
+        stream_pilot(request.query, request.session_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,56 @@
+from fastapi import APIRouter, Depends
+from sqlite3 import Connection
+from ..db.connection import get_pool_stats, get_db_profile_report, checkpoint_scheduler, get_readonly_db_session
+from ..db.async_db import db_executor, run_db
+from ..utils.app_state import get_state_cache_stats
+from ..utils.wallet_balances import verify_wallet_balances
+from ..utils.wallet_benefits import get_rate_matrix_stats
+from ..utils.guardrail import get_chat_latency_stats
+from ..utils.response_cache import get_response_cache_stats
+from ..utils.sql_answer_cache import get_sql_cache_stats
+from ..utils.sql_templates import get_sql_template_stats
+from ..utils.financial_snapshot import get_financial_snapshot_stats
+from ..core.context_registry import context_registry
+
+router = APIRouter(prefix="/metrics", tags=["Diagnostics"])
+
+@router.get("/db")
+async def get_db_metrics():
+    """Connection pool, DB executor, PRAGMA profile and WAL checkpoint metrics."""
+    return {
+        "pools": get_pool_stats(),
+        "executor": db_executor.stats(),
+        "pragma_profile": get_db_profile_report(),
+        "checkpoints": checkpoint_scheduler.stats(),
+    }
+
+
+@router.get("/cache")
+async def get_cache_metrics():
+    """Hit/miss counters for the server-side caches."""
+    return {
+        "state_snapshot": get_state_cache_stats(),
+        "rate_matrix": get_rate_matrix_stats(),
+        "chat_responses": get_response_cache_stats(),
+        "sql_answers": get_sql_cache_stats(),
+        "sql_templates": get_sql_template_stats(),
+        "financial_snapshot": get_financial_snapshot_stats(),
+    }
+
+
+@router.get("/balances")
+async def get_balance_metrics(db: Connection = Depends(get_readonly_db_session)):
+    """Materialized wallet balances diffed against a full recompute."""
+    return await run_db(verify_wallet_balances, db)
+
+
+@router.get("/chat")
+async def get_chat_metrics():
+    """Guardrail / pilot / total chat latency percentiles per guardrail mode."""
+    return get_chat_latency_stats()
+
+
+@router.get("/context")
+async def get_context_metrics():
+    """Prompt context documents (token estimates, mtimes) and reload counters."""
+    return context_registry.stats()
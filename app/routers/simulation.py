@@ -1,11 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Literal, Optional, List
 from sqlite3 import Connection
+import json
+import time
 from ..db.connection import get_db_session
-from ..agents.simulation import simulation_agent
+from ..db.async_db import run_db
+from ..agents.simulation import simulation_agent, SimulationNarrative, SimulationResult
 from ..agents.pilot import PilotDeps
-import json
+from ..core.context_registry import context_registry
+from ..core.exceptions import ValidationError, bad_request
+from ..core.logger import logger, log_error
+from ..db.versioning import bump_data_version
+from ..utils.simulation_engine import simulate_purchase, describe_figures
+from ..utils.simulation_batch import build_grid, simulate_batch
 
 router = APIRouter(prefix="/api/simulate", tags=["Simulation"])
 
@@ -17,32 +25,106 @@ class SimulationRequest(BaseModel):
     term: int
     description: Optional[str] = ""
 
-@router.post("/")
-async def run_simulation(request: SimulationRequest, db: Connection = Depends(get_db_session)):
+class BatchSimulationRequest(BaseModel):
+    amount: float
+    category: str
+    card_ids: Optional[List[int]] = None         # Default: every wallet
+    terms: Optional[List[int]] = None            # Months; 1 = straight, > 1 credit cards only. Default: 1, 3, 6, 12, 24
+    purchase_dates: Optional[List[str]] = None   # YYYY-MM-DD. Default: today
+    save: bool = True                            # Write the scenarios to budget_simulations
+    top: Optional[int] = None                    # Return only the best N (all are saved)
+
+@router.post("/", response_model=SimulationResult)
+async def run_simulation(
+    request: SimulationRequest,
+    mode: Literal["narrated", "fast"] = "narrated",
+    db: Connection = Depends(get_db_session),
+):
+    """
+    Simulate a purchase. The figures always come from the simulation engine;
+    mode=fast also writes the text from rules, skipping the LLM.
+    """
+    started = time.perf_counter()
     try:
-        # 1. Package Context
-        with open("app/data/database_compact.md", "r") as f:
-            rules = f.read()
-        
-        deps = PilotDeps(db=db, system_rules=rules, is_new_session=False)
-        
-        # 2. Build Query for Agent
-        query = (
-            f"Please analyze this simulation: \n"
-            f"- Description: {request.description}\n"
-            f"- Amount: {request.amount}\n"
-            f"- Category: {request.category}\n"
-            f"- Card ID: {request.card_id}\n"
-            f"- Payment Type: {request.payment_type}\n"
-            f"- Term: {request.term} months\n"
+        # 1. Compute the figures
+        figures = await run_db(
+            simulate_purchase, db, request.amount, request.category,
+            request.card_id, request.payment_type, request.term
         )
-        
-        # 3. Run Agent
-        result = await simulation_agent.run(query, deps=deps)
-        
-        # 4. Return Structured Data
-        return result.output
-
+    except ValidationError as e:
+        raise bad_request(str(e))
     except Exception as e:
         print(f"Simulation error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    engine_ms = (time.perf_counter() - started) * 1000
+
+    recommendation, best_strategy, pro_tips = describe_figures(figures)
+    narrative = SimulationNarrative(recommendation=recommendation, best_strategy=best_strategy, pro_tips=pro_tips)
+    breakdown = figures.to_dict()
+
+    if mode == "narrated":
+        try:
+            # 2. Package Context
+            rules = context_registry.text("compact")
+            deps = PilotDeps(db=db, system_rules=rules, is_new_session=False)
+
+            # 3. Ask the model to phrase the figures
+            query = (
+                f"Please analyze this simulation: \n"
+                f"- Description: {request.description}\n"
+                f"SIMULATION FIGURES:\n{json.dumps(breakdown, default=str)}\n"
+            )
+            result = await simulation_agent.run(query, deps=deps)
+            narrative = result.output
+        except Exception as e:
+            # The figures stand on their own: fall back to the rule-based text
+            log_error("simulation narration", e, card_id=request.card_id)
+            mode = "fast"
+
+    logger.info(
+        f"Simulation (mode={mode}, score={figures.score}, engine={engine_ms:.1f}ms, "
+        f"total={(time.perf_counter() - started) * 1000:.1f}ms)"
+    )
+
+    # 4. Return Structured Data
+    return SimulationResult(
+        **narrative.model_dump(),
+        score=figures.score,
+        is_affordable=figures.is_affordable,
+        monthly_impact=figures.monthly_impact,
+        mode=mode,
+        breakdown=breakdown,
+    )
+
+@router.post("/batch")
+async def run_simulation_batch(request: BatchSimulationRequest, db: Connection = Depends(get_db_session)):
+    """
+    Evaluate every card x term x purchase date against one data snapshot, ranked
+    best first. No LLM calls; use POST /api/simulate/ to narrate a chosen option.
+    """
+    started = time.perf_counter()
+
+    def run():
+        grid = build_grid(
+            db, request.amount, request.category, request.card_ids,
+            request.terms, request.purchase_dates
+        )
+        return simulate_batch(db, grid, save=request.save)
+
+    try:
+        result = await run_db(run)
+    except ValidationError as e:
+        raise bad_request(str(e))
+    except Exception as e:
+        print(f"Batch simulation error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    if result["saved"]:
+        bump_data_version()
+
+    logger.info(
+        f"Batch simulation (scenarios={result['count']}, saved={result['saved']}, "
+        f"evaluate={result['evaluate_ms']:.1f}ms, total={(time.perf_counter() - started) * 1000:.1f}ms)"
+    )
+    if request.top is not None:
+        result["scenarios"] = result["scenarios"][:max(request.top, 0)]
+    return result
@@ -0,0 +1,247 @@
+"""
+Dashboard state builder for GET /api/state
+
+The payload is assembled by a fixed plan of read sections, one query each,
+so its cost does not grow with the number of wallets. Each section is timed
+and the breakdown is returned alongside the payload.
+
+Built payloads are cached as serialized snapshots keyed by the data version,
+so repeated polls between writes are served without touching the database.
+"""
+from dataclasses import dataclass
+from sqlite3 import Connection
+from typing import Callable, Dict, List, Optional, Tuple
+import hashlib
+import json
+import os
+import threading
+import time
+
+from ..db.versioning import get_data_version
+from .wallet_balances import get_wallet_balances
+from .cashback_ledger import get_cycle_cashback
+
+# Upper bound on snapshot age, covering writes made outside this process
+STATE_CACHE_MAX_AGE = float(os.getenv("STATE_CACHE_MAX_AGE", "60"))
+
+# Demo clock: the dashboard is pinned to this date
+SERVER_DATE = "2026-02-07"
+
+
+def _load_categories(db: Connection, state: Dict) -> None:
+    state["categories"] = [dict(row) for row in db.execute("SELECT * FROM categories").fetchall()]
+
+
+def _load_wallets(db: Connection, state: Dict) -> None:
+    rows = db.execute("""
+        SELECT w.*, p.name as provider_name, p.logo_url
+        FROM wallets w
+        LEFT JOIN providers p ON w.provider_id = p.id
+    """).fetchall()
+
+    wallets = []
+    for row in rows:
+        w = dict(row)
+        # Add 'provider' field for frontend compatibility
+        if not w.get('provider'):
+            w['provider'] = w.get('provider_name', 'Unknown')
+        wallets.append(w)
+    state["wallets"] = wallets
+
+
+def _load_benefits(db: Connection, state: Dict) -> None:
+    # One scan of the active benefits for every wallet
+    rows = db.execute("""
+        SELECT wallet_id, category_id, rate
+        FROM wallet_benefits
+        WHERE is_active = 1
+        AND (effective_from IS NULL OR effective_from <= date('now'))
+        AND (effective_until IS NULL OR effective_until >= date('now'))
+    """).fetchall()
+
+    benefits_map: Dict[int, Dict[int, float]] = {}
+    for wallet_id, category_id, rate in rows:
+        benefits_map.setdefault(wallet_id, {})[category_id] = rate
+
+    for wallet in state["wallets"]:
+        wallet['benefits'] = benefits_map.get(wallet['id'], {})
+
+
+def _load_balances(db: Connection, state: Dict) -> None:
+    # Read from the materialized store (see wallet_balances.py): credit cards
+    # show total spent, debit/cash/digital/ewallet show total income
+    balances = get_wallet_balances(db)
+    for wallet in state["wallets"]:
+        wallet['balance'] = balances[wallet['id']]['balance'] if wallet['id'] in balances else 0.0
+
+    state["totalIncome"] = sum((b['income_total'] for b in balances.values()), 0.0)
+
+
+def _load_transactions(db: Connection, state: Dict) -> None:
+    # Pick the newest headers first so the date index drives the join
+    state["transactions"] = [dict(row) for row in db.execute("""
+        SELECT th.*, td.category_id, td.line_amount, td.cashback_earned, td.billing_date
+        FROM (
+            SELECT * FROM transaction_headers
+            ORDER BY transaction_date DESC LIMIT 50
+        ) th
+        LEFT JOIN transaction_details td ON th.id = td.header_id
+        ORDER BY th.transaction_date DESC LIMIT 50
+    """).fetchall()]
+
+
+def _load_goals(db: Connection, state: Dict) -> None:
+    state["goals"] = [dict(row) for row in db.execute("SELECT * FROM savings_goals").fetchall()]
+
+
+def _load_recommendations(db: Connection, state: Dict) -> None:
+    # All statuses
+    state["recommendations"] = [dict(row) for row in db.execute(
+        "SELECT * FROM strategic_recommendations ORDER BY created_at DESC"
+    ).fetchall()]
+
+
+def _load_budgets(db: Connection, state: Dict) -> None:
+    rows = db.execute("""
+        SELECT c.code as category, mb.amount
+        FROM monthly_budgets mb
+        JOIN categories c ON mb.category_id = c.id
+        WHERE mb.month_year = '2026-02'
+    """).fetchall()
+    state["budgets"] = {row['category']: row['amount'] for row in rows}
+
+
+def _load_cashback(db: Connection, state: Dict) -> None:
+    # Each wallet's current statement cycle, straight from the ledger buckets
+    state["cashbackMTD"] = get_cycle_cashback(db, SERVER_DATE)
+
+
+# Ordered read plan: (section name, loader). Loaders may depend on earlier sections.
+STATE_PLAN: List[Tuple[str, Callable[[Connection, Dict], None]]] = [
+    ("categories", _load_categories),
+    ("wallets", _load_wallets),
+    ("benefits", _load_benefits),
+    ("balances", _load_balances),
+    ("transactions", _load_transactions),
+    ("goals", _load_goals),
+    ("recommendations", _load_recommendations),
+    ("budgets", _load_budgets),
+    ("cashback", _load_cashback),
+]
+
+
+def build_app_state(db: Connection) -> Tuple[Dict, Dict[str, float]]:
+    """
+    Run the state plan against a connection.
+
+    Args:
+        db: Database connection
+
+    Returns:
+        Tuple of (dashboard payload, per-section timings in milliseconds)
+    """
+    state: Dict = {}
+    timings: Dict[str, float] = {}
+
+    for name, loader in STATE_PLAN:
+        start = time.perf_counter()
+        loader(db, state)
+        timings[name] = round((time.perf_counter() - start) * 1000, 3)
+
+    payload = {
+        "categories": state["categories"],
+        "wallets": state["wallets"],
+        "transactions": state["transactions"],
+        "goals": state["goals"],
+        "recommendations": state["recommendations"],
+        "budgets": state["budgets"],
+        "totalIncome": state["totalIncome"],
+        "cashbackMTD": state["cashbackMTD"],
+        "serverTime": SERVER_DATE
+    }
+    return payload, timings
+
+
+def format_server_timing(timings: Dict[str, float]) -> str:
+    """Render section timings as a Server-Timing header value."""
+    return ", ".join(f"{name};dur={ms}" for name, ms in timings.items())
+
+
+@dataclass
+class StateSnapshot:
+    data_version: int
+    body: bytes
+    etag: str
+    timings: Dict[str, float]
+    built_at: float
+
+
+_snapshot: Optional[StateSnapshot] = None
+_snapshot_lock = threading.Lock()
+_cache_stats = {"hits": 0, "misses": 0, "not_modified": 0}
+
+
+def _count(name: str) -> None:
+    # Snapshots are built from executor threads; keep the counters under the lock
+    with _snapshot_lock:
+        _cache_stats[name] += 1
+
+
+def get_state_snapshot(db: Connection) -> Tuple[StateSnapshot, bool]:
+    """
+    Return the cached state snapshot, rebuilding it if the data changed.
+
+    Args:
+        db: Database connection (only used on a rebuild)
+
+    Returns:
+        Tuple of (snapshot, served_from_cache)
+    """
+    global _snapshot
+    version = get_data_version()
+    snapshot = _snapshot
+    if (
+        snapshot is not None
+        and snapshot.data_version == version
+        and time.time() - snapshot.built_at < STATE_CACHE_MAX_AGE
+    ):
+        _count("hits")
+        return snapshot, True
+
+    payload, timings = build_app_state(db)
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    # Strong validator: derived from the exact bytes served
+    etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+    snapshot = StateSnapshot(version, body, etag, timings, time.time())
+
+    with _snapshot_lock:
+        # Never replace a snapshot built from newer data
+        if _snapshot is None or _snapshot.data_version <= version:
+            _snapshot = snapshot
+        _cache_stats["misses"] += 1
+    return snapshot, False
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Evaluate an If-None-Match header against a strong ETag."""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def record_not_modified() -> None:
+    _count("not_modified")
+
+
+def get_state_cache_stats() -> Dict:
+    with _snapshot_lock:
+        snapshot = _snapshot
+        counters = dict(_cache_stats)
+    return {
+        **counters,
+        "data_version": get_data_version(),
+        "snapshot_version": snapshot.data_version if snapshot else None,
+        "snapshot_bytes": len(snapshot.body) if snapshot else 0,
+        "max_age_s": STATE_CACHE_MAX_AGE,
+    }
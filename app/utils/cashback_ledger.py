@@ -0,0 +1,370 @@
+"""
+Cashback ledger keyed to statement cycles
+
+Every detail line that earns cashback gets a cashback_ledger row
+(10_cashback_ledger_db.sql). The row is assigned to the wallet's statement
+cycle for its billing_date. A cycle is labelled by the month it closes in,
+on wallets.cycle_day, or by the calendar month when there is no cycle day.
+Within a cycle the monthly_cashback_limit is applied in billing order
+(billing_date, then detail id). Each line stores both its uncapped
+'earned' amount and the 'credited' amount left under the cap.
+wallet_cashback_history holds the per-cycle totals, so the dashboard reads
+cycle-to-date cashback in O(wallets).
+
+    python -m app.utils.cashback_ledger --rebuild [--from YYYY-MM-DD] [--to YYYY-MM-DD] [--wallet ID]
+"""
+from calendar import monthrange
+from collections import defaultdict
+from sqlite3 import Connection
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import argparse
+import json
+
+Cycle = Tuple[int, str]  # (wallet_id, month_year)
+Line = Tuple[str, int, float, float]  # (billing_date, detail_id, earned, credited)
+
+# Float slack when comparing a credited total with its cap
+CAP_EPSILON = 1e-9
+
+
+def statement_cycle(billing_date: str, cycle_day: Optional[int]) -> str:
+    """
+    Statement cycle ('YYYY-MM', the month the statement closes) for a billing date.
+
+    Example: with cycle_day 15, 2026-02-15 is in '2026-02' and 2026-02-16 in '2026-03'.
+    Cycle days past the end of a month close on its last day.
+    """
+    year, month, day = int(billing_date[0:4]), int(billing_date[5:7]), int(billing_date[8:10])
+    if cycle_day and day > min(cycle_day, monthrange(year, month)[1]):
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return f"{year:04d}-{month:02d}"
+
+
+def _shift_month(month_year: str, months: int) -> str:
+    index = int(month_year[:4]) * 12 + int(month_year[5:7]) - 1 + months
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def _load_wallets(db: Connection) -> Dict[int, Tuple[Optional[int], Optional[float]]]:
+    return {
+        row[0]: (row[1], row[2])
+        for row in db.execute("SELECT id, cycle_day, monthly_cashback_limit FROM wallets").fetchall()
+    }
+
+
+def _apply_caps(
+    lines: List[Line], limit: Optional[float], credited_before: float = 0.0
+) -> Tuple[List[Tuple[float, int]], float, bool]:
+    """
+    Cap a cycle's lines in billing order.
+
+    Args:
+        lines: (billing_date, detail_id, earned, stored credited) tuples
+        limit: Cycle cap (None for uncapped)
+        credited_before: Credited total of the cycle's earlier lines
+
+    Returns:
+        Tuple of (changed (credited, detail_id) pairs, cycle total, capped flag)
+    """
+    changed = []
+    total = credited_before
+    for _, detail_id, earned, stored in sorted(lines):
+        amount = earned if limit is None else max(0.0, min(earned, limit - total))
+        if amount != stored:
+            changed.append((amount, detail_id))
+        total += amount
+    # Under a running cap the credited total reaches the limit exactly when earnings do
+    return changed, total, limit is not None and total >= limit - CAP_EPSILON
+
+
+def _write_cycles(
+    db: Connection,
+    cycles: Set[Cycle],
+    lines_by_cycle: Dict[Cycle, List[Line]],
+    wallets: Dict[int, Tuple[Optional[int], Optional[float]]],
+    replaced: Optional[Dict[Cycle, float]] = None,
+    previous: Optional[Dict[Cycle, float]] = None,
+) -> None:
+    """
+    Re-apply caps and update history buckets and cashback_ytd for cycles.
+
+    Without `replaced`, lines_by_cycle holds every line of each cycle.
+    With it, lines_by_cycle holds only the tail of each cycle from the first
+    change on, and `replaced` the credited total that tail (plus any removed
+    lines) had, so the untouched head is the bucket amount minus it.
+
+    cashback_ytd moves by each cycle's change in credited total. Capped
+    wallets read the old total from their bucket; uncapped wallets have no
+    bucket, so their change is the tail's new total minus `replaced`, or on a
+    rebuild the new total minus `previous` (the cycle's old ledger total;
+    None leaves uncapped wallets alone and the caller sets cashback_ytd).
+    """
+    if not cycles:
+        return
+    values = ",".join("(?, ?)" for _ in cycles)
+    params = [value for cycle in sorted(cycles) for value in cycle]
+    buckets = {
+        (row[0], row[1]): (row[2], row[3])
+        for row in db.execute(f"""
+            WITH target(wallet_id, month_year) AS (VALUES {values})
+            SELECT h.wallet_id, h.month_year, h.amount_earned, h.monthly_limit
+            FROM target
+            JOIN wallet_cashback_history h
+                ON h.wallet_id = target.wallet_id AND h.month_year = target.month_year
+        """, params).fetchall()
+    }
+
+    credited_rows = []
+    bucket_rows = []
+    ytd_delta: Dict[int, float] = defaultdict(float)
+    for cycle in cycles:
+        wallet_id, month_year = cycle
+        old_amount, bucket_limit = buckets.get(cycle, (0.0, None))
+        limit = bucket_limit if bucket_limit is not None else wallets.get(wallet_id, (None, None))[1]
+        credited_before = max(0.0, (old_amount or 0.0) - replaced.get(cycle, 0.0)) if replaced is not None else 0.0
+        changed, total, capped = _apply_caps(lines_by_cycle.get(cycle, []), limit, credited_before)
+        credited_rows += changed
+        if limit is not None:
+            if cycle in buckets or total:
+                bucket_rows.append((wallet_id, month_year, limit, total, 1 if capped else 0))
+                ytd_delta[wallet_id] += total - (old_amount or 0.0)
+        elif replaced is not None:
+            ytd_delta[wallet_id] += total - credited_before - replaced.get(cycle, 0.0)
+        elif previous is not None:
+            ytd_delta[wallet_id] += total - previous.get(cycle, 0.0)
+
+    db.executemany("UPDATE cashback_ledger SET credited = ? WHERE detail_id = ?", credited_rows)
+    db.executemany("""
+        INSERT INTO wallet_cashback_history (wallet_id, month_year, monthly_limit, amount_earned, is_capped)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(wallet_id, month_year) DO UPDATE SET
+            amount_earned = excluded.amount_earned,
+            is_capped = excluded.is_capped,
+            updated_at = CURRENT_TIMESTAMP
+    """, bucket_rows)
+    db.executemany(
+        "UPDATE wallets SET cashback_ytd = cashback_ytd + ? WHERE id = ?",
+        [(delta, wallet_id) for wallet_id, delta in ytd_delta.items() if delta]
+    )
+
+
+def record_cashback(db: Connection, detail_ids: Iterable[int]) -> int:
+    """
+    Bring the ledger up to date for inserted, updated or deleted detail lines (does not commit).
+
+    Only the cycles the lines leave or enter are touched, and within each
+    one only the lines from the earliest changed position in billing order
+    are re-capped, so appends to the current cycle read just the new lines.
+
+    Args:
+        db: Read-write database connection
+        detail_ids: IDs of the transaction_details rows that changed
+
+    Returns:
+        Number of cycles re-settled
+    """
+    ids_param = json.dumps(list(detail_ids))
+    wallets = _load_wallets(db)
+
+    # Earliest (billing_date, detail_id) changed in each cycle
+    start: Dict[Cycle, Tuple[str, int]] = {}
+
+    def mark(cycle: Cycle, key: Tuple[str, int]) -> None:
+        if cycle not in start or key < start[cycle]:
+            start[cycle] = key
+
+    replaced: Dict[Cycle, float] = defaultdict(float)
+    for wallet_id, month_year, billing_date, detail_id, credited in db.execute(
+        "SELECT wallet_id, month_year, billing_date, detail_id, credited FROM cashback_ledger WHERE detail_id IN (SELECT value FROM json_each(?))",
+        (ids_param,)
+    ).fetchall():
+        mark((wallet_id, month_year), (billing_date, detail_id))
+        replaced[(wallet_id, month_year)] += credited
+    db.execute("DELETE FROM cashback_ledger WHERE detail_id IN (SELECT value FROM json_each(?))", (ids_param,))
+
+    new_rows = []
+    for detail_id, wallet_id, billing_date, earned in db.execute("""
+        SELECT td.id, th.wallet_id, td.billing_date, td.cashback_earned
+        FROM transaction_details td
+        JOIN transaction_headers th ON th.id = td.header_id
+        WHERE td.id IN (SELECT value FROM json_each(?))
+        AND td.cashback_earned > 0
+    """, (ids_param,)).fetchall():
+        month_year = statement_cycle(billing_date, wallets.get(wallet_id, (None, None))[0])
+        new_rows.append((detail_id, wallet_id, month_year, billing_date, earned))
+        mark((wallet_id, month_year), (billing_date, detail_id))
+    db.executemany("""
+        INSERT INTO cashback_ledger (detail_id, wallet_id, month_year, billing_date, earned, credited)
+        VALUES (?, ?, ?, ?, ?, 0)
+    """, new_rows)
+
+    # Only the tail from the first change is re-capped; the head keeps its credits
+    lines_by_cycle: Dict[Cycle, List[Line]] = {}
+    for (wallet_id, month_year), (billing_date, detail_id) in start.items():
+        tail = [tuple(row) for row in db.execute("""
+            SELECT billing_date, detail_id, earned, credited FROM cashback_ledger
+            WHERE wallet_id = ? AND month_year = ? AND (billing_date, detail_id) >= (?, ?)
+        """, (wallet_id, month_year, billing_date, detail_id)).fetchall()]
+        lines_by_cycle[(wallet_id, month_year)] = tail
+        replaced[(wallet_id, month_year)] += sum(line[3] for line in tail)
+
+    _write_cycles(db, set(start), lines_by_cycle, wallets, replaced)
+    return len(start)
+
+
+def rebuild_cashback(
+    db: Connection, date_from: Optional[str] = None, date_to: Optional[str] = None, wallet_id: Optional[int] = None
+) -> Dict:
+    """
+    Rebuild the ledger and history buckets from transaction_details in one pass (does not commit).
+
+    Every statement cycle from the one containing date_from to the one
+    containing date_to is rebuilt in full, so caps are reapplied in order.
+    Run it for a wallet whose cycle_day changed: its lines move to new cycles.
+
+    Args:
+        db: Read-write database connection
+        date_from: First billing date to cover (None for the start of history)
+        date_to: Last billing date to cover (None for the end of history)
+        wallet_id: Only rebuild this wallet (None for all wallets)
+
+    Returns:
+        Counts of cycles and ledger lines written
+    """
+    wallets = _load_wallets(db)
+    bounds = {
+        wallet: (
+            statement_cycle(date_from, cycle_day) if date_from else "0000-00",
+            statement_cycle(date_to, cycle_day) if date_to else "9999-99",
+        )
+        for wallet, (cycle_day, _) in wallets.items()
+    }
+
+    def in_range(cycle: Cycle) -> bool:
+        if wallet_id is not None and cycle[0] != wallet_id:
+            return False
+        start, end = bounds.get(cycle[0], ("0000-00", "9999-99"))
+        return start <= cycle[1] <= end
+
+    # A cycle spans at most two calendar months, so widening the date filter
+    # by a month on each side covers every line of the cycles in range
+    conditions = ["td.cashback_earned > 0"]
+    params: List = []
+    if wallet_id is not None:
+        conditions.append("th.wallet_id = ?")
+        params.append(wallet_id)
+    if date_from:
+        conditions.append("td.billing_date >= ?")
+        params.append(_shift_month(date_from[:7], -1) + "-01")
+    if date_to:
+        conditions.append("td.billing_date < ?")
+        params.append(_shift_month(date_to[:7], 2) + "-01")
+
+    lines_by_cycle: Dict[Cycle, List[Line]] = defaultdict(list)
+    ledger_rows = []
+    for detail_id, line_wallet_id, billing_date, earned in db.execute(f"""
+        SELECT td.id, th.wallet_id, td.billing_date, td.cashback_earned
+        FROM transaction_details td
+        JOIN transaction_headers th ON th.id = td.header_id
+        WHERE {' AND '.join(conditions)}
+    """, params).fetchall():
+        cycle = (line_wallet_id, statement_cycle(billing_date, wallets.get(line_wallet_id, (None, None))[0]))
+        if in_range(cycle):
+            lines_by_cycle[cycle].append((billing_date, detail_id, earned, 0.0))
+            ledger_rows.append((detail_id, line_wallet_id, cycle[1], billing_date, earned))
+
+    # Old credited totals move cashback_ytd of uncapped wallets. An empty ledger
+    # is the first build: cashback_ytd still holds the old trigger's uncapped sums
+    previous = None
+    if db.execute("SELECT 1 FROM cashback_ledger LIMIT 1").fetchone():
+        previous = {
+            (row[0], row[1]): row[2]
+            for row in db.execute(
+                "SELECT wallet_id, month_year, SUM(credited) FROM cashback_ledger GROUP BY wallet_id, month_year"
+            ).fetchall()
+            if in_range((row[0], row[1]))
+        }
+
+    # Buckets and ledger cycles in range without any lines left are zeroed
+    cycles = set(lines_by_cycle) | set(previous or {}) | {
+        (row[0], row[1]) for row in db.execute("SELECT wallet_id, month_year FROM wallet_cashback_history").fetchall()
+        if in_range((row[0], row[1]))
+    }
+    if date_from or date_to or wallet_id is not None:
+        stale = {
+            (row[0], row[1]) for row in db.execute("SELECT DISTINCT wallet_id, month_year FROM cashback_ledger").fetchall()
+            if in_range((row[0], row[1]))
+        }
+        db.executemany("DELETE FROM cashback_ledger WHERE wallet_id = ? AND month_year = ?", sorted(stale | cycles))
+    else:
+        db.execute("DELETE FROM cashback_ledger")
+    db.executemany("""
+        INSERT OR REPLACE INTO cashback_ledger (detail_id, wallet_id, month_year, billing_date, earned, credited)
+        VALUES (?, ?, ?, ?, ?, 0)
+    """, ledger_rows)
+
+    _write_cycles(db, cycles, lines_by_cycle, wallets, previous=previous)
+    if previous is None:
+        # Replace them with the credited amounts instead of moving them by a delta
+        db.execute(f"""
+            UPDATE wallets SET cashback_ytd = (
+                SELECT COALESCE(SUM(credited), 0) FROM cashback_ledger WHERE wallet_id = wallets.id
+            ){" WHERE id = ?" if wallet_id is not None else ""}
+        """, [wallet_id] if wallet_id is not None else [])
+    return {"cycles": len(cycles), "lines": len(ledger_rows)}
+
+
+def ensure_cashback_ledger(db: Connection) -> bool:
+    """Build the ledger on first start after the migration; returns True if it was built."""
+    if db.execute("SELECT 1 FROM cashback_ledger LIMIT 1").fetchone():
+        return False
+    if not db.execute("SELECT 1 FROM transaction_details WHERE cashback_earned > 0 LIMIT 1").fetchone():
+        return False
+    rebuild_cashback(db)
+    db.commit()
+    return True
+
+
+def get_cycle_cashback(db: Connection, as_of: str) -> List[Dict]:
+    """
+    Cycle-to-date cashback per wallet: the history bucket of the statement
+    cycle each wallet is in on `as_of` (YYYY-MM-DD).
+    """
+    wallets = _load_wallets(db)
+    if not wallets:
+        return []
+    cycles = sorted((wallet_id, statement_cycle(as_of, cycle_day)) for wallet_id, (cycle_day, _) in wallets.items())
+    values = ",".join("(?, ?)" for _ in cycles)
+    return [dict(row) for row in db.execute(f"""
+        WITH current(wallet_id, month_year) AS (VALUES {values})
+        SELECT h.wallet_id, h.amount_earned, h.monthly_limit, h.month_year
+        FROM current
+        JOIN wallet_cashback_history h
+            ON h.wallet_id = current.wallet_id AND h.month_year = current.month_year
+        ORDER BY h.wallet_id
+    """, [value for cycle in cycles for value in cycle]).fetchall()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cashback ledger maintenance")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild ledger and cashback history")
+    parser.add_argument("--from", dest="date_from", help="First billing date (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="date_to", help="Last billing date (YYYY-MM-DD)")
+    parser.add_argument("--wallet", dest="wallet_id", type=int, help="Only rebuild this wallet")
+    args = parser.parse_args()
+    if not args.rebuild:
+        parser.print_help()
+        return
+
+    from ..db.connection import get_db_connection
+    from ..db.migrations import apply_migrations
+
+    with get_db_connection() as conn:
+        apply_migrations(conn)
+        result = rebuild_cashback(conn, args.date_from, args.date_to, args.wallet_id)
+        conn.commit()
+    print(f"✅ Rebuilt {result['cycles']} cycles from {result['lines']} cashback lines")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Server-sent events for /chat/stream
+
+Translates pydantic-ai agent stream events into the SSE messages sent to the
+client:
+
+- `status`: {"stage": "started", "session_id"} sent immediately
+- `token`: {"text"} model text as it is generated
+- `tool`: {"tool", "status": "started" | "finished" | "retry", "id", "args"?, "parent"?}
+  tool-call progress, including the sql_agent's queries inside
+  ask_database (parent = "ask_database")
+- `done`: {"response", "tool_calls", "usage", "session_id"} the final answer
+- `error`: {"detail"}
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import asyncio
+import json
+
+from pydantic_ai.messages import (
+    FunctionToolCallEvent, FunctionToolResultEvent, PartDeltaEvent, PartStartEvent,
+    RetryPromptPart, TextPart, TextPartDelta,
+)
+from pydantic_core import to_jsonable_python
+
+StreamItem = Tuple[str, Dict[str, Any]]
+
+
+def sse(event: str, data: Any) -> str:
+    """Format one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(to_jsonable_python(data, fallback=str))}\n\n"
+
+
+def describe_event(event: Any, parent: Optional[str] = None) -> List[StreamItem]:
+    """SSE messages for one agent stream event (empty for events the client does not need)."""
+    if isinstance(event, PartStartEvent) and isinstance(event.part, TextPart) and event.part.content:
+        return [("token", {"text": event.part.content})]
+    if isinstance(event, PartDeltaEvent) and isinstance(event.delta, TextPartDelta) and event.delta.content_delta:
+        return [("token", {"text": event.delta.content_delta})]
+
+    if isinstance(event, FunctionToolCallEvent):
+        payload = {"tool": event.part.tool_name, "status": "started", "id": event.tool_call_id}
+        try:
+            payload["args"] = event.part.args_as_dict()
+        except Exception:
+            payload["args"] = event.part.args
+    elif isinstance(event, FunctionToolResultEvent):
+        status = "retry" if isinstance(event.result, RetryPromptPart) else "finished"
+        payload = {"tool": event.result.tool_name, "status": status, "id": event.tool_call_id}
+    else:
+        return []
+
+    if parent:
+        payload["parent"] = parent
+    return [("tool", payload)]
+
+
+def forward_events(queue: "asyncio.Queue[Optional[StreamItem]]", parent: Optional[str] = None) -> Callable:
+    """
+    event_stream_handler for agent runs that pushes their progress onto a stream queue.
+
+    Used for nested runs (ask_database -> sql_agent) so their tool calls
+    reach the client while the outer tool is still running. Their text is
+    intermediate data for the pilot, so only tool events are forwarded.
+    """
+    async def handler(ctx, events) -> None:
+        async for event in events:
+            for name, payload in describe_event(event, parent):
+                if name == "tool":
+                    queue.put_nowait((name, payload))
+    return handler
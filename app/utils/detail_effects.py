@@ -0,0 +1,79 @@
+"""
+Post-insert processing for transaction_details
+
+Replaces the per-row match_transaction_to_recurring and
+manage_cashback_and_history triggers (dropped in 9_detail_effects_db.sql)
+with one set-based pass over a whole batch of newly inserted detail lines:
+
+- Recurring match: recurring_expenses is read once and each line is tagged
+  '[Matched Recurring: <name>]' when an expense in its category is within
+  10% of the line amount (first match by id, as the trigger did).
+- Cashback: earning lines are posted to the cashback ledger
+  (app/utils/cashback_ledger.py), which assigns them to the wallet's
+  statement cycle by billing_date and re-settles only the cycles touched.
+
+Every code path that inserts detail lines must call apply_detail_effects
+with the new ids before committing.
+"""
+from collections import defaultdict
+from sqlite3 import Connection
+from typing import Dict, Iterable, List, Tuple
+import json
+
+from .cashback_ledger import record_cashback
+
+# Largest relative difference between a line and a recurring estimate
+RECURRING_TOLERANCE = 0.10
+
+
+def _match_recurring(line_amount: float, candidates: List[Tuple[str, float]]):
+    for name, estimate in candidates:
+        # Same arithmetic as the old trigger (NULL / zero estimates never match)
+        if estimate and abs(line_amount - estimate) / estimate <= RECURRING_TOLERANCE:
+            return name
+    return None
+
+
+def apply_detail_effects(db: Connection, detail_ids: Iterable[int]) -> Dict[str, int]:
+    """
+    Run recurring matching and cashback accounting for new detail lines (does not commit).
+
+    Args:
+        db: Read-write database connection
+        detail_ids: IDs of the transaction_details rows just inserted
+
+    Returns:
+        Counts of lines processed, recurring matches and wallets whose
+        cashback was updated
+    """
+    detail_ids = list(detail_ids)
+    if not detail_ids:
+        return {"processed": 0, "recurring_matches": 0, "cashback_cycles": 0}
+
+    rows = db.execute("""
+        SELECT td.id, td.category_id, td.line_amount, td.cashback_earned, th.wallet_id
+        FROM transaction_details td
+        JOIN transaction_headers th ON th.id = td.header_id
+        WHERE td.id IN (SELECT value FROM json_each(?))
+        ORDER BY td.id
+    """, (json.dumps(detail_ids),)).fetchall()
+
+    # 1. Recurring expense tags
+    recurring: Dict[int, List[Tuple[str, float]]] = defaultdict(list)
+    for category_id, name, estimate in db.execute(
+        "SELECT category_id, name, amount_estimate FROM recurring_expenses ORDER BY id"
+    ).fetchall():
+        recurring[category_id].append((name, estimate))
+
+    matches = []
+    for row in rows:
+        name = _match_recurring(row['line_amount'], recurring.get(row['category_id'], []))
+        if name is not None:
+            matches.append((f" [Matched Recurring: {name}]", row['id']))
+    db.executemany("UPDATE transaction_details SET description = description || ? WHERE id = ?", matches)
+
+    # 2. Cashback ledger, history buckets and year-to-date totals per statement cycle
+    earning = [row['id'] for row in rows if row['cashback_earned'] and row['cashback_earned'] > 0]
+    cycles = record_cashback(db, earning) if earning else 0
+
+    return {"processed": len(rows), "recurring_matches": len(matches), "cashback_cycles": cycles}
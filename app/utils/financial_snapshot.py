@@ -0,0 +1,157 @@
+"""
+Financial snapshot for agent prompts
+
+strategic_pilot kept asking for the same facts (balances, limits, available
+credit, cycle/due days, this month's spend against budget, cashback cap
+remaining), one ask_database call at a time. The snapshot collects them into a
+compact block of text in its instructions, so a typical turn needs zero or
+one tool call; simulation_agent gets it to suggest other cards:
+
+    FINANCIAL SNAPSHOT (as of 2026-02-07)
+    Wallets:
+    - #1 Amore Cashback [credit] owed ₱6,250.00 of ₱50,000.00 limit, available ₱43,750.00; cycle day 5, due day 25
+    ...
+
+The rendered text is cached per data version (any committed write rebuilds it,
+see app/db/versioning.py) and at most FINANCIAL_SNAPSHOT_MAX_AGE seconds old
+to pick up writes from other processes. Queries are the SQL templates'
+(sql_templates.py), so the snapshot and template answers agree.
+"""
+from dataclasses import dataclass
+from sqlite3 import Connection
+from typing import Dict, List, Optional
+import os
+import threading
+import time
+
+from ..core.context_registry import estimate_tokens
+from ..db.versioning import get_data_version
+from .app_state import SERVER_DATE
+from .sql_templates import fetch_budget_remaining, fetch_category_spend, fetch_cycle_cashback, month_range
+
+FINANCIAL_SNAPSHOT_ENABLED = os.getenv("FINANCIAL_SNAPSHOT_ENABLED", "1") not in ("0", "false", "no")
+FINANCIAL_SNAPSHOT_MAX_AGE = float(os.getenv("FINANCIAL_SNAPSHOT_MAX_AGE", "60"))
+
+
+def _peso(amount: Optional[float]) -> str:
+    return f"₱{amount or 0.0:,.2f}"
+
+
+def _fetch_wallets(db: Connection) -> List[Dict]:
+    return [dict(row) for row in db.execute("""
+        SELECT v.wallet_id, v.name, v.type, v.credit_limit, v.ledger_balance, v.available_credit,
+            w.cycle_day, w.due_day
+        FROM wallet_balance_view v
+        JOIN wallets w ON w.id = v.wallet_id
+        ORDER BY v.wallet_id
+    """).fetchall()]
+
+
+def build_financial_snapshot(db: Connection, as_of: str = SERVER_DATE) -> Dict:
+    """Facts for the snapshot as plain data (wallets, budgets, spend, cashback)."""
+    params = {**month_range(as_of[:7]), "as_of": as_of, "category_id": None}
+    return {
+        "as_of": as_of,
+        "month": params["month"],
+        "wallets": _fetch_wallets(db),
+        "budgets": fetch_budget_remaining(db, params),
+        "spend": fetch_category_spend(db, params),
+        "cashback": fetch_cycle_cashback(db, params),
+    }
+
+
+def render_financial_snapshot(snapshot: Dict) -> str:
+    """Compact prompt text for a snapshot."""
+    lines = [f"FINANCIAL SNAPSHOT (as of {snapshot['as_of']}; amounts in PHP)", "Wallets:"]
+    for w in snapshot["wallets"]:
+        days = ", ".join(f"{label} day {w[key]}" for label, key in (("cycle", "cycle_day"), ("due", "due_day")) if w[key])
+        if w["type"] == "credit":
+            text = (f"owed {_peso(w['ledger_balance'])} of {_peso(w['credit_limit'])} limit, "
+                    f"available {_peso(w['available_credit'])}")
+        else:
+            text = f"cash {_peso(w['ledger_balance'])}"
+        lines.append(f"- #{w['wallet_id']} {w['name']} [{w['type']}] {text}" + (f"; {days}" if days else ""))
+
+    budgeted = {row["category"] for row in snapshot["budgets"]}
+    if snapshot["budgets"]:
+        lines.append(f"Budgets {snapshot['month']} (spent / budget, left):")
+        lines += [f"- {b['category']}: {_peso(b['spent'])} / {_peso(b['budget'])}, {_peso(b['remaining'])} left"
+                  for b in snapshot["budgets"]]
+    unbudgeted = [s for s in snapshot["spend"] if s["category"] not in budgeted]
+    if unbudgeted:
+        lines.append(f"Other spend {snapshot['month']}: " + ", ".join(f"{s['category']} {_peso(s['spent'])}" for s in unbudgeted))
+
+    if snapshot["cashback"]:
+        lines.append("Cashback this statement cycle (earned / cap):")
+        lines += [f"- #{c['wallet_id']} {c['name']} ({c['cycle']}): {_peso(c['earned'])} / {_peso(c['monthly_limit'])}, "
+                  f"{_peso(c['cap_remaining'])} left" for c in snapshot["cashback"]]
+
+    lines.append("Use these figures directly. Call ask_database only for anything not listed "
+                 "(transactions, merchants, other months, benefits).")
+    return "\n".join(lines)
+
+
+@dataclass
+class RenderedSnapshot:
+    data_version: int
+    as_of: str
+    text: str
+    built_at: float
+
+
+_snapshot: Optional[RenderedSnapshot] = None
+_snapshot_lock = threading.Lock()
+_stats = {"hits": 0, "rebuilds": 0, "errors": 0}
+
+
+def _count(name: str) -> None:
+    # Snapshots are built from executor threads; keep the counters under the lock
+    with _snapshot_lock:
+        _stats[name] += 1
+
+
+def get_financial_snapshot_text(db: Connection) -> str:
+    """
+    Cached snapshot prompt text, rebuilt after any write (blocking).
+
+    Returns an empty string if the snapshot cannot be built; agents then fall
+    back to ask_database as before.
+    """
+    global _snapshot
+    version = get_data_version()
+    snapshot = _snapshot
+    if (
+        snapshot is not None
+        and snapshot.data_version == version
+        and snapshot.as_of == SERVER_DATE
+        and time.time() - snapshot.built_at < FINANCIAL_SNAPSHOT_MAX_AGE
+    ):
+        _count("hits")
+        return snapshot.text
+
+    try:
+        text = render_financial_snapshot(build_financial_snapshot(db))
+    except Exception as e:
+        print(f"Financial snapshot failed: {e}")
+        _count("errors")
+        return ""
+
+    with _snapshot_lock:
+        # Never replace a snapshot built from newer data
+        if _snapshot is None or _snapshot.data_version <= version:
+            _snapshot = RenderedSnapshot(version, SERVER_DATE, text, time.time())
+        _stats["rebuilds"] += 1
+    return text
+
+
+def get_financial_snapshot_stats() -> Dict:
+    with _snapshot_lock:
+        snapshot = _snapshot
+        counters = dict(_stats)
+    return {
+        **counters,
+        "enabled": FINANCIAL_SNAPSHOT_ENABLED,
+        "data_version": snapshot.data_version if snapshot else None,
+        "tokens": estimate_tokens(snapshot.text) if snapshot else 0,
+        "max_age_s": FINANCIAL_SNAPSHOT_MAX_AGE,
+    }
@@ -0,0 +1,121 @@
+"""
+Chat guardrail stage and latency metrics
+
+Every chat turn is classified FINANCIAL / OFF-TOPIC before an answer is
+returned, locally when the intent classifier is confident
+(app/utils/intent_classifier.py) and by guardrail_agent otherwise. GUARDRAIL_MODE chooses how that check is scheduled:
+
+- serial: classify first, start the pilot only for FINANCIAL queries.
+- speculative (default): start the classifier and the pilot together and
+  cancel the pilot if the query is OFF-TOPIC. Turn latency becomes
+  max(classifier, pilot) instead of their sum. Write tools wait for the
+  verdict (PilotDeps.cleared) so a rejected query never changes data.
+
+Latency samples per stage are kept in a bounded window for /metrics/chat.
+"""
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+import os
+import statistics
+import threading
+import time
+
+from ..agents.pilot import guardrail_agent
+from ..db.async_db import run_db
+from .intent_classifier import OFF_TOPIC, get_intent_classifier, get_intent_stats, record_intent
+
+GUARDRAIL_MODES = ("serial", "speculative")
+GUARDRAIL_MODE = os.getenv("GUARDRAIL_MODE", "speculative").lower()
+if GUARDRAIL_MODE not in GUARDRAIL_MODES:
+    GUARDRAIL_MODE = "speculative"
+
+# Latency samples kept per (mode, stage) for the percentiles
+LATENCY_WINDOW = int(os.getenv("CHAT_LATENCY_WINDOW", "500"))
+
+OFF_TOPIC_RESPONSE = (
+    "I'm sorry, but I can only assist with personal finance, budgeting, and savings-related questions. "
+    "How can I help you with your wealth today?"
+)
+
+
+async def classify_query(query: str, message_history: Optional[List] = None) -> Tuple[bool, Optional[object]]:
+    """
+    Classify a query: the local intent classifier first, guardrail_agent
+    (context aware) only for queries it is not confident about.
+
+    Returns:
+        Tuple of (off_topic, usage). usage is None for local verdicts. A
+        failed LLM check lets the query through, as before.
+    """
+    start = time.perf_counter()
+    try:
+        classifier = await run_db(get_intent_classifier)
+        label, _ = classifier.classify(query)
+        record_intent(label)
+        if label is not None:
+            return label == OFF_TOPIC, None
+
+        result = await guardrail_agent.run(query, message_history=message_history)
+        output = str(getattr(result, 'output', result))
+        return "OFF-TOPIC" in output.upper(), result.usage()
+    except Exception as e:
+        print(f"Guardrail check failed: {e}")
+        return False, None
+    finally:
+        record_latency("guardrail", time.perf_counter() - start)
+
+
+class LatencyStats:
+    """Thread-safe per-stage latency samples and counters, grouped by guardrail mode."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self._samples: Dict[Tuple[str, str], Deque[float]] = {}
+        self._counters: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, mode: str, stage: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault((mode, stage), deque(maxlen=self.window)).append(seconds)
+
+    def count(self, mode: str, name: str) -> None:
+        with self._lock:
+            self._counters[(mode, name)] = self._counters.get((mode, name), 0) + 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            samples = {key: list(values) for key, values in self._samples.items()}
+            counters = dict(self._counters)
+
+        report: Dict = {"mode": GUARDRAIL_MODE}
+        for mode in GUARDRAIL_MODES:
+            section: Dict = {name: value for (m, name), value in counters.items() if m == mode}
+            for (m, stage), values in sorted(samples.items()):
+                if m != mode:
+                    continue
+                ordered = sorted(values)
+                section[stage] = {
+                    "samples": len(ordered),
+                    "p50_ms": round(statistics.median(ordered) * 1000, 1),
+                    "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 1),
+                    "avg_ms": round(sum(ordered) / len(ordered) * 1000, 1),
+                }
+            report[mode] = section
+        return report
+
+
+_latency = LatencyStats()
+
+
+def record_latency(stage: str, seconds: float, mode: Optional[str] = None) -> None:
+    """Record one stage duration ('guardrail', 'pilot', 'total') for the active mode."""
+    _latency.record(mode or GUARDRAIL_MODE, stage, seconds)
+
+
+def count_event(name: str, mode: Optional[str] = None) -> None:
+    """Bump a chat counter ('turns', 'off_topic', 'pilot_cancelled') for the active mode."""
+    _latency.count(mode or GUARDRAIL_MODE, name)
+
+
+def get_chat_latency_stats() -> Dict:
+    return {**_latency.stats(), "intent": get_intent_stats()}
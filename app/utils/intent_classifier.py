@@ -0,0 +1,216 @@
+"""
+Local intent classifier (fast path in front of guardrail_agent)
+
+Most chat queries are obviously financial ("can I afford", "balance", "which
+card for groceries") or obviously not ("tell me a joke"). Sending each one to
+Gemini just to confirm that costs a full round trip. This stage scores the
+query's words, bigrams and trigrams against two weighted vocabularies:
+
+- seed terms below, and
+- financial n-grams learned from past user messages in chat_logs (only
+  FINANCIAL turns are logged, so the logs are a labelled corpus).
+
+    confidence = |financial - off_topic| / (financial + off_topic + 1 + unknown)
+
+where `unknown` counts the content words neither vocabulary covers, so one
+financial word cannot vouch for the rest of the query ("ignore previous
+instructions ... then tell me my balance" is escalated). At or above
+INTENT_CONFIDENCE the verdict is returned locally. Mixed, unknown or
+context-dependent queries ("what about the other one?") score low and are
+escalated to the LLM classifier. The vocabulary is rebuilt from
+chat_logs every INTENT_MODEL_MAX_AGE seconds.
+"""
+from collections import Counter
+from sqlite3 import Connection
+from typing import Dict, Iterable, List, Optional, Tuple
+import math
+import os
+import re
+import threading
+import time
+
+INTENT_CONFIDENCE = float(os.getenv("INTENT_CONFIDENCE", "0.75"))
+INTENT_MODEL_MAX_AGE = float(os.getenv("INTENT_MODEL_MAX_AGE", "3600"))
+
+# Learned n-grams need this many occurrences; their weight stays below the seeds'
+MIN_TERM_COUNT = 3
+MAX_LEARNED_WEIGHT = 2.0
+MAX_LOG_MESSAGES = 5000
+
+# Weight of each content word no vocabulary term covers
+UNKNOWN_WORD_WEIGHT = 1.0
+
+FINANCIAL, OFF_TOPIC = "FINANCIAL", "OFF-TOPIC"
+
+FINANCIAL_TERMS: Dict[str, float] = {
+    **dict.fromkeys([
+        "afford", "budget", "budgets", "balance", "balances", "cashback", "credit", "debit", "savings", "save",
+        "saving", "loan", "loans", "debt", "debts", "expense", "expenses", "spend", "spending", "spent", "salary",
+        "income", "wallet", "wallets", "gcash", "maya", "bdo", "bpi", "installment", "installments", "bnpl", "bill",
+        "bills", "payment", "payments", "pay", "invest", "investment", "interest", "cash", "money", "peso", "pesos",
+        "php", "finance", "finances", "financial", "purchase", "buy", "groceries", "grocery", "emergency fund",
+        "net worth", "credit card", "credit limit", "due date", "can i afford", "how much", "transaction",
+        "transactions", "goal", "goals", "rent", "utilities", "subscription", "subscriptions", "fee", "fees",
+    ], 3.0),
+    **dict.fromkeys([
+        "card", "cards", "cost", "costs", "price", "cheap", "expensive", "month", "monthly", "limit", "track",
+        "category", "categories", "shopping", "food", "dining", "transport", "bank", "account", "worth",
+    ], 1.5),
+}
+
+OFF_TOPIC_TERMS: Dict[str, float] = {
+    **dict.fromkeys([
+        "joke", "jokes", "weather", "poem", "poems", "song", "songs", "lyrics", "movie", "movies", "recipe",
+        "recipes", "python", "javascript", "code", "coding", "program", "football", "basketball", "nba",
+        "celebrity", "horoscope", "riddle", "story", "translate", "essay", "homework", "game", "games", "anime",
+        "write me", "who won", "capital of",
+    ], 3.0),
+}
+
+STOPWORDS = frozenset("""
+a an and are as at be but by can could do does for from have how i if in into is it its me my of on or our
+so that the their them then there these this to up was we what when where which who why will with would you
+your i'm it's what's did about please thanks thank hi hello hey ok okay tell show give list check see know
+""".split())
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+# Money amounts: "₱1,200", "php 500", "15k", "3000 pesos", or any 3+ digit number
+_AMOUNT_RE = re.compile(r"₱|\bphp\b|\b\d[\d,.]*\s*(k|pesos?)\b|\b\d{3,}")
+
+
+def ngrams(text: str, max_n: int = 3) -> List[str]:
+    """Lower-cased words plus bigrams and trigrams of the text."""
+    tokens = _TOKEN_RE.findall(text.lower())
+    grams = list(tokens)
+    for n in range(2, max_n + 1):
+        grams += [" ".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1)]
+    return grams
+
+
+class IntentClassifier:
+    """
+    Weighted n-gram scorer for FINANCIAL / OFF-TOPIC queries.
+
+    Args:
+        financial: Term -> weight for financial evidence
+        off_topic: Term -> weight for off-topic evidence
+        threshold: Minimum confidence for a local verdict
+    """
+
+    def __init__(self, financial: Dict[str, float], off_topic: Dict[str, float], threshold: float = INTENT_CONFIDENCE):
+        self.financial = financial
+        self.off_topic = off_topic
+        self.threshold = threshold
+
+    @classmethod
+    def from_messages(cls, messages: Iterable[str], threshold: float = INTENT_CONFIDENCE) -> "IntentClassifier":
+        """Seed vocabularies plus financial n-grams learned from past user messages."""
+        counts: Counter = Counter()
+        for message in messages:
+            # Count each n-gram once per message
+            counts.update({gram for gram in ngrams(message, max_n=2) if not _is_noise(gram)})
+
+        financial = dict(FINANCIAL_TERMS)
+        for gram, count in counts.items():
+            if count >= MIN_TERM_COUNT and gram not in OFF_TOPIC_TERMS and gram not in financial:
+                financial[gram] = min(MAX_LEARNED_WEIGHT, math.log2(count) / 2)
+        return cls(financial, dict(OFF_TOPIC_TERMS), threshold)
+
+    def score(self, text: str) -> Tuple[float, float]:
+        """(financial, off_topic) evidence for a query."""
+        grams = ngrams(text)
+        financial = sum(self.financial.get(gram, 0.0) for gram in grams)
+        off_topic = sum(self.off_topic.get(gram, 0.0) for gram in grams)
+        if _AMOUNT_RE.search(text.lower()):
+            financial += 1.5
+        return financial, off_topic
+
+    def unknown_words(self, text: str) -> List[str]:
+        """Content words of the query not part of any financial or off-topic term it matched."""
+        covered = {
+            word for gram in ngrams(text)
+            if gram in self.financial or gram in self.off_topic
+            for word in gram.split()
+        }
+        return [
+            word for word in _TOKEN_RE.findall(text.lower())
+            # Amounts ("15k", "1,200") already count as financial evidence
+            if word not in covered and not word[0].isdigit() and not _is_noise(word)
+        ]
+
+    def classify(self, text: str) -> Tuple[Optional[str], float]:
+        """
+        Returns:
+            Tuple of (FINANCIAL / OFF-TOPIC, or None to escalate; confidence)
+        """
+        financial, off_topic = self.score(text)
+        unknown = len(self.unknown_words(text)) * UNKNOWN_WORD_WEIGHT
+        confidence = abs(financial - off_topic) / (financial + off_topic + 1 + unknown)
+        if confidence < self.threshold:
+            return None, round(confidence, 3)
+        return (FINANCIAL if financial > off_topic else OFF_TOPIC), round(confidence, 3)
+
+
+def _is_noise(gram: str) -> bool:
+    words = gram.split()
+    return all(word in STOPWORDS or len(word) < 3 or word.isdigit() for word in words)
+
+
+# ==========================================================
+# PROCESS-WIDE MODEL AND HIT-RATE COUNTERS
+# ==========================================================
+
+_model: Optional[IntentClassifier] = None
+_model_expires_at = 0.0
+_model_lock = threading.Lock()
+_stats = {"local_financial": 0, "local_off_topic": 0, "escalated": 0}
+_stats_lock = threading.Lock()
+
+
+def load_user_messages(db: Connection, limit: int = MAX_LOG_MESSAGES) -> List[str]:
+    """Most recent user messages from chat_logs."""
+    return [row[0] for row in db.execute(
+        "SELECT message FROM chat_logs WHERE sender = 'user' ORDER BY id DESC LIMIT ?", (limit,)
+    ).fetchall()]
+
+
+def get_intent_classifier() -> IntentClassifier:
+    """Shared classifier, rebuilt from chat_logs when older than INTENT_MODEL_MAX_AGE (blocking)."""
+    global _model, _model_expires_at
+    with _model_lock:
+        if _model is None or time.monotonic() >= _model_expires_at:
+            from ..db.connection import get_db_connection
+
+            try:
+                with get_db_connection(readonly=True) as db:
+                    messages = load_user_messages(db)
+            except Exception as e:
+                print(f"Intent classifier: chat_logs unavailable ({e}), using seed terms only")
+                messages = []
+            _model = IntentClassifier.from_messages(messages)
+            _model_expires_at = time.monotonic() + INTENT_MODEL_MAX_AGE
+        return _model
+
+
+def record_intent(label: Optional[str]) -> None:
+    key = {FINANCIAL: "local_financial", OFF_TOPIC: "local_off_topic"}.get(label, "escalated")
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def get_intent_stats() -> Dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    total = sum(stats.values())
+    local = stats["local_financial"] + stats["local_off_topic"]
+    model = _model
+    return {
+        **stats,
+        "total": total,
+        "hit_rate": round(local / total, 3) if total else 0.0,
+        "threshold": INTENT_CONFIDENCE,
+        "vocabulary": {
+            "financial": len(model.financial) if model else 0,
+            "off_topic": len(model.off_topic) if model else 0,
+        },
+    }
@@ -0,0 +1,127 @@
+"""
+Wallet reconciliation engine
+
+Brings the denormalized wallets.balance / wallets.available_credit columns
+in line with the transaction history. Expected values for every wallet come
+from one read of wallet_balance_view (or, with recompute=True, one grouped
+pass over the raw history), and only wallets that actually drifted are
+written, so the audit_wallet_balance_update ledger only records real fixes.
+
+Incremental runs only look at wallets touched since the last recorded run
+(the watermark in reconciliation_runs, see 8_reconciliation_db.sql), which
+keeps frequent scheduled runs cheap on large databases.
+"""
+from sqlite3 import Connection
+from typing import Dict, List, Optional
+
+from .wallet_balances import BALANCE_TOLERANCE, recompute_wallet_totals
+
+
+def _expected_values(wallet_type: str, credit_limit: Optional[float], totals: Dict[str, float]) -> Dict[str, float]:
+    """Ledger balance and available credit from wallet totals (same rules as wallet_balance_view)."""
+    if wallet_type == 'credit':
+        balance = totals['charged_total'] - totals['income_total']
+        return {"balance": balance, "available_credit": (credit_limit or 0.0) - balance}
+    return {"balance": totals['income_total'] - totals['charged_total'], "available_credit": 0.0}
+
+
+def _drifted(current: Optional[float], expected: float, tolerance: float) -> bool:
+    return current is None or abs(current - expected) > tolerance
+
+
+def get_watermark(db: Connection) -> Optional[str]:
+    """Start time of the last applied run (None if reconciliation never ran)."""
+    return db.execute("SELECT MAX(started_at) FROM reconciliation_runs").fetchone()[0]
+
+
+def _touched_wallets(db: Connection, since: str) -> List[int]:
+    # wallet_balances.updated_at moves with every history change (triggers);
+    # wallets.updated_at covers credit limit edits and manual balance changes
+    return [row[0] for row in db.execute("""
+        SELECT wallet_id FROM wallet_balances WHERE updated_at >= ?
+        UNION
+        SELECT id FROM wallets WHERE updated_at >= ?
+    """, (since, since)).fetchall()]
+
+
+def reconcile_wallets(
+    db: Connection,
+    dry_run: bool = False,
+    incremental: bool = False,
+    recompute: bool = False,
+    tolerance: float = BALANCE_TOLERANCE,
+) -> Dict:
+    """
+    Reconcile wallet balances against the transaction history (does not commit).
+
+    Args:
+        db: Read-write database connection
+        dry_run: Report the diff without writing or recording the run
+        incremental: Only check wallets touched since the last recorded run
+        recompute: Derive expected values from a full grouped pass over the
+            history instead of the materialized wallet_balances store
+        tolerance: Largest difference treated as in sync
+
+    Returns:
+        Report with the mode, watermark used, wallets checked, the drifted
+        wallets (current vs expected values) and the number written
+    """
+    # Capture the clock first so changes made during the run are picked up next time
+    started_at = db.execute("SELECT CURRENT_TIMESTAMP").fetchone()[0]
+    since = get_watermark(db) if incremental else None
+
+    wallets = {
+        row['id']: row
+        for row in db.execute("SELECT id, name, type, credit_limit, balance, available_credit FROM wallets").fetchall()
+    }
+    if since is not None:
+        touched = set(_touched_wallets(db, since))
+        wallets = {w_id: row for w_id, row in wallets.items() if w_id in touched}
+
+    if recompute:
+        totals = recompute_wallet_totals(db)
+    else:
+        totals = {
+            row['wallet_id']: dict(row)
+            for row in db.execute(
+                "SELECT wallet_id, spent_total, charged_total, income_total FROM wallet_balance_view"
+            ).fetchall()
+        }
+
+    drifted: List[Dict] = []
+    for w_id, wallet in wallets.items():
+        expected = _expected_values(wallet['type'], wallet['credit_limit'], totals[w_id])
+        if (_drifted(wallet['balance'], expected['balance'], tolerance)
+                or _drifted(wallet['available_credit'], expected['available_credit'], tolerance)):
+            drifted.append({
+                "wallet_id": w_id,
+                "name": wallet['name'],
+                "type": wallet['type'],
+                "balance": wallet['balance'],
+                "expected_balance": expected['balance'],
+                "available_credit": wallet['available_credit'],
+                "expected_available_credit": expected['available_credit'],
+            })
+
+    written = 0
+    if not dry_run:
+        db.executemany("""
+            UPDATE wallets
+            SET balance = ?, available_credit = ?, version = version + 1
+            WHERE id = ?
+        """, [(d['expected_balance'], d['expected_available_credit'], d['wallet_id']) for d in drifted])
+        written = len(drifted)
+        db.execute("""
+            INSERT INTO reconciliation_runs (started_at, mode, checked, drifted, written)
+            VALUES (?, ?, ?, ?, ?)
+        """, (started_at, "incremental" if incremental else "full", len(wallets), len(drifted), written))
+
+    return {
+        "mode": "incremental" if incremental else "full",
+        "source": "history" if recompute else "wallet_balances",
+        "since": since,
+        "dry_run": dry_run,
+        "checked": len(wallets),
+        "drifted": drifted,
+        "written": written,
+    }
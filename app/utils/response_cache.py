@@ -0,0 +1,264 @@
+"""
+Semantic response cache for repeated chat questions
+
+"What's my total balance?" is asked many times a day and every time it costs a
+pilot run, an ask_database round trip and a sql_agent query. Answers are
+cached under the query's words in order, with only articles and courtesy
+words dropped:
+
+    "What's my total balance?"         ->  ("what", "is", "my", "total", "balance")
+    "Please, what is my total balance"  ->  ("what", "is", "my", "total", "balance")
+
+Interrogatives, prepositions and word order are kept, so "transfer from bdo
+to gcash" and "transfer from gcash to bdo" are different entries.
+
+Entries are only valid for the data version they were built from
+(app/db/versioning.py), so any committed write invalidates the whole cache.
+Matching is exact by default. With RESPONSE_CACHE_SIMILARITY below 1.0, a
+query with no exact entry is matched against cached word sets by Jaccard
+similarity; numbers must match exactly so "can I afford 500" never reuses the
+answer for "can I afford 5000". Near matches can drop a filter ("... this
+month on gcash" reusing the unfiltered total), so only lower it knowingly.
+
+Not cached:
+- turns that called a write tool (replaying them would skip the write),
+- context-dependent queries ("what about that one?"), whose answer depends
+  on the conversation rather than the question.
+
+Entries expire after RESPONSE_CACHE_TTL seconds (also bounding staleness from
+writes made by other processes) and the least recently used entry is evicted
+beyond RESPONSE_CACHE_SIZE. Hits, misses and saved tokens are reported under
+/metrics/cache.
+"""
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Dict, FrozenSet, List, Optional, Tuple
+import os
+import re
+import threading
+import time
+
+from ..db.versioning import get_data_version
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "1") not in ("0", "false", "no")
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "600"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "1.0"))
+
+# Tools whose calls can be skipped on a replay
+CACHEABLE_TOOLS = frozenset({"ask_database"})
+
+# Words that make a query depend on earlier turns
+CONTEXT_WORDS = frozenset("""
+it its it's that that's those these them they he she him her other another again same previous above
+earlier instead else ones
+""".split())
+
+STOPWORDS = frozenset("""
+a an the is are was were be been am do does did i me my mine we our you your please can could would will
+should shall of in on at to for from with by about and or so just what what's whats how how's much many
+currently current right now tell show give let know kindly hi hello hey thanks thank
+""".split())
+
+# Words dropped from cache keys: they never change what is being asked
+FILLER_WORDS = frozenset("""
+a an the please kindly just hi hello hey thanks thank
+""".split())
+
+# Contractions and spelling variants folded before tokenizing
+_REPLACEMENTS = [
+    (re.compile(r"\bwhat's\b"), "what is"),
+    (re.compile(r"\bhow's\b"), "how is"),
+    (re.compile(r"\bi'm\b"), "i am"),
+    (re.compile(r"\b(can't|cannot)\b"), "can not"),
+    (re.compile(r"\b(\w+)n't\b"), r"\1 not"),
+    (re.compile(r"₱\s*"), " "),
+    (re.compile(r"\bphp\b"), " "),
+    (re.compile(r"(\d),(\d)"), r"\1\2"),
+]
+_TOKEN_RE = re.compile(r"[a-z]+|\d+(?:\.\d+)?k?")
+_NUMBER_RE = re.compile(r"\d")
+
+
+def query_tokens(query: str, stopwords: FrozenSet[str] = STOPWORDS) -> List[str]:
+    """Query words in order: lower-cased, contractions expanded, stopwords dropped, simple plurals folded."""
+    text = query.lower()
+    for pattern, replacement in _REPLACEMENTS:
+        text = pattern.sub(replacement, text)
+
+    tokens = []
+    for token in _TOKEN_RE.findall(text):
+        if token in stopwords:
+            continue
+        if token.endswith("k") and token[:-1].replace(".", "").isdigit():
+            token = f"{float(token[:-1]) * 1000:g}"
+        elif len(token) > 3 and token.endswith("s") and not token.endswith(("ss", "is", "us")):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def normalize_query(query: str) -> Tuple[str, ...]:
+    """Cache key words of a query in order (query_tokens dropping only FILLER_WORDS)."""
+    return tuple(query_tokens(query, FILLER_WORDS))
+
+
+def is_context_dependent(query: str) -> bool:
+    """True when the query refers back to earlier turns."""
+    return any(word in CONTEXT_WORDS for word in re.findall(r"[a-z']+", query.lower()))
+
+
+def similarity(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    """Jaccard similarity of two token sets; 0 when their numbers differ."""
+    if {t for t in a if _NUMBER_RE.match(t)} != {t for t in b if _NUMBER_RE.match(t)}:
+        return 0.0
+    union = len(a | b)
+    return len(a & b) / union if union else 0.0
+
+
+@dataclass
+class CachedResponse:
+    response: str
+    tool_calls: List[dict]
+    tokens: int
+    created_at: float = field(default_factory=time.monotonic)
+    hits: int = 0
+
+
+class ResponseCache:
+    """
+    LRU + TTL cache of pilot answers keyed on (ordered tokens, new-session flag),
+    valid for a single data version and calendar day.
+
+    Args:
+        max_entries: LRU capacity
+        ttl: Entry lifetime in seconds
+        min_similarity: Jaccard threshold for near-duplicate queries (1.0 = exact only)
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SIZE, ttl: float = RESPONSE_CACHE_TTL,
+                 min_similarity: float = RESPONSE_CACHE_SIMILARITY):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.min_similarity = min_similarity
+        self._entries: "OrderedDict[Tuple[Tuple[str, ...], bool], CachedResponse]" = OrderedDict()
+        self._version: Optional[Tuple[int, str]] = None
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0, "similar_hits": 0, "misses": 0, "stores": 0, "skipped": 0,
+            "evictions": 0, "expirations": 0, "invalidations": 0, "saved_tokens": 0,
+        }
+
+    def _sync_version(self) -> None:
+        # Caller holds the lock; drop everything built from older data or on an earlier day
+        version = (get_data_version(), date.today().isoformat())
+        if version != self._version:
+            if self._entries:
+                self._stats["invalidations"] += 1
+            self._entries.clear()
+            self._version = version
+
+    def _live(self, key, entry: CachedResponse, now: float) -> bool:
+        if now - entry.created_at < self.ttl:
+            return True
+        del self._entries[key]
+        self._stats["expirations"] += 1
+        return False
+
+    def get(self, query: str, is_new_session: bool = False) -> Optional[CachedResponse]:
+        """Cached answer for the query, or None (also None for context-dependent queries)."""
+        tokens = normalize_query(query)
+        if not tokens or is_context_dependent(query):
+            with self._lock:
+                self._stats["skipped"] += 1
+            return None
+
+        now = time.monotonic()
+        with self._lock:
+            self._sync_version()
+            key = (tokens, is_new_session)
+            entry = self._entries.get(key)
+            if entry is not None and self._live(key, entry, now):
+                return self._hit(key, entry, "hits")
+
+            best_key, best_score = None, self.min_similarity
+            if self.min_similarity < 1.0:
+                words = frozenset(tokens)
+                for candidate in list(self._entries):
+                    if candidate[1] != is_new_session:
+                        continue
+                    score = similarity(words, frozenset(candidate[0]))
+                    if score >= best_score and self._live(candidate, self._entries[candidate], now):
+                        best_key, best_score = candidate, score
+            if best_key is not None:
+                return self._hit(best_key, self._entries[best_key], "similar_hits")
+
+            self._stats["misses"] += 1
+            return None
+
+    def _hit(self, key, entry: CachedResponse, counter: str) -> CachedResponse:
+        self._entries.move_to_end(key)
+        entry.hits += 1
+        self._stats[counter] += 1
+        self._stats["saved_tokens"] += entry.tokens
+        return entry
+
+    def put(self, query: str, response: str, tool_calls: List[dict], tokens: int,
+            is_new_session: bool = False, data_version: Optional[int] = None) -> bool:
+        """
+        Cache a pilot answer.
+
+        Args:
+            data_version: Data version read before the run started; the
+                answer is dropped if a write landed while it was being built
+
+        Returns:
+            True if the answer was stored
+        """
+        query_tokens = normalize_query(query)
+        cacheable = (
+            query_tokens
+            and not is_context_dependent(query)
+            and all(call.get("tool") in CACHEABLE_TOOLS for call in tool_calls)
+        )
+        with self._lock:
+            self._sync_version()
+            if not cacheable or (data_version is not None and data_version != self._version[0]):
+                self._stats["skipped"] += 1
+                return False
+
+            key = (query_tokens, is_new_session)
+            self._entries[key] = CachedResponse(response, tool_calls, tokens)
+            self._entries.move_to_end(key)
+            self._stats["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+            return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            entries = len(self._entries)
+        lookups = stats["hits"] + stats["similar_hits"] + stats["misses"]
+        return {
+            **stats,
+            "enabled": RESPONSE_CACHE_ENABLED,
+            "entries": entries,
+            "hit_rate": round((stats["hits"] + stats["similar_hits"]) / lookups, 3) if lookups else 0.0,
+            "max_entries": self.max_entries,
+            "ttl_s": self.ttl,
+            "min_similarity": self.min_similarity,
+        }
+
+
+response_cache = ResponseCache()
+
+
+def get_response_cache_stats() -> Dict:
+    return response_cache.stats()
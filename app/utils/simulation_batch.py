@@ -0,0 +1,305 @@
+"""
+Batch what-if simulation (/api/simulate/batch)
+
+Comparing options (every card x straight / 3 / 6 / 12 / 24 months x purchase
+date; installments on credit cards only) used to mean one POST /api/simulate
+per option. The batch evaluates the whole grid against one snapshot of the
+data: wallets, cashback cap room and month figures are loaded once. The per-scenario math runs on NumPy arrays
+of shape (scenarios,) or (scenarios, months). It is the same math as
+simulation_engine.simulate_purchase, and each scenario gets the score the
+single simulation would give it.
+
+Scenarios are ranked by score, then cashback, then shorter terms and earlier
+dates, and can be saved to budget_simulations in one transaction.
+"""
+from dataclasses import dataclass
+from datetime import date
+from sqlite3 import Connection
+from typing import Dict, List, Optional
+import time
+
+import numpy as np
+
+from ..core.exceptions import ValidationError
+from .app_state import SERVER_DATE
+from .cashback_ledger import statement_cycle
+from .simulation_engine import (
+    CASHBACK_BONUS_MAX, MAX_TERM, PENALTY_LONG_TERM, PENALTY_NEGATIVE_CASH_FLOW, PENALTY_OVER_BUDGET,
+    PENALTY_UNAFFORDABLE, SCORE_RULES, add_months, format_peso, load_wallets, month_figures, resolve_category,
+)
+from .wallet_benefits import get_cashback_rate
+
+DEFAULT_TERMS = (1, 3, 6, 12, 24)  # 1 = straight
+MAX_SCENARIOS = 1000
+GO_SCORE = 85
+
+
+@dataclass
+class ScenarioGrid:
+    """
+    The axes of a batch. Scenarios are every (wallet, term, date) combination,
+    except installment terms on wallets that are not credit cards.
+    """
+    amount: float
+    category_id: int
+    category: str
+    wallets: List[Dict]
+    terms: List[int]
+    dates: List[str]
+
+    def wallet_terms(self, wallet: Dict) -> List[int]:
+        return self.terms if wallet["type"] == "credit" else [t for t in self.terms if t == 1]
+
+    @property
+    def size(self) -> int:
+        return sum(len(self.wallet_terms(w)) for w in self.wallets) * len(self.dates)
+
+
+def build_grid(
+    db: Connection,
+    amount: float,
+    category: str,
+    card_ids: Optional[List[int]] = None,
+    terms: Optional[List[int]] = None,
+    purchase_dates: Optional[List[str]] = None,
+    as_of: str = SERVER_DATE,
+) -> ScenarioGrid:
+    """
+    Validate the axes of a batch (blocking, read-only).
+
+    Raises:
+        ValidationError: Bad amount, term, date, card or category, installment
+            terms for a wallet that is not a credit card, or too many scenarios
+    """
+    if amount is None or amount <= 0:
+        raise ValidationError("amount must be positive", field="amount", value=amount)
+    # Empty axes mean the default, like an omitted one
+    card_ids = card_ids or None
+    installments_requested = any(t > 1 for t in terms or [])
+    terms = sorted(set(terms or DEFAULT_TERMS))
+    if terms[0] < 1 or terms[-1] > MAX_TERM:
+        raise ValidationError(f"terms must be between 1 and {MAX_TERM}", field="terms", value=terms)
+    dates = sorted(set(purchase_dates or [as_of]))
+    for value in dates:
+        try:
+            date.fromisoformat(value)
+        except ValueError:
+            raise ValidationError(f"Invalid purchase date '{value}', expected YYYY-MM-DD", field="purchase_dates", value=value)
+    category_id, category_code = resolve_category(db, category)
+    wallets = list(load_wallets(db, card_ids).values())
+    if card_ids is not None and installments_requested:
+        # Both asked for explicitly; by default these wallets only get the straight scenario
+        non_credit = [w["name"] for w in wallets if w["type"] != "credit"]
+        if non_credit:
+            raise ValidationError(
+                f"Installment plans are only available on credit cards (not {', '.join(non_credit)})",
+                field="terms", value=terms
+            )
+    grid = ScenarioGrid(amount, category_id, category_code, wallets, terms, dates)
+    if grid.size > MAX_SCENARIOS:
+        raise ValidationError(f"At most {MAX_SCENARIOS} scenarios per batch ({grid.size} requested)", field="card_ids", value=grid.size)
+    return grid
+
+
+def _cap_room(db: Connection, wallets: List[Dict], statements: np.ndarray) -> np.ndarray:
+    """Cashback left under the cap for each (wallet, date, month) statement; inf = uncapped."""
+    months = sorted(set(statements.ravel().tolist()))
+    history = {
+        (row[0], row[1]): (row[2] or 0.0, row[3])
+        for row in db.execute(f"""
+            SELECT wallet_id, month_year, amount_earned, monthly_limit
+            FROM wallet_cashback_history
+            WHERE month_year IN ({','.join('?' for _ in months)})
+        """, months).fetchall()
+    }
+    room = np.full(statements.shape, np.inf)
+    for w, wallet in enumerate(wallets):
+        limit = wallet["monthly_cashback_limit"]
+        if limit is None:
+            continue
+        for index, statement in np.ndenumerate(statements[w]):
+            earned, bucket_limit = history.get((wallet["wallet_id"], statement), (0.0, limit))
+            room[(w, *index)] = max((bucket_limit if bucket_limit is not None else limit) - earned, 0.0)
+    return room
+
+
+def _penalty(factor: str, values: np.ndarray) -> np.ndarray:
+    # NaN (not applicable) compares False everywhere: no penalty
+    rules = SCORE_RULES[factor]
+    return np.select([values > threshold for threshold, _ in rules], [points for _, points in rules], 0)
+
+
+def evaluate_grid(db: Connection, grid: ScenarioGrid) -> List[Dict]:
+    """
+    Evaluate and rank every scenario of a grid (blocking, read-only).
+
+    Returns:
+        One dict per scenario, best first, with its rank
+    """
+    amount = grid.amount
+    W, T, D, K = len(grid.wallets), len(grid.terms), len(grid.dates), max(grid.terms)
+
+    # Per-wallet, per-date and per-term inputs (the only Python loops are over these axes)
+    is_credit = np.array([w["type"] == "credit" for w in grid.wallets])
+    limit = np.array([w["credit_limit"] or 0.0 for w in grid.wallets], dtype=float)
+    available = np.array([w["available_credit"] if w["available_credit"] is not None else np.nan for w in grid.wallets], dtype=float)
+    ledger = np.array([w["ledger_balance"] or 0.0 for w in grid.wallets], dtype=float)
+    rate = np.array([get_cashback_rate(db, w["wallet_id"], grid.category_id) if w["type"] == "credit" else 0.0
+                     for w in grid.wallets], dtype=float)
+    months = [month_figures(db, grid.category_id, d) for d in grid.dates]
+    income = np.array([m["income"] for m in months], dtype=float)
+    spend = np.array([m["spend"] for m in months], dtype=float)
+    budget_left = np.array([m["budget"] - m["budget_spent"] if m["budget"] is not None else np.nan for m in months], dtype=float)
+    billing = [[add_months(d, k) for k in range(K)] for d in grid.dates]
+    statements = np.array([[[statement_cycle(b, w["cycle_day"]) for b in row] for row in billing] for w in grid.wallets])
+    room = _cap_room(db, grid.wallets, statements)  # (W, D, K)
+
+    # Flatten the grid: scenario n = (wallet wi[n], term ti[n], date di[n])
+    wi, ti, di = (axis.ravel() for axis in np.meshgrid(np.arange(W), np.arange(T), np.arange(D), indexing="ij"))
+    term = np.array(grid.terms)[ti]
+    # Installments are for credit cards only (ScenarioGrid.wallet_terms)
+    keep = is_credit[wi] | (term == 1)
+    wi, ti, di, term = wi[keep], ti[keep], di[keep], term[keep]
+    credit = is_credit[wi]
+
+    # Installment schedule (N, K): equal monthly charges, the last one absorbs rounding
+    monthly = np.round(amount / term, 2)
+    k = np.arange(K)
+    charges = np.where(k < term[:, None] - 1, monthly[:, None], 0.0)
+    charges = np.where(k == term[:, None] - 1, np.round(amount - monthly * (term - 1), 2)[:, None], charges)
+
+    # Cashback under each statement's cap; charges that share a statement share its room
+    earned = charges * rate[wi][:, None] / 100.0
+    stmt = statements[wi, di]
+    group_start = np.concatenate([np.ones((len(wi), 1), dtype=bool), stmt[:, 1:] != stmt[:, :-1]], axis=1)
+    start_index = np.maximum.accumulate(np.where(group_start, k, 0), axis=1)
+    earned_before = np.cumsum(earned, axis=1) - earned
+    earned_before_in_group = earned_before - np.take_along_axis(earned_before, start_index, axis=1)
+    credited = np.clip(room[wi, di] - earned_before_in_group, 0.0, earned)
+    cashback = credited.sum(axis=1)
+    lost_to_cap = earned.sum(axis=1) - cashback
+
+    # Credit headroom, cash and monthly cash flow
+    available_after = np.where(credit, available[wi] - amount, np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        utilization_after = np.where(credit & (limit[wi] > 0), np.round((limit[wi] - available_after) / limit[wi], 4), np.nan)
+        income_share = np.where(income[di] > 0, np.round(monthly / income[di], 4), np.nan)
+    cash_flow_after = income[di] - spend[di] - monthly
+    budget_remaining_after = np.round(budget_left[di] - charges[:, 0], 2)
+    fits = np.where(credit, available_after >= 0, ledger[wi] >= amount)
+    is_affordable = fits & (cash_flow_after >= 0)
+
+    # Wais score (same rules as simulate_purchase)
+    bonus = np.where(cashback > 0, np.minimum(CASHBACK_BONUS_MAX, np.round(cashback / amount * 100)), 0)
+    score = (
+        100
+        - np.where(fits, 0, PENALTY_UNAFFORDABLE)
+        - _penalty("utilization_after", utilization_after)
+        - _penalty("income_share", income_share)
+        - np.where(cash_flow_after < 0, PENALTY_NEGATIVE_CASH_FLOW, 0)
+        - np.where(budget_remaining_after < 0, PENALTY_OVER_BUDGET, 0)
+        - np.where(term > 12, PENALTY_LONG_TERM, 0)
+        + bonus
+    )
+    score = np.clip(score, 0, 100).astype(int)
+
+    # Best first: score, cashback, shorter term, earlier date
+    order = np.lexsort((di, term, -np.round(cashback, 2), -score))
+
+    def value(array: np.ndarray, n: int) -> Optional[float]:
+        return None if np.isnan(array[n]) else round(float(array[n]), 4)
+
+    scenarios = []
+    for rank, n in enumerate(order.tolist(), start=1):
+        wallet = grid.wallets[wi[n]]
+        scenarios.append({
+            "rank": rank,
+            "wallet_id": wallet["wallet_id"],
+            "wallet_name": wallet["name"],
+            "wallet_type": wallet["type"],
+            "payment_type": "straight" if term[n] == 1 else "installment",
+            "term": int(term[n]),
+            "purchase_date": grid.dates[di[n]],
+            "first_statement": str(stmt[n, 0]),
+            "monthly_impact": float(monthly[n]),
+            "available_credit_after": value(available_after, n),
+            "utilization_after": value(utilization_after, n),
+            "cash_balance": None if credit[n] else float(ledger[wi[n]]),
+            "cash_flow_after": round(float(cash_flow_after[n]), 2),
+            "income_share": value(income_share, n),
+            "cashback_earned": round(float(cashback[n]), 2),
+            "cashback_lost_to_cap": round(float(lost_to_cap[n]), 2),
+            "budget_remaining_after": value(budget_remaining_after, n),
+            "is_affordable": bool(is_affordable[n]),
+            "score": int(score[n]),
+        })
+    return scenarios
+
+
+def verdict(scenario: Dict) -> str:
+    """budget_simulations.recommendation for a scenario: Go, No-Go or Wait."""
+    if not scenario["is_affordable"]:
+        return "No-Go"
+    return "Go" if scenario["score"] >= GO_SCORE else "Wait"
+
+
+def save_scenarios(db: Connection, grid: ScenarioGrid, scenarios: List[Dict], as_of: str = SERVER_DATE) -> int:
+    """
+    Insert scenarios into budget_simulations (blocking; the caller commits).
+
+    impact_on_balance is the projected balance after the purchase's first
+    charge: amount owed on credit cards, cash left on other wallets.
+    """
+    wallets = {w["wallet_id"]: w for w in grid.wallets}
+    rows = []
+    for s in scenarios:
+        wallet = wallets[s["wallet_id"]]
+        if s["wallet_type"] == "credit":
+            impact = (wallet["ledger_balance"] or 0.0) + grid.amount
+        else:
+            impact = (wallet["ledger_balance"] or 0.0) - (grid.amount if s["term"] == 1 else s["monthly_impact"])
+        plan = "Straight" if s["term"] == 1 else f"{s['term']} x {format_peso(s['monthly_impact'])}"
+        reasoning = (
+            f"{plan} on {s['wallet_name']} from {s['purchase_date']}: score {s['score']} "
+            f"(rank {s['rank']} of {len(scenarios)}), cashback {format_peso(s['cashback_earned'])}"
+        )
+        if s["utilization_after"] is not None:
+            reasoning += f", utilization {s['utilization_after']:.0%}"
+        reasoning += f", cash flow after {format_peso(s['cash_flow_after'])}."
+        rows.append((
+            s["wallet_id"], grid.category_id, grid.amount, s["payment_type"],
+            "need_now" if s["purchase_date"] <= as_of else "can_wait",
+            verdict(s), reasoning, round(impact, 2), s["score"] / 100.0,
+        ))
+    db.executemany("""
+        INSERT INTO budget_simulations (
+            wallet_id, category_id, simulated_amount, payment_type, urgency,
+            recommendation, pilot_reasoning, impact_on_balance, confidence_score
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+    return len(rows)
+
+
+def simulate_batch(db: Connection, grid: ScenarioGrid, save: bool = True) -> Dict:
+    """
+    Evaluate a grid and optionally save it, in one transaction (blocking).
+    """
+    started = time.perf_counter()
+    scenarios = evaluate_grid(db, grid)
+    evaluated_ms = (time.perf_counter() - started) * 1000
+    saved = 0
+    if save and scenarios:
+        try:
+            saved = save_scenarios(db, grid, scenarios)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+    return {
+        "amount": grid.amount,
+        "category": grid.category,
+        "count": len(scenarios),
+        "saved": saved,
+        "evaluate_ms": round(evaluated_ms, 2),
+        "scenarios": scenarios,
+    }
@@ -0,0 +1,369 @@
+"""
+Deterministic purchase simulation (/api/simulate)
+
+simulation_agent used to fetch balances with ask_database and then do the
+arithmetic in the model to produce monthly_impact, is_affordable and the
+score. The engine computes every number from the database in a few
+milliseconds. The LLM, if used at all, only phrases the recommendation
+around those figures.
+
+- Schedule: straight = one charge; installment (credit cards only) = `term`
+  equal monthly charges (the last one absorbs rounding) starting on the
+  purchase date. Each charge is assigned to its statement cycle
+  (cashback_ledger.statement_cycle).
+- Utilization: the full amount is reserved against the credit limit up front,
+  as card issuers do for installment plans.
+- Cash flow: average monthly income over the last INCOME_MONTHS months
+  against this month's billed spend plus the new monthly charge.
+- Cashback: the card's rate for the category (wallet_benefits), credited per
+  charge up to what is left under the monthly cap of each cycle.
+- Wais score: 100 minus the penalties in SCORE_RULES, plus up to
+  CASHBACK_BONUS_MAX points for cashback. Each rule that fired is listed in
+  `factors`, so the score can always be explained.
+"""
+from calendar import monthrange
+from dataclasses import asdict, dataclass, field
+from sqlite3 import Connection
+from typing import Dict, List, Optional, Tuple
+
+from ..core.exceptions import ValidationError
+from .app_state import SERVER_DATE
+from .cashback_ledger import _shift_month, statement_cycle
+from .sql_templates import month_range
+from .transactions import PAYMENT_TYPES
+from .wallet_benefits import get_cashback_rate
+
+INCOME_MONTHS = 3
+MAX_TERM = 60
+CASHBACK_BONUS_MAX = 5
+
+# (factor, threshold, penalty): the largest matching threshold per factor applies
+SCORE_RULES: Dict[str, List[Tuple[float, int]]] = {
+    "utilization_after": [(0.9, 30), (0.7, 20), (0.5, 10), (0.3, 5)],
+    "income_share": [(0.5, 25), (0.3, 15), (0.15, 8), (0.05, 3)],
+}
+PENALTY_UNAFFORDABLE = 50
+PENALTY_NEGATIVE_CASH_FLOW = 25
+PENALTY_OVER_BUDGET = 10
+PENALTY_LONG_TERM = 5  # installment plans longer than a year
+
+
+@dataclass
+class ScheduledCharge:
+    number: int
+    billing_date: str
+    statement: str
+    amount: float
+    cashback: float
+
+
+@dataclass
+class SimulationFigures:
+    """Everything the engine computed for one purchase."""
+    amount: float
+    wallet_id: int
+    wallet_name: str
+    wallet_type: str
+    category_id: int
+    category: str
+    payment_type: str
+    term: int
+    monthly_impact: float
+    schedule: List[ScheduledCharge]
+    credit_limit: Optional[float]
+    available_credit_before: Optional[float]
+    available_credit_after: Optional[float]
+    utilization_before: Optional[float]
+    utilization_after: Optional[float]
+    cash_balance: Optional[float]
+    monthly_income: float
+    monthly_spend: float
+    cash_flow_after: float
+    income_share: Optional[float]
+    cashback_rate: float
+    cashback_earned: float
+    cashback_lost_to_cap: float
+    budget: Optional[float]
+    budget_remaining_after: Optional[float]
+    is_affordable: bool
+    score: int
+    factors: List[Dict] = field(default_factory=list)
+    as_of: str = SERVER_DATE
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+def add_months(date: str, months: int) -> str:
+    month = _shift_month(date[:7], months)
+    # Clamp the day to the target month (Jan 31 + 1 month -> Feb 28)
+    year, mon = int(month[:4]), int(month[5:7])
+    return f"{month}-{min(int(date[8:10]), monthrange(year, mon)[1]):02d}"
+
+
+def resolve_category(db: Connection, category: str) -> Tuple[int, str]:
+    """Category id and code for an id, code or label ("Groceries & Mart")."""
+    value = str(category).strip().lower()
+    for row in db.execute("SELECT id, code, label FROM categories").fetchall():
+        if value in (str(row[0]), (row[1] or "").lower(), (row[2] or "").lower()):
+            return row[0], row[1]
+    raise ValidationError(f"Unknown category '{category}'", field="category", value=category)
+
+
+def load_wallets(db: Connection, wallet_ids: Optional[List[int]] = None) -> Dict[int, Dict]:
+    """Balances, limits, cycle day and cashback cap per wallet (all wallets by default)."""
+    query = """
+        SELECT v.wallet_id, v.name, v.type, v.credit_limit, v.ledger_balance, v.available_credit,
+            w.cycle_day, w.monthly_cashback_limit
+        FROM wallet_balance_view v
+        JOIN wallets w ON w.id = v.wallet_id
+    """
+    params: List = []
+    if wallet_ids is not None:
+        query += f" WHERE v.wallet_id IN ({','.join('?' for _ in wallet_ids)})"
+        params = list(wallet_ids)
+    wallets = {row["wallet_id"]: dict(row) for row in db.execute(query + " ORDER BY v.wallet_id", params).fetchall()}
+    for wallet_id in wallet_ids or []:
+        if wallet_id not in wallets:
+            raise ValidationError(f"Unknown card {wallet_id}", field="card_id", value=wallet_id)
+    return wallets
+
+
+def _monthly_income(db: Connection, as_of: str) -> float:
+    start = f"{_shift_month(as_of[:7], -(INCOME_MONTHS - 1))}-01"
+    row = db.execute("""
+        SELECT COALESCE(SUM(amount), 0.0), COUNT(DISTINCT substr(date, 1, 7))
+        FROM income_transactions
+        WHERE date >= ? AND date <= ?
+    """, (start, as_of)).fetchone()
+    total, months = row[0], row[1]
+    return total / months if months else 0.0
+
+
+def month_figures(db: Connection, category_id: int, as_of: str) -> Dict:
+    """Income, billed spend and the category budget for the month of as_of."""
+    month = month_range(as_of[:7])
+    spend = db.execute(
+        "SELECT COALESCE(SUM(line_amount), 0.0) FROM transaction_details WHERE billing_date >= ? AND billing_date < ?",
+        (month["start"], month["end"])
+    ).fetchone()[0]
+    budget_row = db.execute("""
+        SELECT mb.amount, (
+            SELECT COALESCE(SUM(td.line_amount), 0.0) FROM transaction_details td
+            WHERE td.category_id = mb.category_id AND td.billing_date >= ? AND td.billing_date < ?
+        )
+        FROM monthly_budgets mb
+        WHERE mb.category_id = ? AND mb.month_year = ?
+    """, (month["start"], month["end"], category_id, month["month"])).fetchone()
+    return {
+        "income": _monthly_income(db, as_of),
+        "spend": spend,
+        "budget": budget_row[0] if budget_row else None,
+        "budget_spent": budget_row[1] if budget_row else None,
+    }
+
+
+def _cap_room(db: Connection, wallet_id: int, statements: List[str], monthly_limit: Optional[float]) -> Dict[str, Optional[float]]:
+    """Cashback left under the cap for each statement cycle (None = uncapped)."""
+    room: Dict[str, Optional[float]] = {statement: monthly_limit for statement in statements}
+    if monthly_limit is None:
+        return room
+    placeholders = ",".join("?" for _ in statements)
+    for month_year, earned, limit in db.execute(f"""
+        SELECT month_year, amount_earned, monthly_limit
+        FROM wallet_cashback_history
+        WHERE wallet_id = ? AND month_year IN ({placeholders})
+    """, [wallet_id, *statements]).fetchall():
+        room[month_year] = max((limit if limit is not None else monthly_limit) - (earned or 0.0), 0.0)
+    return room
+
+
+def _penalty(factor: str, value: Optional[float]) -> int:
+    if value is None:
+        return 0
+    for threshold, points in SCORE_RULES[factor]:
+        if value > threshold:
+            return points
+    return 0
+
+
+def simulate_purchase(
+    db: Connection,
+    amount: float,
+    category: str,
+    card_id: int,
+    payment_type: str = "straight",
+    term: int = 1,
+    as_of: str = SERVER_DATE,
+) -> SimulationFigures:
+    """
+    Compute the numbers of a purchase simulation (blocking, read-only).
+
+    Raises:
+        ValidationError: Bad amount, payment type, term, card or category, or
+            an installment plan on a wallet that is not a credit card
+    """
+    if amount is None or amount <= 0:
+        raise ValidationError("amount must be positive", field="amount", value=amount)
+    if payment_type not in PAYMENT_TYPES:
+        raise ValidationError(f"payment_type must be one of {PAYMENT_TYPES}", field="payment_type", value=payment_type)
+    term = 1 if payment_type == "straight" else int(term or 1)
+    if not 1 <= term <= MAX_TERM:
+        raise ValidationError(f"term must be between 1 and {MAX_TERM}", field="term", value=term)
+
+    wallet = load_wallets(db, [card_id])[card_id]
+    category_id, category_code = resolve_category(db, category)
+    is_credit = wallet["type"] == "credit"
+    if payment_type == "installment" and not is_credit:
+        raise ValidationError(
+            f"Installment plans are only available on credit cards ({wallet['name']} is {wallet['type']})",
+            field="payment_type", value=payment_type
+        )
+
+    # Schedule and cashback under each cycle's cap
+    monthly = round(amount / term, 2)
+    dates = [add_months(as_of, n) for n in range(term)]
+    statements = [statement_cycle(date, wallet["cycle_day"]) for date in dates]
+    rate = get_cashback_rate(db, card_id, category_id) if is_credit else 0.0
+    room = _cap_room(db, card_id, sorted(set(statements)), wallet["monthly_cashback_limit"]) if rate else {}
+    schedule = []
+    earned_total = credited_total = 0.0
+    for number, (date, statement) in enumerate(zip(dates, statements), start=1):
+        charge = monthly if number < term else round(amount - monthly * (term - 1), 2)
+        earned = charge * rate / 100.0
+        credited = earned if room.get(statement) is None else min(earned, room[statement])
+        if room.get(statement) is not None:
+            room[statement] -= credited
+        earned_total += earned
+        credited_total += credited
+        schedule.append(ScheduledCharge(number, date, statement, charge, round(credited, 2)))
+
+    # Credit headroom and cash on hand
+    limit = wallet["credit_limit"] if is_credit else None
+    available_before = wallet["available_credit"] if is_credit else None
+    available_after = available_before - amount if is_credit else None
+    utilization_before = utilization_after = None
+    if is_credit and limit:
+        utilization_before = round((limit - available_before) / limit, 4)
+        utilization_after = round((limit - available_after) / limit, 4)
+    cash_balance = None if is_credit else wallet["ledger_balance"]
+
+    # Monthly cash flow
+    month = month_figures(db, category_id, as_of)
+    monthly_income, monthly_spend, budget = month["income"], month["spend"], month["budget"]
+    cash_flow_after = monthly_income - monthly_spend - monthly
+    income_share = round(monthly / monthly_income, 4) if monthly_income else None
+    budget_remaining_after = round(budget - month["budget_spent"] - schedule[0].amount, 2) if budget is not None else None
+
+    # Affordability and score
+    if is_credit:
+        fits = available_after >= 0
+    else:
+        fits = cash_balance >= amount
+    is_affordable = fits and cash_flow_after >= 0
+
+    factors = []
+    if not fits:
+        factors.append({"factor": "exceeds_available_funds", "points": -PENALTY_UNAFFORDABLE})
+    for name, value in (("utilization_after", utilization_after), ("income_share", income_share)):
+        points = _penalty(name, value)
+        if points:
+            factors.append({"factor": name, "value": value, "points": -points})
+    if cash_flow_after < 0:
+        factors.append({"factor": "negative_cash_flow", "value": round(cash_flow_after, 2), "points": -PENALTY_NEGATIVE_CASH_FLOW})
+    if budget_remaining_after is not None and budget_remaining_after < 0:
+        factors.append({"factor": "over_budget", "value": budget_remaining_after, "points": -PENALTY_OVER_BUDGET})
+    if term > 12:
+        factors.append({"factor": "long_installment", "value": term, "points": -PENALTY_LONG_TERM})
+    if credited_total:
+        bonus = min(CASHBACK_BONUS_MAX, round(credited_total / amount * 100))
+        if bonus:
+            factors.append({"factor": "cashback", "value": round(credited_total, 2), "points": bonus})
+    score = max(0, min(100, 100 + sum(f["points"] for f in factors)))
+
+    return SimulationFigures(
+        amount=amount,
+        wallet_id=card_id,
+        wallet_name=wallet["name"],
+        wallet_type=wallet["type"],
+        category_id=category_id,
+        category=category_code,
+        payment_type=payment_type,
+        term=term,
+        monthly_impact=monthly,
+        schedule=schedule,
+        credit_limit=limit,
+        available_credit_before=available_before,
+        available_credit_after=round(available_after, 2) if available_after is not None else None,
+        utilization_before=utilization_before,
+        utilization_after=utilization_after,
+        cash_balance=cash_balance,
+        monthly_income=round(monthly_income, 2),
+        monthly_spend=round(monthly_spend, 2),
+        cash_flow_after=round(cash_flow_after, 2),
+        income_share=income_share,
+        cashback_rate=rate,
+        cashback_earned=round(credited_total, 2),
+        cashback_lost_to_cap=round(earned_total - credited_total, 2),
+        budget=budget,
+        budget_remaining_after=budget_remaining_after,
+        is_affordable=is_affordable,
+        score=score,
+        factors=factors,
+        as_of=as_of,
+    )
+
+
+def format_peso(amount: Optional[float]) -> str:
+    return f"₱{amount or 0.0:,.2f}"
+
+
+def describe_figures(figures: SimulationFigures) -> Tuple[str, str, List[str]]:
+    """
+    Rule-based (recommendation, best_strategy, pro_tips) for mode=fast.
+    """
+    f = figures
+    parts = []
+    if f.wallet_type == "credit":
+        if f.available_credit_after is not None and f.available_credit_after < 0:
+            parts.append(f"This exceeds {f.wallet_name}'s available credit by {format_peso(-f.available_credit_after)}.")
+        elif f.utilization_after is not None:
+            parts.append(f"It takes {f.wallet_name} from {f.utilization_before:.0%} to {f.utilization_after:.0%} "
+                         f"utilization, leaving {format_peso(f.available_credit_after)} available.")
+    else:
+        parts.append(f"{f.wallet_name} holds {format_peso(f.cash_balance)} against a {format_peso(f.amount)} charge.")
+    if f.term > 1:
+        parts.append(f"{f.term} monthly charges of {format_peso(f.monthly_impact)}.")
+    if f.income_share is not None:
+        parts.append(f"That is {f.income_share:.0%} of your {format_peso(f.monthly_income)} monthly income; "
+                     f"cash flow after this month's spend would be {format_peso(f.cash_flow_after)}.")
+    if f.budget_remaining_after is not None and f.budget_remaining_after < 0:
+        parts.append(f"It puts the {f.category} budget {format_peso(-f.budget_remaining_after)} over this month.")
+    elif f.budget_remaining_after is not None:
+        parts.append(f"The {f.category} budget would have {format_peso(f.budget_remaining_after)} left this month.")
+    recommendation = " ".join(parts)
+
+    if not f.is_affordable and f.cash_flow_after < 0 and f.term == 1 and f.monthly_income:
+        months = int(-(-f.amount // max(f.monthly_income - f.monthly_spend, 1.0))) if f.monthly_income > f.monthly_spend else None
+        best_strategy = (f"Wait and save: set aside {format_peso(f.amount / months)} a month for {months} months."
+                         if months else "Wait: this month's spend already uses all of your income.")
+    elif not f.is_affordable:
+        best_strategy = "Hold off or use a card with more available credit; this purchase does not fit your current limits."
+    elif f.utilization_after is not None and f.utilization_after > 0.3 and f.term == 1:
+        best_strategy = "Consider splitting it into installments or paying down the card first to keep utilization under 30%."
+    elif f.wallet_type == "credit":
+        best_strategy = f"Go ahead with {f.payment_type} payment on {f.wallet_name} and pay the statement in full."
+    else:
+        best_strategy = f"Go ahead and pay from {f.wallet_name}; it stays covered by your cash on hand."
+
+    pro_tips = []
+    if f.cashback_rate:
+        tip = f"{f.wallet_name} earns {f.cashback_rate:g}% on {f.category}: {format_peso(f.cashback_earned)} cashback."
+        if f.cashback_lost_to_cap:
+            tip += f" {format_peso(f.cashback_lost_to_cap)} is lost to the monthly cap; a card with cap room earns it."
+        pro_tips.append(tip)
+    if f.schedule and f.wallet_type == "credit":
+        pro_tips.append(f"The first charge lands on the {f.schedule[0].statement} statement.")
+    if f.term > 12:
+        pro_tips.append("Installments past 12 months tie up your limit for a long time; check for add-on fees.")
+    return recommendation, best_strategy, pro_tips
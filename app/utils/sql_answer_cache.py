@@ -0,0 +1,183 @@
+"""
+Memoized ask_database answers
+
+strategic_pilot's ask_database hands every question to a full sql_agent run:
+a model call to write the SQL, the query itself and a model call to phrase
+the result. Within one turn the pilot often asks the
+same thing twice ("What are my wallet balances?" / "what are my wallet balances"), and across
+turns the same questions come back all day.
+
+Answers are memoized under the question lower-cased with punctuation and
+whitespace collapsed, and nothing else: no words are dropped, because "how
+many transactions" is not "what transactions" and "how much did I spend" is
+not "how much can I spend". Order is kept too ("wallet 1 over 500" is not
+"wallet 500 over 1"). Entries hold for one data version and calendar day,
+so any committed write invalidates them. Identical questions
+that arrive while the first is still running wait for its answer instead of
+starting a second sql_agent run.
+
+Bounded LRU (SQL_CACHE_SIZE) with a TTL (SQL_CACHE_TTL) that also bounds
+staleness from writes made by other processes. Hits and saved tokens are
+reported under /metrics/cache.
+"""
+from collections import OrderedDict
+from datetime import date
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+import asyncio
+import os
+import re
+import threading
+import time
+
+from ..db.versioning import get_data_version
+
+SQL_CACHE_ENABLED = os.getenv("SQL_CACHE_ENABLED", "1") not in ("0", "false", "no")
+SQL_CACHE_TTL = float(os.getenv("SQL_CACHE_TTL", "300"))
+SQL_CACHE_SIZE = int(os.getenv("SQL_CACHE_SIZE", "512"))
+
+# Words and numbers (1,250.50 stays one token); everything else is a separator
+_WORD_RE = re.compile(r"\d+(?:[.,]\d+)*|\w+")
+
+# run() returns (answer, tokens used)
+AnswerRun = Callable[[], Awaitable[Tuple[str, int]]]
+
+
+class SqlAnswerCache:
+    """
+    LRU + TTL memo of sql_agent answers with in-flight de-duplication.
+
+    Args:
+        max_entries: LRU capacity
+        ttl: Entry lifetime in seconds
+    """
+
+    def __init__(self, max_entries: int = SQL_CACHE_SIZE, ttl: float = SQL_CACHE_TTL):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        # key -> (answer, tokens, created_at)
+        self._entries: "OrderedDict[str, Tuple[str, int, float]]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, Tuple[int, str]], asyncio.Future] = {}
+        self._version: Optional[Tuple[int, str]] = None
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0, "coalesced": 0, "misses": 0, "stores": 0, "evictions": 0,
+            "expirations": 0, "invalidations": 0, "errors": 0, "saved_tokens": 0,
+        }
+
+    @staticmethod
+    def key(question: str) -> str:
+        return " ".join(_WORD_RE.findall(question.lower())) or question.strip().lower()
+
+    def _sync_version(self) -> Tuple[int, str]:
+        # Caller holds the lock; drop everything built from older data or on an earlier day
+        version = (get_data_version(), date.today().isoformat())
+        if version != self._version:
+            if self._entries:
+                self._stats["invalidations"] += 1
+            self._entries.clear()
+            self._version = version
+        return version
+
+    def _lookup(self, key: str) -> Optional[str]:
+        # Caller holds the lock
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        answer, tokens, created_at = entry
+        if time.monotonic() - created_at >= self.ttl:
+            del self._entries[key]
+            self._stats["expirations"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self._stats["hits"] += 1
+        self._stats["saved_tokens"] += tokens
+        return answer
+
+    async def get_or_run(self, question: str, run: AnswerRun) -> str:
+        """Memoized answer for the question, calling run() on a miss."""
+        key = self.key(question)
+        with self._lock:
+            version = self._sync_version()
+            answer = self._lookup(key)
+            if answer is not None:
+                return answer
+            pending = self._inflight.get((key, version))
+            if pending is None:
+                self._stats["misses"] += 1
+                pending = asyncio.get_running_loop().create_future()
+                self._inflight[(key, version)] = pending
+                owner = True
+            else:
+                self._stats["coalesced"] += 1
+                owner = False
+
+        if not owner:
+            try:
+                answer, tokens = await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                # The first caller's turn was cancelled, not ours: run it ourselves
+                if pending.cancelled() and not asyncio.current_task().cancelling():
+                    return await self.get_or_run(question, run)
+                raise
+            with self._lock:
+                self._stats["saved_tokens"] += tokens
+            return answer
+
+        try:
+            answer, tokens = await run()
+        except BaseException as e:
+            with self._lock:
+                self._stats["errors"] += 1
+                self._inflight.pop((key, version), None)
+            if isinstance(e, Exception):
+                pending.set_exception(e)
+                pending.exception()  # waiters re-raise it; don't log it as unretrieved
+            else:
+                pending.cancel()
+            raise
+
+        with self._lock:
+            self._inflight.pop((key, version), None)
+            # Only keep answers for data that did not change while they were built
+            if self._sync_version() == version:
+                self._entries[key] = (answer, tokens, time.monotonic())
+                self._entries.move_to_end(key)
+                self._stats["stores"] += 1
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self._stats["evictions"] += 1
+        pending.set_result((answer, tokens))
+        return answer
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            entries = len(self._entries)
+        lookups = stats["hits"] + stats["coalesced"] + stats["misses"]
+        return {
+            **stats,
+            "enabled": SQL_CACHE_ENABLED,
+            "entries": entries,
+            "hit_rate": round((stats["hits"] + stats["coalesced"]) / lookups, 3) if lookups else 0.0,
+            "max_entries": self.max_entries,
+            "ttl_s": self.ttl,
+        }
+
+
+sql_answer_cache = SqlAnswerCache()
+
+
+async def memoized_answer(question: str, run: AnswerRun) -> str:
+    """sql_answer_cache.get_or_run, or a plain run() when SQL_CACHE_ENABLED is off."""
+    if not SQL_CACHE_ENABLED:
+        answer, _ = await run()
+        return answer
+    return await sql_answer_cache.get_or_run(question, run)
+
+
+def get_sql_cache_stats() -> Dict:
+    return sql_answer_cache.stats()
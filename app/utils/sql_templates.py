@@ -0,0 +1,271 @@
+"""
+Deterministic SQL templates for common ask_database questions
+
+Most ask_database traffic is a handful of shapes: balances per wallet,
+available credit, spend by category this month, budget remaining and
+cashback this cycle. Each used to cost a sql_agent round trip (model writes
+the SQL, runs it, then phrases the rows) before the same query ran.
+
+A question is answered locally when its words (query_tokens, so stopwords
+and plurals are folded) contain one of a template's trigger words and every
+other word is part of that template's vocabulary, the shared vocabulary
+below or a category name. Anything else ("balance of my BDO card last
+month", "spend at Jollibee", "spend today", "spend per wallet") is novel and
+goes to sql_agent as before. Every template covers this month or cycle, so
+no other time words are accepted, and only templates that return a row per
+wallet accept wallet words.
+Templates are tried in order, most specific first (a "budget left for
+groceries" question is about budgets, not spend).
+
+Month and cycle parameters come from the server date (app_state.SERVER_DATE);
+spend is counted by billing_date, like the budgets on the dashboard.
+Per-template hit counters are reported under /metrics/cache.
+"""
+from dataclasses import dataclass, field
+from sqlite3 import Connection
+from typing import Callable, Dict, FrozenSet, List, Optional, Set
+import json
+import threading
+
+from .app_state import SERVER_DATE
+from .cashback_ledger import get_cycle_cashback
+from .response_cache import query_tokens
+
+# Words any template accepts (after query_tokens normalization)
+COMMON_WORDS = frozenset("""
+all each every per by list breakdown summary overview total amount month
+monthly mtd this status check see category categorie peso left
+remaining available have has had there their far got
+""".split())
+
+# Accepted only by templates that return one row per wallet
+WALLET_WORDS = frozenset({"wallet", "card", "account", "bank"})
+
+
+@dataclass
+class SqlTemplate:
+    """
+    A pre-planned query for one question shape.
+
+    Args:
+        name: Counter / log label
+        title: Heading of the answer returned to the pilot
+        triggers: At least one of these words must appear
+        vocabulary: Other words the question may contain
+        fetch: (db, params) -> rows
+        category_filter: Category names narrow the rows instead of being ignored
+        examples: Questions this template answers (used by the query audit)
+    """
+    name: str
+    title: str
+    triggers: FrozenSet[str]
+    vocabulary: FrozenSet[str]
+    fetch: Callable[[Connection, Dict], List[Dict]]
+    category_filter: bool = False
+    examples: List[str] = field(default_factory=list)
+
+    def matches(self, tokens: List[str], category_words: Set[str]) -> bool:
+        if not self.triggers.intersection(tokens):
+            return False
+        allowed = self.triggers | self.vocabulary | COMMON_WORDS
+        if self.category_filter:
+            allowed = allowed | category_words
+        return all(token in allowed for token in tokens)
+
+
+def month_range(month: str) -> Dict:
+    year, mon = int(month[:4]), int(month[5:7])
+    next_month = f"{year + 1}-01" if mon == 12 else f"{year}-{mon + 1:02d}"
+    return {"month": month, "start": f"{month}-01", "end": f"{next_month}-01"}
+
+
+def fetch_wallet_balances(db: Connection, params: Dict) -> List[Dict]:
+    return [dict(row) for row in db.execute("""
+        SELECT wallet_id, name, type, balance, ledger_balance, available_credit
+        FROM wallet_balance_view
+        ORDER BY wallet_id
+    """).fetchall()]
+
+
+def fetch_available_credit(db: Connection, params: Dict) -> List[Dict]:
+    return [dict(row) for row in db.execute("""
+        SELECT wallet_id, name, credit_limit, ledger_balance AS outstanding, available_credit
+        FROM wallet_balance_view
+        WHERE type = 'credit'
+        ORDER BY available_credit DESC
+    """).fetchall()]
+
+
+def fetch_category_spend(db: Connection, params: Dict) -> List[Dict]:
+    # CROSS JOIN keeps categories outer so each one is a range search on
+    # idx_transaction_details_category_billing instead of a table scan
+    return [dict(row) for row in db.execute("""
+        SELECT c.code AS category, c.label, ROUND(SUM(td.line_amount), 2) AS spent, COUNT(*) AS line_items
+        FROM categories c
+        CROSS JOIN transaction_details td ON td.category_id = c.id
+        WHERE td.billing_date >= :start AND td.billing_date < :end
+          AND (:category_id IS NULL OR c.id = :category_id)
+        GROUP BY c.id
+        ORDER BY spent DESC
+    """, params).fetchall()]
+
+
+def fetch_budget_remaining(db: Connection, params: Dict) -> List[Dict]:
+    return [dict(row) for row in db.execute("""
+        SELECT category, label, budget, ROUND(spent, 2) AS spent, ROUND(budget - spent, 2) AS remaining
+        FROM (
+            SELECT c.code AS category, c.label, mb.amount AS budget, (
+                SELECT COALESCE(SUM(td.line_amount), 0.0)
+                FROM transaction_details td
+                WHERE td.category_id = mb.category_id
+                  AND td.billing_date >= :start AND td.billing_date < :end
+            ) AS spent
+            FROM monthly_budgets mb
+            JOIN categories c ON c.id = mb.category_id
+            WHERE mb.month_year = :month
+              AND (:category_id IS NULL OR mb.category_id = :category_id)
+        )
+        ORDER BY remaining ASC
+    """, params).fetchall()]
+
+
+def fetch_cycle_cashback(db: Connection, params: Dict) -> List[Dict]:
+    names = {row[0]: row[1] for row in db.execute("SELECT id, name FROM wallets").fetchall()}
+    rows = []
+    for bucket in get_cycle_cashback(db, params["as_of"]):
+        limit = bucket.get("monthly_limit") or 0.0
+        rows.append({
+            "wallet_id": bucket["wallet_id"],
+            "name": names.get(bucket["wallet_id"]),
+            "cycle": bucket["month_year"],
+            "earned": bucket["amount_earned"],
+            "monthly_limit": limit,
+            "cap_remaining": round(max(limit - bucket["amount_earned"], 0.0), 2),
+        })
+    return rows
+
+
+# Most specific first
+TEMPLATES: List[SqlTemplate] = [
+    SqlTemplate(
+        name="cashback_cycle",
+        title="Cashback earned this statement cycle per wallet",
+        triggers=frozenset({"cashback", "rebate", "reward"}),
+        vocabulary=frozenset({"earned", "earn", "cycle", "statement", "cap", "limit"}) | WALLET_WORDS,
+        fetch=fetch_cycle_cashback,
+        examples=["How much cashback have I earned this cycle?"],
+    ),
+    SqlTemplate(
+        name="budget_remaining",
+        title="Budget vs spend this month per category",
+        triggers=frozenset({"budget"}),
+        vocabulary=frozenset({"spent", "spend", "spending", "used", "remain", "over", "under", "versus", "vs", "against"}),
+        fetch=fetch_budget_remaining,
+        category_filter=True,
+        examples=["How much budget is left this month?", "budget remaining for groceries"],
+    ),
+    SqlTemplate(
+        name="available_credit",
+        title="Available credit per credit card",
+        triggers=frozenset({"credit", "limit"}),
+        vocabulary=frozenset({"outstanding", "utilization", "usage", "room", "headroom", "unused", "debt", "owe", "balance"}) | WALLET_WORDS,
+        fetch=fetch_available_credit,
+        examples=["What is my available credit?", "credit limit left on each card"],
+    ),
+    SqlTemplate(
+        name="category_spend",
+        title="Spend this month per category",
+        triggers=frozenset({"spend", "spent", "spending", "expense", "expenditure"}),
+        vocabulary=frozenset({"where", "money", "went", "top", "biggest"}),
+        fetch=fetch_category_spend,
+        category_filter=True,
+        examples=["How much did I spend this month by category?", "dining spend this month"],
+    ),
+    SqlTemplate(
+        name="wallet_balances",
+        title="Balance per wallet",
+        triggers=frozenset({"balance"}),
+        vocabulary=frozenset({"cash", "money", "fund", "hand", "net", "worth", "ewallet", "debit", "saving"}) | WALLET_WORDS,
+        fetch=fetch_wallet_balances,
+        examples=["What's my total balance?", "balances of all my wallets"],
+    ),
+]
+
+_stats_lock = threading.Lock()
+_stats: Dict[str, int] = {**{t.name: 0 for t in TEMPLATES}, "fallback": 0, "errors": 0}
+
+
+def _load_categories(db: Connection) -> Dict[str, int]:
+    """Category words (code and label words, plural-folded) -> category id."""
+    words: Dict[str, int] = {}
+    for row in db.execute("SELECT id, code, label FROM categories").fetchall():
+        for token in query_tokens(f"{row[1]} {row[2]}"):
+            words.setdefault(token, row[0])
+            # "groceries" folds to "grocerie"; also accept "grocery"
+            if token.endswith("ie"):
+                words.setdefault(token[:-2] + "y", row[0])
+    return words
+
+
+def match_template(db: Connection, question: str) -> Optional[tuple]:
+    """(template, params) for a question, or None for novel questions."""
+    tokens = query_tokens(question)
+    if not tokens:
+        return None
+    categories = _load_categories(db)
+    category_words = set(categories)
+    for template in TEMPLATES:
+        if template.matches(tokens, category_words):
+            mentioned = {categories[t] for t in tokens if t in categories} if template.category_filter else set()
+            params = {
+                **month_range(SERVER_DATE[:7]),
+                "as_of": SERVER_DATE,
+                # Several categories: return them all
+                "category_id": mentioned.pop() if len(mentioned) == 1 else None,
+            }
+            return template, params
+    return None
+
+
+def answer_from_template(db: Connection, question: str) -> Optional[str]:
+    """
+    Answer a data question from a template (blocking).
+
+    Returns:
+        The answer text for the pilot, or None to fall back to sql_agent
+    """
+    try:
+        matched = match_template(db, question)
+        if matched is None:
+            _count("fallback")
+            return None
+        template, params = matched
+        rows = template.fetch(db, params)
+    except Exception as e:
+        # Never fail the question because of a template: let sql_agent try
+        print(f"SQL template failed for '{question}': {e}")
+        _count("errors")
+        return None
+
+    _count(template.name)
+    heading = f"{template.title} (as of {params['as_of']}, month {params['month']})"
+    return f"{heading}:\n{json.dumps(rows, default=str) if rows else 'No data found.'}"
+
+
+def _count(key: str) -> None:
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def get_sql_template_stats() -> Dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    answered = sum(stats[t.name] for t in TEMPLATES)
+    total = answered + stats["fallback"]
+    return {
+        "templates": {t.name: stats[t.name] for t in TEMPLATES},
+        "answered": answered,
+        "fallback": stats["fallback"],
+        "errors": stats["errors"],
+        "hit_rate": round(answered / total, 3) if total else 0.0,
+    }
@@ -0,0 +1,118 @@
+"""
+Incremental dashboard sync for GET /api/state/changes
+
+Returns only the rows changed since a cursor, driven by each table's
+updated_at column and the sync_tombstones table (see 4_sync_db.sql).
+The cursor and every change query are read in one read transaction, so a
+response is a consistent snapshot. The cursor is the database clock
+(CURRENT_TIMESTAMP) minus SYNC_CURSOR_MARGIN seconds: updated_at is stamped
+when a row is written, not when it commits, so a row written just before
+the clock was read but committed after the snapshot (e.g. by a batched
+statement import) is still picked up by the next call. Rows are matched with
+'>=', so changes inside the margin are re-sent rather than missed; clients
+apply changes as idempotent upserts.
+"""
+from sqlite3 import Connection
+from typing import Dict, List, Optional
+import os
+import re
+
+from .wallet_balances import get_wallet_balances
+
+# Tables exposed through the change feed
+SYNC_TABLES = [
+    "transaction_headers",
+    "transaction_details",
+    "wallets",
+    "savings_goals",
+    "strategic_recommendations",
+    "monthly_budgets",
+]
+
+# Longest write transaction the feed tolerates without missing its rows
+SYNC_CURSOR_MARGIN = int(os.getenv("SYNC_CURSOR_MARGIN", "30"))
+
+_CURSOR_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}$")
+
+
+def is_valid_cursor(cursor: str) -> bool:
+    """Cursors are SQLite timestamps: 'YYYY-MM-DD HH:MM:SS' (UTC)."""
+    return bool(_CURSOR_PATTERN.match(cursor))
+
+
+def _changed_wallet_balances(db: Connection, wallet_ids: List[int]) -> Dict[int, float]:
+    """Dashboard balances (same rules as /api/state) for the given wallets."""
+    return {
+        wallet_id: row['balance']
+        for wallet_id, row in get_wallet_balances(db, wallet_ids).items()
+    }
+
+
+def get_state_changes(db: Connection, since: Optional[str] = None) -> Dict:
+    """
+    Collect rows changed (and deleted) since a cursor.
+
+    Args:
+        db: Database connection
+        since: Cursor from a previous call; None returns every row
+
+    Returns:
+        Dictionary with the new cursor, changed rows per table, deleted ids
+        per table, and recomputed balances for wallets touched by the changes
+    """
+    # One snapshot for the cursor and every query below
+    own_transaction = not db.in_transaction
+    if own_transaction:
+        db.execute("BEGIN")
+    try:
+        return _read_changes(db, since)
+    finally:
+        if own_transaction:
+            db.commit()
+
+
+def _read_changes(db: Connection, since: Optional[str]) -> Dict:
+    cursor = db.execute(
+        "SELECT datetime(CURRENT_TIMESTAMP, ?)", (f"-{SYNC_CURSOR_MARGIN} seconds",)
+    ).fetchone()[0]
+
+    changes: Dict[str, List[Dict]] = {}
+    for table in SYNC_TABLES:
+        if since is None:
+            rows = db.execute(f"SELECT * FROM {table}").fetchall()
+        else:
+            rows = db.execute(f"SELECT * FROM {table} WHERE updated_at >= ?", (since,)).fetchall()
+        changes[table] = [dict(row) for row in rows]
+
+    deleted: Dict[str, List[int]] = {table: [] for table in SYNC_TABLES}
+    if since is not None:
+        for row in db.execute(
+            "SELECT table_name, row_id FROM sync_tombstones WHERE deleted_at >= ? ORDER BY id",
+            (since,)
+        ).fetchall():
+            if row['table_name'] in deleted:
+                deleted[row['table_name']].append(row['row_id'])
+
+    # Balances are derived, so resend them for every wallet a change touches
+    if since is None or deleted["transaction_headers"] or deleted["transaction_details"]:
+        # Deleted rows no longer say which wallet they belonged to
+        touched_wallets = {row[0] for row in db.execute("SELECT id FROM wallets").fetchall()}
+    else:
+        touched_wallets = {row['wallet_id'] for row in changes["transaction_headers"]}
+        touched_wallets.update(row['id'] for row in changes["wallets"])
+        touched_wallets.update(row[0] for row in db.execute("""
+            SELECT DISTINCT th.wallet_id
+            FROM transaction_details td
+            JOIN transaction_headers th ON th.id = td.header_id
+            WHERE td.updated_at >= ?
+            UNION
+            SELECT DISTINCT wallet_id FROM income_transactions WHERE updated_at >= ?
+        """, (since, since)).fetchall())
+
+    return {
+        "since": since,
+        "cursor": cursor,
+        "changes": changes,
+        "deleted": deleted,
+        "balances": _changed_wallet_balances(db, sorted(touched_wallets)),
+    }
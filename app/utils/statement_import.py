@@ -0,0 +1,440 @@
+"""
+Streaming bank-statement importer (CSV and OFX/QFX)
+
+Statements are parsed line by line and written in fixed-size batches, so
+memory stays bounded by the batch size regardless of file length. Each
+batch is mapped to categories and wallets, deduplicated against the
+existing transaction_headers and inserted with insert_transactions_bulk
+in its own transaction (re-running an interrupted import is safe).
+
+Sign convention: imported amounts are positive for money spent. Payments,
+refunds and deposits (credits) are counted and skipped.
+
+Usage (from the project root):
+    python -m app.utils.statement_import statement.csv --wallet 1
+    python -m app.utils.statement_import export.qfx --wallet 2 --dry-run
+"""
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime
+from sqlite3 import Connection
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import argparse
+import csv
+import re
+import sys
+import time
+
+from .transactions import insert_transactions_bulk
+
+BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+
+DATE_FORMATS = ["%Y-%m-%d", "%m/%d/%Y", "%m/%d/%y", "%Y/%m/%d", "%d-%b-%Y", "%d %b %Y", "%b %d, %Y", "%Y%m%d"]
+
+# Header aliases for CSV exports (compared lowercased, stripped)
+CSV_COLUMNS = {
+    "date": ["date", "transaction date", "trans date", "posting date", "posted date", "value date"],
+    "merchant": ["description", "merchant", "payee", "name", "details", "narrative", "particulars"],
+    "amount": ["amount", "transaction amount"],
+    "debit": ["debit", "withdrawal", "withdrawals", "debit amount", "charges"],
+    "credit": ["credit", "deposit", "deposits", "credit amount", "payments"],
+    "reference": ["reference", "reference no", "ref", "memo", "check number"],
+    "account": ["account", "wallet", "card", "account name"],
+}
+
+# Merchant keywords per category code, used when the merchant has no history
+CATEGORY_KEYWORDS = {
+    "groceries": ["supermarket", "grocery", "puregold", "robinsons supermarket", "waltermart", "s&r", "mart"],
+    "dining": ["restaurant", "jollibee", "mcdo", "mcdonald", "starbucks", "cafe", "coffee", "grabfood",
+               "foodpanda", "pizza", "kitchen", "bakery"],
+    "transport": ["grab car", "grab", "uber", "angkas", "joyride", "shell", "petron", "caltex", "toll",
+                  "autosweep", "easytrip", "lrt", "mrt", "parking"],
+    "subscriptions": ["netflix", "spotify", "youtube", "disney", "apple.com", "google storage", "hbo", "viu"],
+    "utilities": ["meralco", "maynilad", "manila water", "pldt", "globe", "smart", "converge", "sky cable"],
+    "shopping": ["shopee", "lazada", "zalora", "uniqlo", "sm store", "mall", "store"],
+}
+
+
+@dataclass
+class StatementLine:
+    line_no: int
+    transaction_date: str
+    merchant: str
+    amount: float  # positive = money spent
+    reference: Optional[str] = None
+    account: Optional[str] = None
+
+
+class StatementParseError(ValueError):
+    def __init__(self, line_no: int, message: str):
+        super().__init__(message)
+        self.line_no = line_no
+
+
+def parse_date(value: str, date_format: Optional[str] = None) -> str:
+    value = value.strip()
+    # OFX dates: YYYYMMDD[HHMMSS[.XXX]][TZ]
+    if re.match(r"^\d{8}", value) and not date_format:
+        return datetime.strptime(value[:8], "%Y%m%d").date().isoformat()
+    for fmt in [date_format] if date_format else DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date().isoformat()
+        except ValueError:
+            continue
+    raise ValueError(f"unrecognized date '{value}'")
+
+
+def detect_date_format(value: str) -> Optional[str]:
+    for fmt in DATE_FORMATS:
+        try:
+            datetime.strptime(value.strip(), fmt)
+            return fmt
+        except ValueError:
+            continue
+    return None
+
+
+def parse_amount(value: str) -> float:
+    value = value.strip()
+    negative = value.startswith("(") and value.endswith(")")
+    cleaned = re.sub(r"[^\d.\-]", "", value)
+    if cleaned in ("", "-", ".", "-."):
+        raise ValueError(f"unrecognized amount '{value}'")
+    amount = float(cleaned)
+    return -abs(amount) if negative else amount
+
+
+def _find_column(fieldnames: List[str], key: str) -> Optional[str]:
+    normalized = {name.strip().lower(): name for name in fieldnames if name}
+    for alias in CSV_COLUMNS[key]:
+        if alias in normalized:
+            return normalized[alias]
+    return None
+
+
+def iter_csv_lines(lines: Iterable[str], debit_sign: str = "negative",
+                   date_format: Optional[str] = None) -> Iterator:
+    """
+    Yield StatementLine (or StatementParseError) for each CSV data row.
+
+    Args:
+        lines: Text lines of the file
+        debit_sign: Sign of money spent in a single 'amount' column
+            ('negative' for most bank exports, 'positive' for card exports)
+        date_format: strptime format when the dates are ambiguous
+    """
+    reader = csv.DictReader(lines)
+    fields = reader.fieldnames or []
+    columns = {key: _find_column(fields, key) for key in CSV_COLUMNS}
+    if not columns["date"] or not columns["merchant"] or not (columns["amount"] or columns["debit"]):
+        raise ValueError(f"CSV needs date, description and amount (or debit) columns; got {fields}")
+
+    # A statement uses one date format throughout; detect it once instead of per row
+    detected = date_format
+    for row in reader:
+        line_no = reader.line_num
+        try:
+            raw_date = row[columns["date"]] or ""
+            if detected is None:
+                detected = detect_date_format(raw_date)
+            try:
+                transaction_date = parse_date(raw_date, detected)
+            except ValueError:
+                if date_format:
+                    raise
+                detected = detect_date_format(raw_date)
+                transaction_date = parse_date(raw_date, detected)
+            if columns["amount"] and (row.get(columns["amount"]) or "").strip():
+                amount = parse_amount(row[columns["amount"]])
+                if debit_sign == "negative":
+                    amount = -amount
+            else:
+                debit = (row.get(columns["debit"]) or "").strip() if columns["debit"] else ""
+                credit = (row.get(columns["credit"]) or "").strip() if columns["credit"] else ""
+                amount = abs(parse_amount(debit)) if debit else -abs(parse_amount(credit or "0"))
+            yield StatementLine(
+                line_no=line_no,
+                transaction_date=transaction_date,
+                merchant=(row[columns["merchant"]] or "").strip(),
+                amount=amount,
+                reference=(row.get(columns["reference"]) or "").strip() or None if columns["reference"] else None,
+                account=(row.get(columns["account"]) or "").strip() or None if columns["account"] else None,
+            )
+        except (ValueError, TypeError) as e:
+            yield StatementParseError(line_no, str(e))
+
+
+_OFX_TOKEN = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<]*)")
+
+
+def iter_ofx_lines(lines: Iterable[str]) -> Iterator:
+    """
+    Yield StatementLine (or StatementParseError) for each <STMTTRN> block.
+    Handles SGML (unclosed leaf tags) and XML OFX, any line layout.
+    """
+    current: Optional[Dict[str, str]] = None
+    start_line = 0
+    pending = ""
+    for line_no, line in enumerate(lines, 1):
+        # A tag may be split across lines; keep the unfinished tail
+        text = pending + line
+        cut = text.rfind("<")
+        if cut != -1 and ">" not in text[cut:]:
+            text, pending = text[:cut], text[cut:]
+        else:
+            pending = ""
+        for closing, tag, value in _OFX_TOKEN.findall(text):
+            tag = tag.upper()
+            if tag == "STMTTRN":
+                if not closing:
+                    current, start_line = {}, line_no
+                    continue
+                if current is not None:
+                    yield _ofx_line(start_line, current)
+                current = None
+            elif current is not None and not closing and value.strip():
+                current[tag] = value.strip()
+
+
+def _ofx_line(line_no: int, fields: Dict[str, str]):
+    try:
+        return StatementLine(
+            line_no=line_no,
+            transaction_date=parse_date(fields.get("DTPOSTED") or fields.get("DTUSER") or ""),
+            merchant=fields.get("NAME") or fields.get("PAYEE") or fields.get("MEMO") or "",
+            # OFX amounts are signed from the account's view: debits are negative
+            amount=-parse_amount(fields.get("TRNAMT") or ""),
+            reference=fields.get("FITID") or fields.get("CHECKNUM"),
+        )
+    except ValueError as e:
+        return StatementParseError(line_no, str(e))
+
+
+def detect_format(first_line: str) -> str:
+    head = first_line.lstrip("﻿").strip().upper()
+    return "ofx" if head.startswith("OFXHEADER") or head.startswith("<?XML") or head.startswith("<OFX") else "csv"
+
+
+def _normalize_merchant(merchant: str) -> str:
+    return " ".join(merchant.lower().split())
+
+
+class StatementMapper:
+    """Resolves categories, wallets and duplicates for statement lines."""
+
+    def __init__(self, db: Connection, wallet_id: Optional[int], default_category_id: Optional[int] = None):
+        self.db = db
+        self.wallet_id = wallet_id
+        self.wallets_by_name = {
+            _normalize_merchant(row['name']): row['id']
+            for row in db.execute("SELECT id, name FROM wallets").fetchall()
+        }
+        codes = {row['code']: row['id'] for row in db.execute("SELECT id, code FROM categories").fetchall()}
+        self.keywords = [
+            (keyword, codes[code])
+            for code, keywords in CATEGORY_KEYWORDS.items() if code in codes
+            for keyword in keywords
+        ]
+        self.default_category_id = default_category_id or codes.get("shopping") or next(iter(codes.values()), None)
+        # Most frequent category previously used for each merchant, one grouped query
+        self.history: Dict[str, int] = {}
+        best: Dict[str, int] = {}
+        for row in db.execute("""
+            SELECT LOWER(th.merchant) AS merchant, td.category_id, COUNT(*) AS uses
+            FROM transaction_headers th
+            JOIN transaction_details td ON td.header_id = th.id
+            GROUP BY LOWER(th.merchant), td.category_id
+        """).fetchall():
+            merchant = _normalize_merchant(row['merchant'])
+            if row['uses'] > best.get(merchant, 0):
+                best[merchant] = row['uses']
+                self.history[merchant] = row['category_id']
+        # Existing rows are those at or below this id; rows imported by this run are not counted
+        self.max_existing_id = db.execute("SELECT COALESCE(MAX(id), 0) FROM transaction_headers").fetchone()[0]
+        self.seen: Counter = Counter()
+
+    def category_for(self, merchant: str) -> Optional[int]:
+        normalized = _normalize_merchant(merchant)
+        if normalized in self.history:
+            return self.history[normalized]
+        for keyword, category_id in self.keywords:
+            if keyword in normalized:
+                return category_id
+        return self.default_category_id
+
+    def wallet_for(self, line: StatementLine) -> Optional[int]:
+        if line.account:
+            return self.wallets_by_name.get(_normalize_merchant(line.account), self.wallet_id)
+        return self.wallet_id
+
+    def drop_duplicates(self, rows: List[Dict]) -> Tuple[List[Dict], int]:
+        """
+        Remove rows already in transaction_headers, matched on wallet, day,
+        amount and merchant. Identical rows within a statement are kept as
+        long as the file has more of them than the database does.
+        """
+        if not rows:
+            return rows, 0
+        # Probe only the (wallet, day, amount) keys in this batch, via the wallet/date index
+        keys = sorted({(row['wallet_id'], row['transaction_date'], round(row['total_amount'], 2)) for row in rows})
+        values = ",".join("(?, ?, ?)" for _ in keys)
+        params = [value for key in keys for value in key]
+        existing = Counter(
+            (r['wallet_id'], r['day'], r['amount'], _normalize_merchant(r['merchant']))
+            for r in self.db.execute(f"""
+                WITH batch(wallet_id, day, amount) AS (VALUES {values})
+                SELECT th.wallet_id, batch.day, batch.amount, th.merchant
+                FROM batch
+                JOIN transaction_headers th
+                    ON th.wallet_id = batch.wallet_id
+                    AND th.transaction_date >= batch.day
+                    AND th.transaction_date < date(batch.day, '+1 day')
+                    AND ROUND(th.total_amount, 2) = batch.amount
+                WHERE th.id <= ?
+            """, params + [self.max_existing_id]).fetchall()
+        )
+        kept = []
+        for row in rows:
+            key = (row['wallet_id'], row['transaction_date'], round(row['total_amount'], 2),
+                   _normalize_merchant(row['merchant']))
+            self.seen[key] += 1
+            if self.seen[key] > existing[key]:
+                kept.append(row)
+        return kept, len(rows) - len(kept)
+
+
+def import_statement(
+    db: Connection,
+    lines: Iterable[str],
+    wallet_id: Optional[int] = None,
+    fmt: Optional[str] = None,
+    debit_sign: str = "negative",
+    date_format: Optional[str] = None,
+    default_category_id: Optional[int] = None,
+    batch_size: int = BATCH_SIZE,
+    dry_run: bool = False,
+    on_commit: Optional[Callable[[int], None]] = None,
+) -> Dict:
+    """
+    Stream a statement into transaction_headers / transaction_details.
+
+    Args:
+        db: Read-write database connection (each batch is committed)
+        lines: Text lines of the statement (a file object works)
+        wallet_id: Wallet for rows without a matching account column
+        fmt: 'csv' or 'ofx' (detected from the first line if None)
+        debit_sign: Sign of money spent in a CSV 'amount' column
+        date_format: strptime format for ambiguous CSV dates
+        default_category_id: Category for merchants nothing else matches
+        batch_size: Rows per write transaction
+        dry_run: Parse, map and deduplicate without writing
+        on_commit: Called with the number of rows after each committed batch;
+            batches committed before an error stay committed
+
+    Returns:
+        Report with counts (read, imported, duplicates, credits skipped,
+        errors), the first MAX_REPORTED_ERRORS errors and elapsed seconds
+    """
+    started = time.perf_counter()
+    lines = iter(lines)
+    first = next(lines, "")
+    fmt = fmt or detect_format(first)
+
+    def all_lines():
+        yield first.lstrip("﻿")
+        yield from lines
+
+    parsed = iter_ofx_lines(all_lines()) if fmt == "ofx" else iter_csv_lines(all_lines(), debit_sign, date_format)
+
+    mapper = StatementMapper(db, wallet_id, default_category_id)
+    report = {"format": fmt, "read": 0, "imported": 0, "duplicates": 0, "credits_skipped": 0,
+              "failed": 0, "batches": 0, "errors": []}
+
+    def fail(line_no: int, message: str):
+        report["failed"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append({"line": line_no, "error": message})
+
+    def flush(batch: List[Dict]):
+        kept, duplicates = mapper.drop_duplicates(batch)
+        report["duplicates"] += duplicates
+        if kept and not dry_run:
+            result = insert_transactions_bulk(db, kept)
+            db.commit()
+            report["imported"] += len(result["ids"])
+            if on_commit is not None and result["ids"]:
+                on_commit(len(result["ids"]))
+            for err in result["errors"]:
+                fail(kept[err["index"]]["line_no"], err["error"])
+        elif kept:
+            report["imported"] += len(kept)
+        report["batches"] += 1
+
+    batch: List[Dict] = []
+    for item in parsed:
+        report["read"] += 1
+        if isinstance(item, StatementParseError):
+            fail(item.line_no, str(item))
+            continue
+        if item.amount <= 0:
+            report["credits_skipped"] += 1
+            continue
+        target_wallet = mapper.wallet_for(item)
+        if target_wallet is None:
+            fail(item.line_no, "no wallet: pass wallet_id or add an account column matching a wallet name")
+            continue
+        batch.append({
+            "wallet_id": target_wallet,
+            "merchant": item.merchant,
+            "total_amount": round(item.amount, 2),
+            "transaction_date": item.transaction_date,
+            "category_id": mapper.category_for(item.merchant),
+            "payment_type": "straight",
+            "description": f"Imported ({fmt.upper()}{' ref ' + item.reference if item.reference else ''})",
+            "line_no": item.line_no,
+        })
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+    report["seconds"] = round(time.perf_counter() - started, 3)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import a CSV or OFX/QFX bank statement")
+    parser.add_argument("path", help="Statement file")
+    parser.add_argument("--wallet", type=int, help="Wallet ID for the statement's transactions")
+    parser.add_argument("--format", choices=["csv", "ofx"], help="Default: detected from the file")
+    parser.add_argument("--debit-sign", choices=["negative", "positive"], default="negative",
+                        help="Sign of purchases in a single CSV amount column")
+    parser.add_argument("--date-format", help="strptime format for CSV dates, e.g. %%d/%%m/%%Y")
+    parser.add_argument("--category", type=int, help="Fallback category ID")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would be imported")
+    args = parser.parse_args()
+
+    from ..db.connection import get_db_connection
+
+    with open(args.path, "r", encoding="utf-8-sig", newline="") as f, get_db_connection() as conn:
+        try:
+            report = import_statement(
+                conn, f, wallet_id=args.wallet, fmt=args.format, debit_sign=args.debit_sign,
+                date_format=args.date_format, default_category_id=args.category, dry_run=args.dry_run,
+            )
+        except ValueError as e:
+            conn.rollback()
+            print(f"❌ {e}")
+            sys.exit(1)
+
+    print(f"📄 {report['format'].upper()}: {report['read']} rows read in {report['seconds']}s")
+    print(f"✅ Imported {report['imported']}{' (dry run)' if args.dry_run else ''}, "
+          f"{report['duplicates']} duplicates, {report['credits_skipped']} credits skipped, {report['failed']} failed")
+    for err in report["errors"]:
+        print(f"  - line {err['line']}: {err['error']}")
+
+
+if __name__ == "__main__":
+    main()
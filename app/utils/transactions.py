@@ -0,0 +1,232 @@
+"""
+Transaction helpers for GET /api/transactions and POST /api/transactions/bulk
+
+Pages are fetched with keyset (cursor) pagination on (transaction_date, id),
+newest first, so every page costs O(page) regardless of how deep the user
+scrolls. Supporting indexes live in 5_transactions_db.sql.
+
+Bulk ingestion validates every row up front, resolves each wallet/category
+cashback rate once, writes headers and details with executemany in a
+single transaction and runs the detail post-processing once per batch.
+"""
+from datetime import date
+from sqlite3 import Connection
+from typing import Any, Dict, List, Optional, Tuple
+import base64
+import json
+import math
+
+from .detail_effects import apply_detail_effects
+from .wallet_benefits import get_cashback_rate
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+MAX_BULK_ROWS = 5000
+PAYMENT_TYPES = ("straight", "installment")
+
+
+def encode_cursor(transaction_date: str, header_id: int) -> str:
+    """Opaque cursor for the position after (transaction_date, id)."""
+    raw = json.dumps([transaction_date, header_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    """
+    Decode a cursor produced by encode_cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        transaction_date, header_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return str(transaction_date), int(header_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def list_transactions(
+    db: Connection,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    wallet_id: Optional[int] = None,
+    category_id: Optional[int] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    merchant: Optional[str] = None,
+    status: Optional[str] = None,
+) -> Dict:
+    """
+    Fetch one page of transactions, newest first.
+
+    Args:
+        db: Database connection
+        cursor: next_cursor from the previous page (None for the first page)
+        limit: Page size (capped at MAX_PAGE_SIZE)
+        wallet_id: Only transactions on this wallet
+        category_id: Only transactions with a detail line in this category
+        date_from: Inclusive lower bound on transaction_date (YYYY-MM-DD)
+        date_to: Inclusive upper bound on transaction_date (YYYY-MM-DD)
+        merchant: Case-insensitive merchant name prefix
+        status: Header status (e.g. 'posted')
+
+    Returns:
+        Dictionary with 'transactions' (headers with their 'details') and
+        'next_cursor' (None on the last page)
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    conditions: List[str] = []
+    params: List = []
+
+    if cursor:
+        last_date, last_id = decode_cursor(cursor)
+        conditions.append("(th.transaction_date, th.id) < (?, ?)")
+        params.extend([last_date, last_id])
+    if wallet_id is not None:
+        conditions.append("th.wallet_id = ?")
+        params.append(wallet_id)
+    if date_from:
+        conditions.append("th.transaction_date >= ?")
+        params.append(date_from)
+    if date_to:
+        # Dates may carry a time component; include the whole day
+        conditions.append("th.transaction_date < date(?, '+1 day')")
+        params.append(date_to)
+    if merchant:
+        conditions.append("th.merchant LIKE ? ESCAPE '\\'")
+        params.append(_escape_like(merchant) + "%")
+    if status:
+        conditions.append("th.status = ?")
+        params.append(status)
+    if category_id is not None:
+        conditions.append(
+            "EXISTS (SELECT 1 FROM transaction_details td WHERE td.header_id = th.id AND td.category_id = ?)"
+        )
+        params.append(category_id)
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    rows = db.execute(f"""
+        SELECT th.*
+        FROM transaction_headers th
+        {where}
+        ORDER BY th.transaction_date DESC, th.id DESC
+        LIMIT ?
+    """, params + [limit + 1]).fetchall()
+
+    has_more = len(rows) > limit
+    headers = [dict(row) for row in rows[:limit]]
+
+    # One query for the detail lines of the whole page
+    if headers:
+        header_ids = [h['id'] for h in headers]
+        placeholders = ",".join("?" * len(header_ids))
+        details_by_header: Dict[int, List[Dict]] = {}
+        for row in db.execute(f"""
+            SELECT * FROM transaction_details
+            WHERE header_id IN ({placeholders})
+            ORDER BY header_id, id
+        """, header_ids).fetchall():
+            details_by_header.setdefault(row['header_id'], []).append(dict(row))
+        for header in headers:
+            header['details'] = details_by_header.get(header['id'], [])
+
+    next_cursor = None
+    if has_more:
+        last = headers[-1]
+        next_cursor = encode_cursor(last['transaction_date'], last['id'])
+
+    return {"transactions": headers, "next_cursor": next_cursor}
+
+
+def validate_transaction_row(row: Dict[str, Any], wallet_ids: set, category_ids: set) -> Optional[str]:
+    """Return why a bulk row cannot be inserted, or None if it is valid."""
+    if not str(row.get('merchant') or '').strip():
+        return "merchant is required"
+    if not math.isfinite(row['total_amount']):
+        return "total_amount must be a finite number"
+    if row['wallet_id'] not in wallet_ids:
+        return f"wallet {row['wallet_id']} not found"
+    if row['category_id'] not in category_ids:
+        return f"category {row['category_id']} not found"
+    if row.get('payment_type', 'straight') not in PAYMENT_TYPES:
+        return f"payment_type must be one of {', '.join(PAYMENT_TYPES)}"
+    try:
+        date.fromisoformat(str(row['transaction_date'])[:10])
+    except ValueError:
+        return f"invalid transaction_date '{row['transaction_date']}'"
+    return None
+
+
+def insert_transactions_bulk(db: Connection, rows: List[Dict[str, Any]]) -> Dict:
+    """
+    Insert many single-line transactions in one transaction (does not commit).
+
+    Args:
+        db: Read-write database connection
+        rows: Transaction dicts with the TransactionBase fields
+
+    Returns:
+        Dictionary with the inserted header 'ids' (in input order of the
+        valid rows) and per-row 'errors' as {index, error}
+    """
+    wallet_ids = {row[0] for row in db.execute("SELECT id FROM wallets").fetchall()}
+    category_ids = {row[0] for row in db.execute("SELECT id FROM categories").fetchall()}
+
+    valid: List[Tuple[int, Dict[str, Any]]] = []
+    errors: List[Dict] = []
+    for index, row in enumerate(rows):
+        error = validate_transaction_row(row, wallet_ids, category_ids)
+        if error:
+            errors.append({"index": index, "error": error})
+        else:
+            valid.append((index, row))
+
+    if not valid:
+        return {"ids": [], "errors": errors}
+
+    # One rate lookup per wallet/category pair
+    rates: Dict[Tuple[int, int], float] = {}
+    for _, row in valid:
+        key = (row['wallet_id'], row['category_id'])
+        if key not in rates:
+            rates[key] = get_cashback_rate(db, *key)
+
+    # Take the write lock before reserving ids so no other writer can claim them
+    if not db.in_transaction:
+        db.execute("BEGIN IMMEDIATE")
+    next_id = db.execute("""
+        SELECT MAX(
+            COALESCE((SELECT MAX(id) FROM transaction_headers), 0),
+            COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'transaction_headers'), 0)
+        ) + 1
+    """).fetchone()[0]
+    ids = list(range(next_id, next_id + len(valid)))
+
+    db.executemany("""
+        INSERT INTO transaction_headers (id, wallet_id, merchant, total_amount, transaction_date, payment_type, description)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, [
+        (header_id, row['wallet_id'], row['merchant'], row['total_amount'], row['transaction_date'],
+         row.get('payment_type', 'straight'), row.get('description'))
+        for header_id, (_, row) in zip(ids, valid)
+    ])
+    db.executemany("""
+        INSERT INTO transaction_details (header_id, category_id, line_amount, billing_date, cashback_earned)
+        VALUES (?, ?, ?, ?, ?)
+    """, [
+        (header_id, row['category_id'], row['total_amount'], row['transaction_date'],
+         row['total_amount'] * (rates[(row['wallet_id'], row['category_id'])] / 100.0))
+        for header_id, (_, row) in zip(ids, valid)
+    ])
+    detail_ids = [row[0] for row in db.execute(
+        "SELECT id FROM transaction_details WHERE header_id IN (SELECT value FROM json_each(?))",
+        (json.dumps(ids),)
+    ).fetchall()]
+    apply_detail_effects(db, detail_ids)
+
+    return {"ids": ids, "errors": errors}
@@ -0,0 +1,155 @@
+"""
+Materialized wallet balances
+
+wallet_balances (7_wallet_balances_db.sql) keeps per-wallet running totals
+up to date with triggers on headers, details and income, and
+wallet_balance_view derives every balance figure from them. Readers get
+balances in O(wallets) instead of aggregating the whole history.
+
+Verification mode recomputes the totals from scratch and diffs them
+against the stored rows:
+    python -m app.utils.wallet_balances --verify            # report drift
+    python -m app.utils.wallet_balances --verify --repair   # and rewrite drifted rows
+"""
+from sqlite3 import Connection
+from typing import Dict, Iterable, List, Optional
+import argparse
+import sys
+
+# Incremental REAL arithmetic drifts by rounding error; ignore anything below a centavo
+BALANCE_TOLERANCE = 0.005
+
+TOTAL_COLUMNS = ("spent_total", "charged_total", "income_total")
+
+
+def get_wallet_balances(db: Connection, wallet_ids: Optional[Iterable[int]] = None) -> Dict[int, Dict]:
+    """
+    Read balances from the materialized store.
+
+    Args:
+        db: Database connection
+        wallet_ids: Only these wallets (None for every wallet)
+
+    Returns:
+        Dictionary mapping wallet_id to its wallet_balance_view row
+    """
+    if wallet_ids is None:
+        rows = db.execute("SELECT * FROM wallet_balance_view").fetchall()
+    else:
+        wallet_ids = list(wallet_ids)
+        if not wallet_ids:
+            return {}
+        placeholders = ",".join("?" * len(wallet_ids))
+        rows = db.execute(
+            f"SELECT * FROM wallet_balance_view WHERE wallet_id IN ({placeholders})", wallet_ids
+        ).fetchall()
+    return {row['wallet_id']: dict(row) for row in rows}
+
+
+def recompute_wallet_totals(db: Connection) -> Dict[int, Dict[str, float]]:
+    """Full recompute of the stored totals from the transaction history, one grouped pass."""
+    rows = db.execute("""
+        SELECT w.id AS wallet_id,
+            COALESCE(SUM(t.spent), 0.0) AS spent_total,
+            COALESCE(SUM(t.charged), 0.0) AS charged_total,
+            COALESCE(SUM(t.income), 0.0) AS income_total
+        FROM wallets w
+        LEFT JOIN (
+            SELECT th.wallet_id, td.line_amount AS spent, 0.0 AS charged, 0.0 AS income
+            FROM transaction_headers th
+            JOIN transaction_details td ON th.id = td.header_id
+            UNION ALL
+            SELECT wallet_id, 0.0, total_amount, 0.0 FROM transaction_headers
+            UNION ALL
+            SELECT wallet_id, 0.0, 0.0, amount FROM income_transactions
+        ) t ON t.wallet_id = w.id
+        GROUP BY w.id
+    """).fetchall()
+    return {row['wallet_id']: {col: row[col] for col in TOTAL_COLUMNS} for row in rows}
+
+
+def verify_wallet_balances(db: Connection, tolerance: float = BALANCE_TOLERANCE) -> Dict:
+    """
+    Diff the materialized totals against a full recompute.
+
+    Args:
+        db: Database connection
+        tolerance: Largest difference treated as equal
+
+    Returns:
+        Dictionary with the number of wallets checked and a list of
+        mismatches (wallet_id, column, stored, expected, diff); a missing
+        store row is reported with stored None
+    """
+    stored = {
+        row['wallet_id']: dict(row)
+        for row in db.execute("SELECT * FROM wallet_balances").fetchall()
+    }
+    expected = recompute_wallet_totals(db)
+
+    mismatches: List[Dict] = []
+    for wallet_id, totals in expected.items():
+        row = stored.get(wallet_id)
+        for col in TOTAL_COLUMNS:
+            value = row[col] if row else None
+            if value is None or abs(value - totals[col]) > tolerance:
+                mismatches.append({
+                    "wallet_id": wallet_id,
+                    "column": col,
+                    "stored": value,
+                    "expected": totals[col],
+                    "diff": None if value is None else round(value - totals[col], 6),
+                })
+    for wallet_id in stored.keys() - expected.keys():
+        mismatches.append({"wallet_id": wallet_id, "column": None, "stored": None, "expected": None, "diff": None})
+
+    return {"checked": len(expected), "mismatches": mismatches}
+
+
+def rebuild_wallet_balances(db: Connection, wallet_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Overwrite stored totals with a full recompute (does not commit).
+
+    Args:
+        db: Database connection
+        wallet_ids: Only these wallets (None for every wallet)
+
+    Returns:
+        Number of wallets written
+    """
+    expected = recompute_wallet_totals(db)
+    db.execute("DELETE FROM wallet_balances WHERE wallet_id NOT IN (SELECT id FROM wallets)")
+    targets = list(expected) if wallet_ids is None else [w for w in wallet_ids if w in expected]
+    db.executemany("""
+        INSERT OR REPLACE INTO wallet_balances (wallet_id, spent_total, charged_total, income_total, updated_at)
+        VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+    """, [(w, expected[w]["spent_total"], expected[w]["charged_total"], expected[w]["income_total"]) for w in targets])
+    return len(targets)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Materialized wallet balance maintenance")
+    parser.add_argument("--verify", action="store_true", help="Diff stored totals against a full recompute")
+    parser.add_argument("--repair", action="store_true", help="Rewrite wallets that drifted")
+    args = parser.parse_args()
+    if not args.verify:
+        parser.print_help()
+        return
+
+    from ..db.connection import get_db_connection
+
+    with get_db_connection(readonly=not args.repair) as conn:
+        report = verify_wallet_balances(conn)
+        print(f"🔍 Checked {report['checked']} wallets, {len(report['mismatches'])} mismatches")
+        for m in report['mismatches']:
+            print(f"  - wallet {m['wallet_id']} {m['column']}: stored={m['stored']} expected={m['expected']}")
+
+        if args.repair and report['mismatches']:
+            written = rebuild_wallet_balances(conn, {m['wallet_id'] for m in report['mismatches']})
+            conn.commit()
+            print(f"🛠️ Rebuilt {written} wallets")
+    sys.exit(1 if report['mismatches'] and not args.repair else 0)
+
+
+if __name__ == "__main__":
+    main()
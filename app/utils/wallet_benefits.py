@@ -1,9 +1,22 @@
 """
 Helper functions for wallet_benefits table operations
+
+Cashback rate lookups on the write path are served from a process-wide
+wallet x category rate matrix (wallet_benefits rows effective today merged
+over the legacy wallets.benefits JSON). It is rebuilt on the first lookup
+after save_wallet_benefits / invalidate_rate_matrix, at UTC midnight (so
+effective_from / effective_until windows apply), or after
+RATE_MATRIX_MAX_AGE seconds to pick up writes from other processes.
 """
+from datetime import datetime, timezone
 from sqlite3 import Connection
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 import json
+import os
+import threading
+import time
+
+RATE_MATRIX_MAX_AGE = float(os.getenv("RATE_MATRIX_MAX_AGE", "300"))
 
 
 def get_wallet_benefits(db: Connection, wallet_id: int, category_id: Optional[int] = None) -> Dict[int, float]:
@@ -57,6 +70,7 @@ def save_wallet_benefits(db: Connection, wallet_id: int, wallet_type: str, benef
     
     # Delete existing benefits for this wallet
     db.execute("DELETE FROM wallet_benefits WHERE wallet_id = ?", (wallet_id,))
+    invalidate_rate_matrix()
     
     # Insert new benefits
     for category_id, rate in benefits.items():
@@ -89,6 +103,94 @@ def get_wallet_benefits_legacy(db: Connection, wallet_id: int) -> Dict[str, floa
     return benefits
 
 
+class _RateMatrix:
+    def __init__(self, rates: Dict[Tuple[int, int], float], day: str, generation: int):
+        self.rates = rates
+        self.day = day
+        self.generation = generation
+        now = time.time()
+        # Effective windows are whole days, so the matrix also expires at UTC midnight
+        next_midnight = (int(now) // 86400 + 1) * 86400
+        self.expires_at = min(now + RATE_MATRIX_MAX_AGE, next_midnight)
+
+
+_matrix: Optional[_RateMatrix] = None
+_matrix_lock = threading.Lock()
+_matrix_generation = 0
+_matrix_stats = {"hits": 0, "rebuilds": 0, "invalidations": 0}
+
+
+def _today() -> str:
+    # Same clock as SQLite's date('now') (UTC)
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+def _build_rate_matrix(db: Connection, day: str) -> Dict[Tuple[int, int], float]:
+    """Merge the legacy JSON rates and the wallet_benefits rows effective on `day`."""
+    rates: Dict[Tuple[int, int], float] = {}
+
+    # Legacy JSON first; only category-id keys were ever matched
+    for wallet_id, raw in db.execute("SELECT id, benefits FROM wallets WHERE benefits IS NOT NULL").fetchall():
+        try:
+            legacy = json.loads(raw) or {}
+            for key, rate in legacy.items():
+                if str(key).isdigit():
+                    rates[(wallet_id, int(key))] = float(rate)
+        except (ValueError, TypeError, AttributeError):
+            continue
+
+    # Table rows take precedence; the first matching row wins as in get_wallet_benefits
+    seen = set()
+    for wallet_id, category_id, rate in db.execute("""
+        SELECT wallet_id, category_id, rate FROM wallet_benefits
+        WHERE is_active = 1
+        AND (effective_from IS NULL OR effective_from <= ?)
+        AND (effective_until IS NULL OR effective_until >= ?)
+        ORDER BY id
+    """, (day, day)).fetchall():
+        if (wallet_id, category_id) not in seen:
+            seen.add((wallet_id, category_id))
+            rates[(wallet_id, category_id)] = rate
+    return rates
+
+
+def invalidate_rate_matrix() -> None:
+    """Drop the cached rate matrix; call after changing wallet_benefits or wallets."""
+    global _matrix, _matrix_generation
+    with _matrix_lock:
+        _matrix = None
+        _matrix_generation += 1
+        _matrix_stats["invalidations"] += 1
+
+
+def _get_rate_matrix(db: Connection) -> _RateMatrix:
+    global _matrix
+    matrix = _matrix
+    if matrix is not None and time.time() < matrix.expires_at:
+        _matrix_stats["hits"] += 1
+        return matrix
+
+    generation = _matrix_generation
+    day = _today()
+    matrix = _RateMatrix(_build_rate_matrix(db, day), day, generation)
+    with _matrix_lock:
+        # Don't install a matrix that raced with an invalidation
+        if generation == _matrix_generation:
+            _matrix = matrix
+            _matrix_stats["rebuilds"] += 1
+    return matrix
+
+
+def get_rate_matrix_stats() -> Dict:
+    matrix = _matrix
+    return {
+        **_matrix_stats,
+        "entries": len(matrix.rates) if matrix else 0,
+        "day": matrix.day if matrix else None,
+        "max_age_s": RATE_MATRIX_MAX_AGE,
+    }
+
+
 def get_cashback_rate(db: Connection, wallet_id: int, category_id: int) -> float:
     """
     Get the cashback/interest rate for a specific wallet and category.
@@ -102,11 +204,4 @@ def get_cashback_rate(db: Connection, wallet_id: int, category_id: int) -> float
     Returns:
         Rate as a percentage (e.g., 4.0 for 4%)
     """
-    # Try new table first
-    benefits = get_wallet_benefits(db, wallet_id, category_id)
-    if benefits:
-        return benefits.get(category_id, 0.0)
-    
-    # Fall back to legacy JSON field
-    legacy_benefits = get_wallet_benefits_legacy(db, wallet_id)
-    return float(legacy_benefits.get(str(category_id), 0.0))
+    return _get_rate_matrix(db).rates.get((wallet_id, category_id), 0.0)
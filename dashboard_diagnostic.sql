@@ -5,7 +5,8 @@
 SELECT 'Total Expenses' as Metric,
     PRINTF('₱%,.2f', SUM(total_amount)) as Value
 FROM transaction_headers
-WHERE strftime('%Y-%m', transaction_date) = '2026-02';
+WHERE transaction_date >= '2026-02-01'
+    AND transaction_date < '2026-03-01';
 -- 2. Total Income (Current Month: February 2026)
 -- Sums all income records from the dedicated income_transactions table.
 SELECT 'Total Income' as Metric,
@@ -28,7 +29,8 @@ SELECT c.label as Category,
 FROM categories c
     JOIN monthly_budgets mb ON c.id = mb.category_id
     LEFT JOIN transaction_details td ON c.id = td.category_id
-    AND strftime('%Y-%m', td.billing_date) = '2026-02'
+    AND td.billing_date >= '2026-02-01'
+    AND td.billing_date < '2026-03-01'
 WHERE mb.month_year = '2026-02'
 GROUP BY c.id;
 -- 5. Card Strategy (Wallet Overview)
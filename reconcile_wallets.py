@@ -1,69 +1,50 @@
-import sqlite3
-import os
+"""
+Wallet reconciliation CLI (engine: app/utils/reconciliation.py)
 
-DB_PATH = "app/data/waiswallet.db"
+Usage:
+    python reconcile_wallets.py                  # reconcile every wallet
+    python reconcile_wallets.py --dry-run        # show the drift without writing
+    python reconcile_wallets.py --incremental    # only wallets touched since the last run
+    python reconcile_wallets.py --recompute      # expected values from the raw history
+"""
+import argparse
 
-def reconcile():
-    if not os.path.exists(DB_PATH):
-        print(f"❌ Database {DB_PATH} not found.")
-        return
+from app.db.connection import get_db_connection
+from app.db.migrations import apply_migrations
+from app.utils.reconciliation import reconcile_wallets
 
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
 
+def reconcile(dry_run=False, incremental=False, recompute=False):
     print("🚀 Starting Wallet Reconciliation...")
 
-    try:
-        # 1. Fetch all wallets
-        wallets = cursor.execute("SELECT id, name, type, credit_limit FROM wallets").fetchall()
-
-        for wallet in wallets:
-            w_id = wallet['id']
-            w_name = wallet['name']
-            w_type = wallet['type']
-            w_limit = wallet['credit_limit'] or 0
-
-            # 2. Sum Transactions
-            expenses = cursor.execute(
-                "SELECT SUM(total_amount) FROM transaction_headers WHERE wallet_id = ?", (w_id,)
-            ).fetchone()[0] or 0
-
-            # 3. Sum Incomes
-            incomes = cursor.execute(
-                "SELECT SUM(amount) FROM income_transactions WHERE wallet_id = ?", (w_id,)
-            ).fetchone()[0] or 0
-
-            # 4. Calculate New Balance
-            # For Credit: Balance is DEBT. Start at 0, add expenses, subtract payments (income).
-            # For Liquid: Balance is CASH. Start at 0 (or initial), add income, subtract expenses.
-            # NOTE: In this app, we assume starting balance represented in initialization was 0 if we rely strictly on history.
-            # However, to be safe, we'll assume the current 'history' is complete for the demo.
-            
-            if w_type == 'credit':
-                new_balance = expenses - incomes
-                new_available = w_limit - new_balance
+    with get_db_connection() as conn:
+        try:
+            apply_migrations(conn)
+            report = reconcile_wallets(conn, dry_run=dry_run, incremental=incremental, recompute=recompute)
+
+            if report['since']:
+                print(f"  (incremental since {report['since']})")
+            for d in report['drifted']:
+                print(f"  - {d['name']} ({d['type']}): Bal={d['balance']} → {d['expected_balance']}, "
+                      f"Avail={d['available_credit']} → {d['expected_available_credit']}")
+            print(f"\n🔍 Checked {report['checked']} wallets, {len(report['drifted'])} out of sync.")
+
+            if dry_run:
+                conn.rollback()
+                print("🧪 Dry run: no changes written.")
             else:
-                new_balance = incomes - expenses
-                new_available = 0 # Not applicable to debit
-
-            print(f"  - {w_name} ({w_type}): Bal={new_balance}, Avail={new_available}")
-
-            # 5. Update Wallet
-            cursor.execute("""
-                UPDATE wallets 
-                SET balance = ?, available_credit = ?, version = version + 1 
-                WHERE id = ?
-            """, (new_balance, new_available, w_id))
+                conn.commit()
+                print(f"✅ Reconciliation Complete! {report['written']} wallets updated.")
 
-        conn.commit()
-        print("\n✅ Reconciliation Complete! All wallets are in sync with history.")
+        except Exception as e:
+            conn.rollback()
+            print(f"❌ Error during reconciliation: {e}")
 
-    except Exception as e:
-        conn.rollback()
-        print(f"❌ Error during reconciliation: {e}")
-    finally:
-        conn.close()
 
 if __name__ == "__main__":
-    reconcile()
+    parser = argparse.ArgumentParser(description="Reconcile wallet balances with the transaction history")
+    parser.add_argument("--dry-run", action="store_true", help="Report the diff without writing")
+    parser.add_argument("--incremental", action="store_true", help="Only wallets touched since the last run")
+    parser.add_argument("--recompute", action="store_true", help="Recompute from the raw history instead of wallet_balances")
+    args = parser.parse_args()
+    reconcile(dry_run=args.dry_run, incremental=args.incremental, recompute=args.recompute)
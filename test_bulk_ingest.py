@@ -0,0 +1,73 @@
+"""
+Throughput benchmark: POST /api/transactions (one row per call) vs
+POST /api/transactions/bulk. Runs against a temporary copy of the database.
+
+Usage: python test_bulk_ingest.py [ROWS]
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv(".env")
+
+SOURCE_DB = os.getenv("DATABASE_PATH", "app/data/waiswallet.db")
+tmp_dir = tempfile.mkdtemp()
+os.environ["DATABASE_PATH"] = os.path.join(tmp_dir, "bench.db")
+shutil.copy(SOURCE_DB, os.environ["DATABASE_PATH"])
+
+from fastapi.testclient import TestClient
+from app.main import app
+from app.db.connection import get_db_connection
+
+
+def make_rows(count: int, wallet_ids, category_ids):
+    rng = random.Random(42)
+    return [{
+        "wallet_id": rng.choice(wallet_ids),
+        "merchant": rng.choice(["SM Supermarket", "Grab", "Shopee", "Meralco", "Jollibee"]),
+        "total_amount": round(rng.uniform(50, 5000), 2),
+        "transaction_date": f"2026-02-{rng.randint(1, 28):02d}",
+        "category_id": rng.choice(category_ids),
+    } for _ in range(count)]
+
+
+def test_bulk_ingest(count: int = 1000):
+    print(f"🚀 BULK INGESTION BENCHMARK ({count} rows)\n")
+    with get_db_connection(readonly=True) as db:
+        wallet_ids = [row[0] for row in db.execute("SELECT id FROM wallets").fetchall()]
+        category_ids = [row[0] for row in db.execute("SELECT id FROM categories").fetchall()]
+    rows = make_rows(count, wallet_ids, category_ids)
+
+    with TestClient(app) as client:
+        start = time.perf_counter()
+        for row in rows:
+            assert client.post("/api/transactions", json=row).status_code == 200
+        single = time.perf_counter() - start
+        print(f"⏱️ Single POSTs: {single:.2f}s ({count / single:,.0f} rows/s)")
+
+        start = time.perf_counter()
+        response = client.post("/api/transactions/bulk", json={"transactions": rows})
+        bulk = time.perf_counter() - start
+        data = response.json()
+        assert response.status_code == 200 and data["inserted"] == count, data
+        print(f"⏱️ Bulk POST:    {bulk:.2f}s ({count / bulk:,.0f} rows/s)")
+        print(f"📈 Speedup: {single / bulk:.1f}x")
+
+        # Per-row error reporting
+        bad = [dict(rows[0], wallet_id=-1), {"merchant": "Missing fields"}, dict(rows[1], transaction_date="soon")]
+        data = client.post("/api/transactions/bulk", json={"transactions": [rows[2]] + bad}).json()
+        print(f"\n🧪 Mixed batch: status={data['status']}, inserted={data['inserted']}, failed={data['failed']}")
+        for err in data["errors"]:
+            print(f"   - row {err['index']}: {err['error']}")
+
+
+if __name__ == "__main__":
+    try:
+        test_bulk_ingest(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
@@ -0,0 +1,128 @@
+"""
+Benchmark: per-row cost of transaction_details inserts with the old
+match_transaction_to_recurring / manage_cashback_and_history triggers vs
+the set-based apply_detail_effects stage. Both runs use fresh temporary
+databases and must end in the same state.
+
+Usage: python test_detail_effects.py [ROWS]
+"""
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+from app.db.migrations import MIGRATIONS_DIR, list_migrations
+from app.utils.cashback_ledger import rebuild_cashback
+from app.utils.detail_effects import apply_detail_effects
+
+BATCH_SIZE = 1000
+TRIGGER_MIGRATION = "9_detail_effects_db.sql"
+
+
+def build_db(path: str, rows: int, with_triggers: bool) -> sqlite3.Connection:
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    for name in ["1_create_db.sql", "2_triggers_db.sql"] + list_migrations():
+        if with_triggers and name == TRIGGER_MIGRATION:
+            continue
+        with open(os.path.join(MIGRATIONS_DIR, name), "r", encoding="utf-8") as f:
+            conn.executescript(f.read())
+
+    conn.executemany("INSERT INTO categories (id, code, label) VALUES (?, ?, ?)",
+                     [(c, f"cat-{c}", f"Category {c}") for c in range(1, 7)])
+    conn.executemany("""
+        INSERT INTO wallets (id, name, type, balance, available_credit, credit_limit, monthly_cashback_limit)
+        VALUES (?, ?, 'credit', 0, 100000, 100000, ?)
+    """, [(w, f"Wallet {w}", None if w > 8 else 1500) for w in range(1, 11)])
+    rng = random.Random(3)
+    conn.executemany("""
+        INSERT INTO recurring_expenses (name, category_id, amount_estimate, frequency, day_of_month)
+        VALUES (?, ?, ?, 'monthly', 1)
+    """, [(f"Bill {i}", rng.randint(1, 6), rng.uniform(200, 3000)) for i in range(30)])
+    conn.executemany("""
+        INSERT INTO transaction_headers (id, wallet_id, merchant, transaction_date, total_amount, payment_type)
+        VALUES (?, ?, 'Merchant', '2026-02-01', ?, 'straight')
+    """, [(i, rng.randint(1, 10), rng.uniform(50, 5000)) for i in range(1, rows + 1)])
+    conn.commit()
+    return conn
+
+
+def detail_rows(rows: int):
+    rng = random.Random(11)
+    return [(i, rng.randint(1, 6), "Item", round(rng.uniform(50, 3000), 2), "2026-02-01", round(rng.uniform(0, 60), 2))
+            for i in range(1, rows + 1)]
+
+
+INSERT_DETAILS = """
+    INSERT INTO transaction_details (header_id, category_id, description, line_amount, billing_date, cashback_earned)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+
+def run_triggers(conn: sqlite3.Connection, details) -> float:
+    start = time.perf_counter()
+    for i in range(0, len(details), BATCH_SIZE):
+        conn.executemany(INSERT_DETAILS, details[i:i + BATCH_SIZE])
+        conn.commit()
+    return time.perf_counter() - start
+
+
+def run_stage(conn: sqlite3.Connection, details) -> float:
+    start = time.perf_counter()
+    for i in range(0, len(details), BATCH_SIZE):
+        first_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM transaction_details").fetchone()[0]
+        conn.executemany(INSERT_DETAILS, details[i:i + BATCH_SIZE])
+        last_id = conn.execute("SELECT MAX(id) FROM transaction_details").fetchone()[0]
+        apply_detail_effects(conn, range(first_id, last_id + 1))
+        conn.commit()
+    return time.perf_counter() - start
+
+
+def snapshot(conn: sqlite3.Connection):
+    return (
+        # The triggers bucket by the current month, the ledger by billing cycle;
+        # only the ledger skips buckets for uncapped wallets
+        [tuple(round(v, 4) if isinstance(v, float) else v for v in row) for row in conn.execute(
+            "SELECT wallet_id, amount_earned, monthly_limit, is_capped FROM wallet_cashback_history "
+            "WHERE monthly_limit IS NOT NULL ORDER BY 1")],
+        [(row[0], round(row[1], 4)) for row in conn.execute("SELECT id, cashback_ytd FROM wallets ORDER BY id")],
+        conn.execute("SELECT COUNT(*) FROM transaction_details WHERE description LIKE '%[Matched Recurring:%'").fetchone()[0],
+    )
+
+
+def test_detail_effects(rows: int = 100000):
+    print(f"🚀 DETAIL INSERT PATH BENCHMARK ({rows:,} rows, batches of {BATCH_SIZE})\n")
+    details = detail_rows(rows)
+    with tempfile.TemporaryDirectory() as tmp:
+        before_db = build_db(os.path.join(tmp, "before.db"), rows, with_triggers=True)
+        before = run_triggers(before_db, details)
+        print(f"⏱️ Triggers: {before:.2f}s ({before / rows * 1e6:.1f}us per row)")
+
+        after_db = build_db(os.path.join(tmp, "after.db"), rows, with_triggers=False)
+        after = run_stage(after_db, details)
+        print(f"⏱️ Stage:    {after:.2f}s ({after / rows * 1e6:.1f}us per row)")
+        print(f"📈 Speedup: {before / after:.1f}x")
+
+        # The triggers add uncapped earnings to cashback_ytd; the first ledger
+        # build (as on the first start after the migration) resets it to credited amounts
+        history = snapshot(before_db)[0]
+        rebuild_cashback(before_db)
+        before_db.commit()
+        expected = snapshot(after_db)
+        same = (history,) + snapshot(before_db)[1:] == expected
+        print(f"\n{'✅' if same else '❌'} Cashback history, cashback_ytd and recurring tags "
+              f"{'match' if same else 'DIFFER'} ({expected[2]:,} lines tagged)")
+
+        rebuild_cashback(after_db)
+        rebuild_cashback(after_db)
+        after_db.commit()
+        stable = snapshot(after_db) == expected
+        print(f"{'✅' if stable else '❌'} Two full ledger rebuilds {'leave the state unchanged' if stable else 'CHANGE the state'}")
+        before_db.close()
+        after_db.close()
+
+
+if __name__ == "__main__":
+    test_detail_effects(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,101 @@
+"""
+Checks for the deterministic simulation engine behind POST /api/simulate/
+(mode=fast, no LLM) and POST /api/simulate/batch. Runs against a temporary
+copy of the database.
+
+Usage: python test_simulation.py
+"""
+import os
+import shutil
+import tempfile
+
+from dotenv import load_dotenv
+
+load_dotenv(".env")
+
+SOURCE_DB = os.getenv("DATABASE_PATH", "app/data/waiswallet.db")
+tmp_dir = tempfile.mkdtemp()
+os.environ["DATABASE_PATH"] = os.path.join(tmp_dir, "simulation.db")
+shutil.copy(SOURCE_DB, os.environ["DATABASE_PATH"])
+
+from fastapi.testclient import TestClient
+from app.main import app
+from app.db.connection import get_db_connection
+
+
+def wallets_by_type():
+    with get_db_connection(readonly=True) as db:
+        rows = db.execute("SELECT id, type FROM wallets ORDER BY id").fetchall()
+    credit = [row[0] for row in rows if row[1] == "credit"]
+    other = [row[0] for row in rows if row[1] != "credit"]
+    return credit, other
+
+
+def simulate(client, card_id: int, payment_type: str, term: int, amount: float = 12000):
+    return client.post("/api/simulate/", params={"mode": "fast"}, json={
+        "amount": amount, "category": "groceries", "card_id": card_id,
+        "payment_type": payment_type, "term": term,
+    })
+
+
+def test_installments_on_non_credit_wallets():
+    print("🚀 SIMULATION: installment plans by wallet type\n")
+    credit, other = wallets_by_type()
+    assert credit and other, "needs at least one credit and one non-credit wallet"
+    with TestClient(app) as client:
+        response = simulate(client, credit[0], "installment", 6)
+        assert response.status_code == 200, response.text
+        breakdown = response.json()["breakdown"]
+        assert len(breakdown["schedule"]) == 6
+        assert round(sum(c["amount"] for c in breakdown["schedule"]), 2) == 12000
+        print(f"✅ Credit wallet {credit[0]}: 6 x {response.json()['monthly_impact']:,.2f}")
+
+        for wallet_id in other:
+            response = simulate(client, wallet_id, "installment", 6)
+            assert response.status_code == 400, response.text
+            print(f"✅ Wallet {wallet_id}: installment rejected ({response.json()['detail']})")
+
+            response = simulate(client, wallet_id, "straight", 1)
+            assert response.status_code == 200, response.text
+            body = response.json()
+            assert body["breakdown"]["term"] == 1 and body["monthly_impact"] == 12000
+            assert "statement" not in body["best_strategy"]
+            print(f"✅ Wallet {wallet_id}: straight purchase scored {body['score']}")
+
+
+def test_batch_terms_by_wallet_type():
+    print("\n🚀 BATCH SIMULATION: terms by wallet type\n")
+    credit, other = wallets_by_type()
+    with TestClient(app) as client:
+        response = client.post("/api/simulate/batch", json={"amount": 12000, "category": "groceries", "save": False})
+        assert response.status_code == 200, response.text
+        scenarios = response.json()["scenarios"]
+        for wallet_id in other:
+            terms = {s["term"] for s in scenarios if s["wallet_id"] == wallet_id}
+            assert terms == {1}, f"wallet {wallet_id} got terms {terms}"
+        for wallet_id in credit:
+            assert {s["term"] for s in scenarios if s["wallet_id"] == wallet_id} == {1, 3, 6, 12, 24}
+        print(f"✅ Default grid: {len(scenarios)} scenarios, installments only on credit wallets {credit}")
+
+        response = client.post("/api/simulate/batch", json={
+            "amount": 12000, "category": "groceries", "card_ids": [credit[0], other[0]], "terms": [1, 6], "save": False,
+        })
+        assert response.status_code == 400, response.text
+        print(f"✅ Explicit installment terms on wallet {other[0]} rejected ({response.json()['detail']})")
+
+        response = client.post("/api/simulate/batch", json={
+            "amount": 12000, "category": "groceries", "card_ids": [credit[0], other[0]], "save": False,
+        })
+        assert response.status_code == 200, response.text
+        assert response.json()["count"] == 5 + 1
+        print("✅ Explicit wallets with default terms: straight only for the non-credit wallet")
+
+        response = client.post("/api/simulate/batch", json={"amount": 12000, "category": "groceries", "card_ids": [], "save": False})
+        assert response.status_code == 200, response.text
+        assert response.json()["count"] == len(scenarios)
+        print("✅ Empty card_ids: same grid as the default")
+
+
+if __name__ == "__main__":
+    test_installments_on_non_credit_wallets()
+    test_batch_terms_by_wallet_type()